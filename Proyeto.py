@@ -1,9 +1,29 @@
-import tkinter as tk
-from tkinter import messagebox
+try:
+    import tkinter as tk
+    from tkinter import messagebox
+except ImportError:  # sin Tk el motor (GameState) sigue disponible
+    tk = messagebox = None
 import random
 import json
+from array import array
+import base64
+import collections
+import functools
+import heapq
+import itertools
+import logging
 import os
+import queue
+import re
+import socket
+import sqlite3
+import struct
+import sys
+import threading
 import time
+import zlib
+
+avisos = logging.getLogger(__name__)
 
 # =========================
 # CONSTANTES GENERALES
@@ -12,25 +32,116 @@ TAM_CELDA = 32
 ANCHO_MAPA = 20  # columnas
 ALTO_MAPA = 15  # filas
 
+# Tamaños de mapa elegibles (columnas, filas). Cada uno tiene que simular un
+# tick muy por debajo de 1 / TICKS_POR_SEGUNDO con el jugador en movimiento:
+# benchmark.py lo mide en los casos GameState.step[moviendo,...]
+TAMANOS_MAPA = {
+    "Pequeño": (ANCHO_MAPA, ALTO_MAPA),
+    "Grande": (200, 150),
+    "Enorme": (1000, 1000),
+}
+
+# Celdas visibles en pantalla; mapas más grandes se recorren con la cámara
+VISTA_COLS = 20
+VISTA_FILAS = 15
+
 # Códigos de terreno
 CAMINO = 0
 MURO = 1
 LIANA = 2
 TUNEL = 3
 
+# Bits de paso (máscara por código de terreno)
+PASO_JUGADOR = 1
+PASO_ENEMIGO = 2
+
+# Vecinos ortogonales (arriba, abajo, izquierda, derecha)
+DIRECCIONES = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
 # Modos de juego
 MODO_ESCAPA = "ESCAPA"
 MODO_CAZADOR = "CAZADOR"
 
 # Dificultades
-DIFICULTADES = {"Fácil": 1.0, "Normal": 1.5, "Difícil": 2.0}
-
-# Tiempos (en segundos)
-COOLDOWN_TRAMPA = 5
-RESPAWN_ENEMIGO = 10
-
-# Archivo de puntajes
-ARCHIVO_SCORES = "scores.json"
+DIFICULTADES = {"Fácil": 1.0, "Normal": 1.5, "Difícil": 2.0, "Horda": 1.0}
+ENEMIGOS_POR_DIFICULTAD = {"Fácil": 3, "Normal": 4, "Difícil": 5, "Horda": 10_000}
+
+# Horda: miles de enemigos lentos
+DIFICULTAD_HORDA = "Horda"
+CELDAS_POR_ENEMIGO = 4  # en mapas chicos la horda se limita a 1 cada 4 celdas
+
+# Tiempos, contados en ticks de simulación de duración fija
+TICKS_POR_SEGUNDO = 10
+COOLDOWN_TRAMPA = 5 * TICKS_POR_SEGUNDO
+RESPAWN_ENEMIGO = 10 * TICKS_POR_SEGUNDO
+DURACION_TRAMPA = 30 * TICKS_POR_SEGUNDO  # una trampa sin usar se gasta
+
+# El campo de distancias exacto solo se expande RADIO_CAMPO pasos alrededor
+# del jugador. Los enemigos de más allá siguen un campo lejano atrasado que
+# se rehace de a CUOTA_CAMPO_LEJANO celdas por tick como mucho (en mapas
+# chicos, en unos PERIODO_CAMPO_LEJANO ticks), así ningún tick depende del
+# tamaño del mapa. Se rehace recién cuando el jugador se alejó ALEJAMIENTO_ANCLA
+# pasos (en línea recta) de donde empezó el campo en uso.
+RADIO_CAMPO = 40
+PERIODO_CAMPO_LEJANO = 3 * TICKS_POR_SEGUNDO
+CUOTA_CAMPO_LEJANO = 8000
+# Tras cerrar una celda a los enemigos el índice de zonas se rearma de a
+# CUOTA_ZONAS celdas por tick (en dos pasadas; mientras tanto no se usa para
+# descartar celdas sin camino)
+CUOTA_ZONAS = 10000
+ALEJAMIENTO_ANCLA = 8
+RECUPERACION_ENERGIA = TICKS_POR_SEGUNDO  # ticks por punto de energía
+INTERVALO_ENEMIGO = 6  # ticks entre pasos de un enemigo con velocidad 1.0
+INTERVALO_MINIMO_ENEMIGO = 2
+# Los enemigos aparecen a esta distancia (pasos) del jugador o más, si en
+# INTENTOS_POSICION_ENEMIGO sorteos aparece una celda así
+DISTANCIA_MINIMA_ENEMIGO = 5
+INTENTOS_POSICION_ENEMIGO = 8
+
+# Archivos de puntajes: bitácora append-only y el formato anterior, que se
+# importa la primera vez
+ARCHIVO_SCORES = "scores.jsonl"
+ARCHIVO_SCORES_ANTIGUO = "scores.json"
+FSYNC_CADA = 16  # registros por fsync agrupado
+FSYNC_SEGUNDOS = 2.0  # o antes, si pasó este tiempo desde el último
+COMPACTAR_CADA = 1000  # registros entre instantáneas
+# "bitacora" (ScoreManager), "sqlite" (SQLiteScoreManager) o "remoto"
+# (RemoteScoreManager contra servidor_puntajes.py)
+BACKEND_PUNTAJES = "bitacora"
+ARCHIVO_SCORES_DB = "scores.db"
+DIRECCION_PUNTAJES = "127.0.0.1:8765"  # o "unix:/ruta/al/socket"
+ARCHIVO_PENDIENTES = "scores_pendientes.jsonl"  # si el servidor no está
+# lo que PersistenciaPuntajes no pudo escribir al cerrar; se reintenta al abrir
+ARCHIVO_SIN_ESCRIBIR = "scores_sin_escribir.jsonl"
+TIMEOUT_PUNTAJES = 2.0
+LOTE_PUNTAJES = 256  # registros por escritura del hilo de persistencia
+
+# Reserva de mapas generados de antemano
+TAMANO_RESERVA = 2  # mapas listos por configuración
+INTENTOS_MAPA = 20  # semillas a probar antes de aceptar el mejor mapa
+# camino mínimo del inicio a la salida, como múltiplo de la distancia
+# Manhattan entre ellos (cols + rows - 6). clasico y cuevas carvan un
+# recorrido que siempre avanza hacia la salida: su camino más corto mide
+# justo esa distancia, así que solo se exige que exista
+LARGO_MINIMO_MAPA = {"clasico": 1.0, "laberinto": 1.04, "cuevas": 1.0, "salas": 1.3}
+ARCHIVO_MAPAS = "mapas_{generador}_{cols}x{rows}.jsonl"
+
+# Partida en curso guardada al salir y cada tanto (recuperación tras un corte)
+ARCHIVO_PARTIDA = "partida_guardada.bin"
+AUTOGUARDADO_CADA = 5 * TICKS_POR_SEGUNDO
+
+# Loop de la interfaz: la simulación se pone al día con hasta
+# MAX_TICKS_POR_LLAMADA ticks por llamada y el dibujo se omite o se espacia
+# si la llamada pasa de PRESUPUESTO_LOOP, sin bajar de FPS_MINIMO cuadros
+MAX_TICKS_POR_LLAMADA = 5
+PRESUPUESTO_LOOP = 0.08  # segundos
+FPS_MINIMO = 2
+# Teclas guardadas entre ticks; si se acumulan más, se descartan las viejas
+ENTRADAS_EN_COLA = 4
+
+# Panel de rendimiento (F3) y exportación de mediciones (F4)
+REFRESCO_OVERLAY = 0.5  # segundos entre actualizaciones del texto
+ARCHIVO_RENDIMIENTO = "rendimiento_{fecha}.json"
 
 
 # =========================
@@ -96,103 +207,1250 @@ class Tunel(CasillaBase):
         return "#4b0082"  # morado
 
 
+# Una sola instancia por tipo de terreno, indexada por código
+TERRENOS = (Camino(), Muro(), Liana(), Tunel())
+COLORES = tuple(terreno.color() for terreno in TERRENOS)
+
+# Tabla código -> máscara de paso, apta para bytearray.translate
+TABLA_PASO = bytearray(256)
+for _terreno in TERRENOS:
+    TABLA_PASO[_terreno.codigo] = (
+        PASO_JUGADOR if _terreno.puede_pasar_jugador() else 0
+    ) | (PASO_ENEMIGO if _terreno.puede_pasar_enemigo() else 0)
+del _terreno
+
+
 # =========================
 # MAPA DEL JUEGO
 # =========================
 
+# Máscara de paso -> 1 si la pisa un enemigo, para buscar tramos con re (y
+# para las celdas libres de CampoLejano)
+TABLA_TRAMOS = bytes(1 if v & PASO_ENEMIGO else 0 for v in range(256))
+TRAMO = re.compile(b"\x01+")
+# Máscara de tramos -> componente como byte (255 = -1 en los cuatro bytes de
+# un int, 0 = 0)
+COMPONENTE_UNICA = bytes([255, 0]) + bytes(254)
+
+
+class ZonasEnemigo:
+    """Celdas que pisan los enemigos, agrupadas en componentes conexas.
+
+    celdas tiene los índices planos ordenados por bloque (el b ocupa
+    celdas[inicios[b]:inicios[b + 1]]) y componente[k] es el bloque de la
+    celda k, o -1 si los enemigos no la pisan. Recién armado cada bloque es
+    una componente; se arma uniendo los tramos horizontales de cada fila
+    con los de la anterior (union-find), sin recorrer el mapa celda por
+    celda, y con de_a_partes se arma de a unas filas con avanzar().
+
+    Abrir una celda solo puede unir componentes vecinas: abrir() le da un
+    bloque propio y une los grupos en el lugar (grupo es un union-find sobre
+    los bloques; una componente se nombra por el bloque raíz). Cerrar una
+    puede partir la suya, así que cerrar() deja el índice no vigente: sirve
+    de aproximación hasta que GameMap termina de rearmarlo.
+    """
+
+    def __init__(self, paso, cols, de_a_partes=False):
+        self.paso = paso
+        self.cols = cols
+        self.vigente = True
+        self.cambios = 0  # abrir() y cerrar() hechos
+        self.partes = self.armar()
+        if not de_a_partes:
+            for _ in self.partes:
+                pass
+
+    def avanzar(self, cuota):
+        """Arma unas cuota celdas más del mapa; True cuando está listo."""
+        hecho = 0
+        for celdas in self.partes:
+            hecho += celdas
+            if hecho >= cuota:
+                return False
+        return True
+
+    def armar(self):
+        """Generador que arma el índice; da las celdas recorridas en cada fila."""
+        paso = self.paso
+        cols = self.cols
+        n = len(paso)
+        mascara = paso.translate(TABLA_TRAMOS)
+        # tramos numerados en orden de lectura; padre[t] <= t siempre
+        inicios_tramo = []
+        fines_tramo = []
+        padre = []
+        primeros = []  # primer tramo de cada fila
+        total = 0  # componentes entre los tramos vistos
+
+        def raiz(t):
+            while padre[t] != t:
+                padre[t] = padre[padre[t]]
+                t = padre[t]
+            return t
+
+        arriba_a = arriba_b = ()
+        arriba_t = 0  # número del primer tramo de la fila de arriba
+        for base in range(0, n, cols):
+            primero = len(padre)
+            primeros.append(primero)
+            tramos = [m.span() for m in TRAMO.finditer(mascara, base, base + cols)]
+            j = 0
+            m = len(arriba_a)
+            for a, b in tramos:
+                t = len(padre)
+                padre.append(t)
+                total += 1
+                # unir con los tramos de arriba que comparten alguna columna
+                a -= cols
+                b -= cols
+                while j < m and arriba_b[j] <= a:
+                    j += 1
+                i = j
+                while i < m and arriba_a[i] < b:
+                    r1 = raiz(t)
+                    r2 = raiz(arriba_t + i)
+                    if r1 < r2:
+                        padre[r2] = r1
+                        total -= 1
+                    elif r2 < r1:
+                        padre[r1] = r2
+                        total -= 1
+                    i += 1
+            arriba_a = [a for a, _ in tramos]
+            arriba_b = [b for _, b in tramos]
+            arriba_t = primero
+            inicios_tramo += arriba_a
+            fines_tramo += arriba_b
+            yield cols
+        primeros.append(len(padre))
+
+        # segunda pasada, también por filas: cada componente es un bloque,
+        # numeradas por su primer tramo (la raíz) en orden de lectura
+        componente = array("i", [-1]) * n
+        if total == 1:
+            # mapas conexos (casi todos los generadores): sin recorrer tramos
+            celdas = array("i")
+            for base in range(0, n, cols):
+                fila = mascara[base : base + cols]
+                celdas.extend(itertools.compress(range(base, base + cols), fila))
+                # un int por celda: su byte (0 o 255) repetido cuatro veces
+                unica = fila.translate(COMPONENTE_UNICA)
+                enteros = bytearray(4 * len(unica))
+                for i in range(4):
+                    enteros[i::4] = unica
+                componente[base : base + cols] = array("i", enteros)
+                yield cols
+            bloques = [celdas]
+        else:
+            # el padre de un tramo es anterior a él, así que ya está numerado
+            componente_tramo = []
+            bloques = []
+            for fila in range(len(primeros) - 1):
+                for t in range(primeros[fila], primeros[fila + 1]):
+                    p = padre[t]
+                    if p == t:
+                        c = len(bloques)
+                        bloques.append(array("i"))
+                    else:
+                        c = componente_tramo[p]
+                    componente_tramo.append(c)
+                    a = inicios_tramo[t]
+                    b = fines_tramo[t]
+                    bloques[c].extend(range(a, b))
+                    componente[a:b] = array("i", [c]) * (b - a)
+                yield cols
+
+        celdas = array("i")
+        self.inicios = array("i", [0])
+        copiadas = 0
+        for bloque in bloques:
+            celdas.extend(bloque)
+            self.inicios.append(len(celdas))
+            copiadas += len(bloque)
+            if copiadas >= cols:
+                yield copiadas
+                copiadas = 0
+        self.celdas = celdas
+        self.componente = componente
+        self.grupo = array("i", range(len(bloques)))
+        self.tamanos = [len(bloque) for bloque in bloques]
+        # raíz -> bloques de su componente, solo si tiene más de uno
+        self.miembros = {}
+
+    def __len__(self):
+        return sum(1 for b, g in enumerate(self.grupo) if b == g)
+
+    def raiz(self, b):
+        grupo = self.grupo
+        while grupo[b] != b:
+            grupo[b] = grupo[grupo[b]]
+            b = grupo[b]
+        return b
+
+    def unir(self, b1, b2):
+        r1 = self.raiz(b1)
+        r2 = self.raiz(b2)
+        if r1 == r2:
+            return
+        if self.tamanos[r1] < self.tamanos[r2]:
+            r1, r2 = r2, r1
+        self.grupo[r2] = r1
+        self.tamanos[r1] += self.tamanos[r2]
+        self.miembros[r1] = self.bloques(r1) + self.miembros.pop(r2, [r2])
+
+    def bloques(self, c):
+        return self.miembros.get(c, [c])
+
+    def abrir(self, k):
+        """Agrega la celda k, que se abrió a los enemigos."""
+        self.cambios += 1
+        b = len(self.grupo)
+        self.celdas.append(k)
+        self.inicios.append(len(self.celdas))
+        self.grupo.append(b)
+        self.tamanos.append(1)
+        componente = self.componente
+        componente[k] = b
+        cols = self.cols
+        x = k % cols
+        for v in (
+            k - cols,
+            k + cols,
+            k - 1 if x > 0 else -1,
+            k + 1 if x < cols - 1 else -1,
+        ):
+            if 0 <= v < len(componente) and componente[v] >= 0:
+                self.unir(b, componente[v])
+
+    def cerrar(self, k):
+        """Saca la celda k, que se cerró a los enemigos; pudo partir su zona."""
+        self.cambios += 1
+        self.componente[k] = -1
+        self.vigente = False
+
+    def tamano(self, c):
+        return self.tamanos[c]
+
+    def alrededor(self, k):
+        """Componentes de la celda k y sus vecinas: las que llegan a k."""
+        componente = self.componente
+        n = len(componente)
+        vistas = set()
+        for v in (k, k - self.cols, k + self.cols, k - 1, k + 1):
+            if 0 <= v < n and componente[v] >= 0:
+                vistas.add(self.raiz(componente[v]))
+        return tuple(sorted(vistas))
+
+    def mayor(self):
+        """La componente más grande, como tupla (vacía si no hay ninguna)."""
+        raices = [b for b, g in enumerate(self.grupo) if b == g]
+        if not raices:
+            return ()
+        return (max(raices, key=self.tamano),)
+
+    def celdas_de(self, componentes):
+        """Las celdas de esas componentes, bloque por bloque."""
+        for c in componentes:
+            for b in self.bloques(c):
+                yield from self.celdas[self.inicios[b] : self.inicios[b + 1]]
+
+    def elegir(self, rng, componentes):
+        """Una celda al azar, uniforme entre las de esas componentes."""
+        i = rng.randrange(sum(self.tamano(c) for c in componentes))
+        for c in componentes:
+            for b in self.bloques(c):
+                largo = self.inicios[b + 1] - self.inicios[b]
+                if i < largo:
+                    return self.celdas[self.inicios[b] + i]
+                i -= largo
+
+    def cercanas(self, k, radio):
+        """Celdas a menos de radio pasos de k por donde pisan los enemigos."""
+        cols = self.cols
+        paso = self.paso
+        vistas = {k}
+        frontera = [k]
+        for _ in range(radio - 1):
+            siguiente = []
+            for u in frontera:
+                for v in (u - cols, u + cols, u - 1, u + 1):
+                    if v not in vistas and 0 <= v < len(paso):
+                        if paso[v] & PASO_ENEMIGO:
+                            vistas.add(v)
+                            siguiente.append(v)
+            frontera = siguiente
+        return vistas
+
 
 class GameMap:
     def __init__(self, cols, rows):
         self.cols = cols
         self.rows = rows
-        self.matriz = [[Muro() for _ in range(cols)] for _ in range(rows)]
+        # códigos de terreno fila por fila y su máscara de paso
+        self.celdas = bytearray([MURO]) * (cols * rows)
+        self.paso = self.celdas.translate(TABLA_PASO)
         self.inicio = (1, 1)
         self.salida = (cols - 2, rows - 2)
+        # ZonasEnemigo del terreno actual; None hasta que se pide. Tras cerrar
+        # una celda queda no vigente y se rearma de a partes en zonas_nuevas
+        self.indice_zonas = None
+        self.zonas_nuevas = None
+        # cambia con cada cambio de terreno (el renderer repinta al verlo)
+        self.version = 0
+
+    def generar(self, rng=random, generador="clasico"):
+        """Genera el terreno con uno de los GENERADORES."""
+        self.asignar(
+            GENERADORES[generador](self.cols, self.rows, self.inicio, self.salida, rng)
+        )
 
-    def generar(self):
-        """Genera un mapa aleatorio garantizando un camino de CAMINO."""
-        # 1. Inicialmente todo muros
-        self.matriz = [[Muro() for _ in range(self.cols)] for _ in range(self.rows)]
-
-        # 2. Carvar un camino aleatorio desde inicio hasta salida (solo camino normal)
-        x, y = self.inicio
-        sx, sy = self.salida
-
-        self.matriz[y][x] = Camino()
-        while (x, y) != (sx, sy):
-            dx = sx - x
-            dy = sy - y
-            opciones = []
-            if dx > 0:
-                opciones.append((1, 0))
-            if dx < 0:
-                opciones.append((-1, 0))
-            if dy > 0:
-                opciones.append((0, 1))
-            if dy < 0:
-                opciones.append((0, -1))
-            if not opciones:
-                break
-            mx, my = random.choice(opciones)
-            nx, ny = x + mx, y + my
-            if 0 < nx < self.cols - 1 and 0 < ny < self.rows - 1:
-                x, y = nx, ny
-                self.matriz[y][x] = Camino()
-
-        # 3. Rellenar el resto con tipos aleatorios
-        for j in range(1, self.rows - 1):
-            for i in range(1, self.cols - 1):
-                if (i, j) == self.inicio or (i, j) == self.salida:
-                    self.matriz[j][i] = Camino()
-                    continue
-                if isinstance(self.matriz[j][i], Camino):
-                    # ya es camino del recorrido principal
-                    continue
-                r = random.random()
-                if r < 0.55:
-                    self.matriz[j][i] = Camino()
-                elif r < 0.7:
-                    self.matriz[j][i] = Muro()
-                elif r < 0.85:
-                    self.matriz[j][i] = Liana()
-                else:
-                    self.matriz[j][i] = Tunel()
-
-        # Asegurar inicio y salida como camino
-        ix, iy = self.inicio
-        sx, sy = self.salida
-        self.matriz[iy][ix] = Camino()
-        self.matriz[sy][sx] = Camino()
+    def asignar(self, celdas):
+        self.celdas = bytearray(celdas)
+        self.paso = self.celdas.translate(TABLA_PASO)
+        self.indice_zonas = None
+        self.zonas_nuevas = None
+        self.version += 1
+
+    @property
+    def zonas(self):
+        """Índice de celdas de los enemigos; se arma una vez por terreno."""
+        if self.indice_zonas is None:
+            self.indice_zonas = ZonasEnemigo(self.paso, self.cols)
+        return self.indice_zonas
+
+    def avanzar_zonas(self, cuota):
+        """Sigue el rearmado del índice de zonas, si hay uno en curso."""
+        if self.zonas_nuevas is not None and self.zonas_nuevas.avanzar(cuota):
+            self.indice_zonas = self.zonas_nuevas
+            self.zonas_nuevas = None
+
+    def distancia_salida(self):
+        """Largo del camino más corto del jugador hasta la salida (-1 si no hay)."""
+        cols = self.cols
+        paso = self.paso
+        destino = self.salida[1] * cols + self.salida[0]
+        origen = self.inicio[1] * cols + self.inicio[0]
+        if not paso[origen] & PASO_JUGADOR:
+            return -1
+        # BFS por niveles; los bordes son muro, así que k +- 1 no da la vuelta
+        visto = bytearray(len(paso))
+        visto[origen] = 1
+        frontera = [origen]
+        d = 0
+        while frontera:
+            if visto[destino]:
+                return d
+            d += 1
+            siguiente = []
+            for k in frontera:
+                for v in (k - cols, k + cols, k - 1, k + 1):
+                    if not visto[v] and paso[v] & PASO_JUGADOR:
+                        visto[v] = 1
+                        siguiente.append(v)
+            frontera = siguiente
+        return -1
+
+    def codigo(self, x, y):
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.celdas[y * self.cols + x]
+        return MURO  # fuera del mapa se considera muro
 
     def casilla(self, x, y):
-        if 0 <= x < self.cols and 0 <= y < self.rows:
-            return self.matriz[y][x]
-        return Muro()  # fuera del mapa se considera muro
+        return TERRENOS[self.codigo(x, y)]
+
+    def puede_pasar_jugador(self, x, y):
+        return (
+            0 <= x < self.cols
+            and 0 <= y < self.rows
+            and self.paso[y * self.cols + x] & PASO_JUGADOR != 0
+        )
+
+    def puede_pasar_enemigo(self, x, y):
+        return (
+            0 <= x < self.cols
+            and 0 <= y < self.rows
+            and self.paso[y * self.cols + x] & PASO_ENEMIGO != 0
+        )
+
+    def cambiar_casilla(self, x, y, codigo):
+        k = y * self.cols + x
+        self.celdas[k] = codigo
+        cambio = (self.paso[k] ^ TABLA_PASO[codigo]) & PASO_ENEMIGO
+        self.paso[k] = TABLA_PASO[codigo]
+        zonas = self.indice_zonas
+        if cambio and zonas is not None:
+            # abrir solo une zonas vecinas; cerrar puede partir una y el
+            # índice se rearma de a partes con avanzar_zonas (también si otro
+            # cambio llega durante el rearmado, que ya no lo incluiría)
+            if self.paso[k] & PASO_ENEMIGO:
+                zonas.abrir(k)
+            else:
+                zonas.cerrar(k)
+            if not zonas.vigente:
+                self.zonas_nuevas = ZonasEnemigo(self.paso, self.cols, True)
+        self.version += 1
 
     def es_salida(self, x, y):
         return (x, y) == self.salida
 
 
+# =========================
+# GENERADORES DE MAPA
+# =========================
+# Cada generador recibe (cols, rows, inicio, salida, rng) y devuelve el
+# bytearray de códigos de terreno. Las operaciones sobre todo el mapa usan
+# slices, bytes.translate y enteros de Python como bitsets (un bit por
+# celda), que corren en C. Los generadores nuevos son conexos por
+# construcción: la zona que pisan los enemigos (camino + liana) sale de un
+# árbol de expansión y solo crece pegada a él, sin tener que inundar el
+# mapa entero para comprobarlo.
+
+# byte aleatorio -> terreno con ~55% camino y ~15% de muro, liana y túnel
+TABLA_RELLENO = bytes([CAMINO] * 141 + [MURO] * 38 + [LIANA] * 38 + [TUNEL] * 39)
+ASCII_A_BIT = bytes.maketrans(b"01", b"\x00\x01")
+PASO_CUEVAS = 10  # separación entre los nodos del esqueleto de las cuevas
+
+
+class GrillaBits:
+    """Operaciones de vecindad sobre bitsets de celdas (bit k = celda k)."""
+
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.n = cols * rows
+        self.todo = (1 << self.n) - 1
+        self.col0 = int(("0" * (cols - 1) + "1") * rows, 2)
+        self.ultima_col = self.col0 << (cols - 1)
+        self.fila0 = (1 << cols) - 1
+        self.ultima_fila = self.fila0 << (self.n - cols)
+        self.borde = self.col0 | self.ultima_col | self.fila0 | self.ultima_fila
+
+    def de_celdas(self, celdas, codigos):
+        """Bitset de las celdas cuyo código está en codigos."""
+        tabla = bytes(0x31 if c in codigos else 0x30 for c in range(256))
+        return int(celdas.translate(tabla)[::-1], 2)
+
+    def a_celdas(self, capas):
+        """Códigos de terreno: MURO salvo donde indique cada (bits, código).
+
+        Las capas no deben solaparse. Cada bitset se expande a un byte por
+        celda y se combinan como un solo entero, sin recorrer celdas.
+        """
+        total = int.from_bytes(bytes([MURO]) * self.n, "little")
+        for bits, codigo in capas:
+            bytes_capa = format(bits, f"0{self.n}b")[::-1].encode("ascii")
+            total += (codigo - MURO) * int.from_bytes(
+                bytes_capa.translate(ASCII_A_BIT), "little"
+            )
+        return bytearray(total.to_bytes(self.n, "little"))
+
+    def aleatorio(self, rng, veces=1):
+        """Bits al azar con probabilidad 1 / 2**veces."""
+        bits = self.todo
+        for _ in range(veces):
+            bits &= rng.getrandbits(self.n)
+        return bits
+
+    def vecinos(self, bits, fuera=False):
+        """Celdas con algún vecino ortogonal en bits (fuera: el borde cuenta)."""
+        return (
+            self.desde_oeste(bits, fuera)
+            | self.desde_este(bits, fuera)
+            | self.desde_norte(bits, fuera)
+            | self.desde_sur(bits, fuera)
+        )
+
+    # cada celda recibe el bit de su vecino; fuera indica el valor del exterior
+    def desde_oeste(self, bits, fuera=False):
+        bits = (bits << 1) & self.todo & ~self.col0
+        return bits | self.col0 if fuera else bits
+
+    def desde_este(self, bits, fuera=False):
+        bits = (bits >> 1) & ~self.ultima_col
+        return bits | self.ultima_col if fuera else bits
+
+    def desde_norte(self, bits, fuera=False):
+        bits = (bits << self.cols) & self.todo
+        return bits | self.fila0 if fuera else bits
+
+    def desde_sur(self, bits, fuera=False):
+        bits = bits >> self.cols
+        return bits | self.ultima_fila if fuera else bits
+
+    def crecer(self, semilla, abiertas, pasos):
+        """Celdas de abiertas a lo sumo a `pasos` pasos de la semilla.
+
+        Cada celda agregada toca una ya alcanzada, así que si la semilla es
+        conexa el resultado también lo es.
+        """
+        alcanzadas = semilla
+        for _ in range(pasos):
+            alcanzadas |= self.vecinos(alcanzadas) & abiertas
+        return alcanzadas
+
+    def bit(self, x, y):
+        return 1 << (y * self.cols + x)
+
+
+def carvar_recorrido(celdas, cols, rows, inicio, salida, rng):
+    """Camino aleatorio monótono de CAMINO desde inicio hasta salida."""
+    x, y = inicio
+    sx, sy = salida
+
+    celdas[y * cols + x] = CAMINO
+    while (x, y) != (sx, sy):
+        dx = sx - x
+        dy = sy - y
+        opciones = []
+        if dx > 0:
+            opciones.append((1, 0))
+        if dx < 0:
+            opciones.append((-1, 0))
+        if dy > 0:
+            opciones.append((0, 1))
+        if dy < 0:
+            opciones.append((0, -1))
+        if not opciones:
+            break
+        mx, my = rng.choice(opciones)
+        nx, ny = x + mx, y + my
+        if 0 < nx < cols - 1 and 0 < ny < rows - 1:
+            x, y = nx, ny
+            celdas[y * cols + x] = CAMINO
+
+
+def carvar_pasillo(celdas, cols, ax, ay, bx, by, codigo=CAMINO):
+    """Pasillo recto (horizontal o vertical) entre dos celdas."""
+    if ay == by:
+        x0, x1 = min(ax, bx), max(ax, bx)
+        celdas[ay * cols + x0 : ay * cols + x1 + 1] = bytes([codigo]) * (x1 - x0 + 1)
+    else:
+        y0, y1 = min(ay, by), max(ay, by)
+        celdas[y0 * cols + ax : y1 * cols + ax + 1 : cols] = bytes([codigo]) * (
+            y1 - y0 + 1
+        )
+
+
+def carvar_arbol(celdas, cols, rows, paso, codigo, rng):
+    """Carva un árbol aleatorio con nodos cada `paso` celdas desde (1, 1).
+
+    Algoritmo de Eller: arma el árbol fila por fila y solo recuerda qué
+    nodos de la fila actual ya están unidos. Esos conjuntos nunca se cruzan,
+    así que cada uno es una lista circular ordenada (der/izq) y "x y x + 1
+    están unidos" es der[x] == x + 1: unir o sacar un nodo es O(1). Las
+    marcas de cada fila se escriben con slices y al final se pasan a las
+    celdas de una vez, sin tocar las que no son del árbol.
+    """
+    ancho = (cols - 3) // paso + 1
+    alto = (rows - 3) // paso + 1
+    n = cols * rows
+    der = list(range(ancho))
+    izq = list(range(ancho))
+    marcas = bytearray(n)
+    for j in range(alto):
+        k0 = (1 + paso * j) * cols + 1
+        fin = k0 + paso * (ancho - 1)
+        ultima = j == alto - 1
+        azar = rng.randbytes(2 * ancho)
+
+        # al este: se unen al azar nodos de conjuntos distintos (en la
+        # última fila, todos, para que el árbol quede conexo)
+        este = bytearray(ancho - 1)
+        for x in range(ancho - 1):
+            d = der[x]
+            if d != x + 1 and (ultima or azar[x] & 1):
+                i = izq[x + 1]
+                der[x] = x + 1
+                izq[x + 1] = x
+                der[i] = d
+                izq[d] = i
+                este[x] = 255
+        marcas[k0 : fin + 1 : paso] = b"\xff" * ancho
+        for d in range(1, paso):
+            marcas[k0 + d : fin : paso] = este
+        if ultima:
+            break
+
+        # al sur: cada conjunto baja por al menos un nodo; el que no baja
+        # sale de su conjunto y en la fila siguiente empieza uno propio
+        sur = bytearray(b"\xff") * ancho
+        for x in range(ancho):
+            d = der[x]
+            if d != x and azar[ancho + x] & 1:
+                i = izq[x]
+                der[i] = d
+                izq[d] = i
+                der[x] = izq[x] = x
+                sur[x] = 0
+        for d in range(1, paso):
+            marcas[k0 + d * cols : fin + d * cols + 1 : paso] = sur
+
+    # celdas = codigo donde hay marca, lo que estaba en el resto
+    mascara = int.from_bytes(marcas, "little")
+    previas = int.from_bytes(celdas, "little")
+    carvadas = int.from_bytes(bytes([codigo]) * n, "little")
+    celdas[:] = ((previas & ~mascara) | (carvadas & mascara)).to_bytes(n, "little")
+
+
+def decorar(grilla, camino, rng, liana=0):
+    """Convierte muros junto a CAMINO en lianas y túneles.
+
+    Como cada liana y cada túnel nuevo toca un CAMINO, si la zona de los
+    enemigos (camino + liana) es conexa lo sigue siendo, y el jugador
+    (camino + túnel) no pierde ningún recorrido.
+    """
+    candidatos = grilla.vecinos(camino) & ~camino & ~liana & ~grilla.borde
+    azar = grilla.aleatorio(rng, 2)
+    elegir = rng.getrandbits(grilla.n)
+    liana |= candidatos & azar & elegir
+    tunel = candidatos & azar & ~elegir
+    return grilla.a_celdas([(camino, CAMINO), (liana, LIANA), (tunel, TUNEL)])
+
+
+def generar_clasico(cols, rows, inicio, salida, rng):
+    """El mapa original: un recorrido garantizado y el resto al azar.
+
+    Solo garantiza que el jugador llega a la salida; la zona de los
+    enemigos puede quedar partida como antes.
+    """
+    n = cols * rows
+    # 1. Rellenar con tipos aleatorios, bordes de muro
+    celdas = bytearray(rng.randbytes(n).translate(TABLA_RELLENO))
+    celdas[:cols] = celdas[n - cols :] = bytes([MURO]) * cols
+    celdas[::cols] = celdas[cols - 1 :: cols] = bytes([MURO]) * rows
+
+    # 2. Carvar un camino aleatorio desde inicio hasta salida (solo camino normal)
+    carvar_recorrido(celdas, cols, rows, inicio, salida, rng)
+    return celdas
+
+
+def generar_laberinto(cols, rows, inicio, salida, rng):
+    """Laberinto perfecto: árbol aleatorio sobre las celdas impares."""
+    celdas = bytearray([MURO]) * (cols * rows)
+    carvar_arbol(celdas, cols, rows, 2, CAMINO, rng)
+
+    # inicio y salida pueden caer en coordenadas pares: unirlos al laberinto
+    for x, y in (inicio, salida):
+        celdas[y * cols + x] = CAMINO
+        if x % 2 == 0:
+            x -= 1
+            celdas[y * cols + x] = CAMINO
+        if y % 2 == 0:
+            celdas[(y - 1) * cols + x] = CAMINO
+
+    grilla = GrillaBits(cols, rows)
+    return decorar(grilla, grilla.de_celdas(celdas, (CAMINO,)), rng)
+
+
+def mayoria_muros(grilla, muros):
+    """Paso del autómata: muro si hay 5 o más muros en su vecindad 3x3."""
+    oeste = grilla.desde_oeste(muros, True)
+    este = grilla.desde_este(muros, True)
+    vecinos = [
+        muros,
+        oeste,
+        este,
+        grilla.desde_norte(muros, True),
+        grilla.desde_sur(muros, True),
+        grilla.desde_norte(oeste, True),
+        grilla.desde_norte(este, True),
+        grilla.desde_sur(oeste, True),
+        grilla.desde_sur(este, True),
+    ]
+    # contador binario por celda (c[0] es el bit menos significativo)
+    c = [0, 0, 0, 0]
+    for bits in vecinos:
+        for i in range(4):
+            c[i], bits = c[i] ^ bits, c[i] & bits
+            if not bits:
+                break
+    return c[3] | (c[2] & (c[1] | c[0]))
+
+
+def generar_cuevas(cols, rows, inicio, salida, rng, pasos=4):
+    """Cuevas por autómata celular unidas por un esqueleto de lianas.
+
+    Las cuevas solo se conservan hasta 2 * PASO_CUEVAS pasos del esqueleto
+    (un árbol aleatorio más el recorrido del jugador); lo que queda más
+    lejos o aislado se vuelve muro. Donde el esqueleto cruza roca queda
+    liana, que los enemigos pueden atravesar.
+    """
+    grilla = GrillaBits(cols, rows)
+    n = grilla.n
+    # ~44% de muros al azar, luego suavizar
+    muros = rng.getrandbits(n) & (
+        rng.getrandbits(n) | rng.getrandbits(n) | rng.getrandbits(n)
+    )
+    for _ in range(pasos):
+        muros = mayoria_muros(grilla, muros | grilla.borde)
+    abiertas = grilla.todo & ~(muros | grilla.borde)
+
+    celdas = bytearray([MURO]) * n
+    carvar_recorrido(celdas, cols, rows, inicio, salida, rng)
+    recorrido = grilla.de_celdas(celdas, (CAMINO,))
+    carvar_arbol(celdas, cols, rows, PASO_CUEVAS, CAMINO, rng)
+    esqueleto = grilla.de_celdas(celdas, (CAMINO,))
+
+    alcanzadas = grilla.crecer(esqueleto, abiertas, 2 * PASO_CUEVAS)
+    camino = alcanzadas & (abiertas | recorrido)
+    return decorar(grilla, camino, rng, liana=alcanzadas & ~camino)
+
+
+def generar_salas(cols, rows, inicio, salida, rng):
+    """Salas rectangulares unidas en cadena por pasillos en L."""
+    celdas = bytearray([MURO]) * (cols * rows)
+    salas = []
+    for _ in range(max(2, cols * rows // 150)):
+        ancho = min(rng.randint(3, 8), cols - 2)
+        alto = min(rng.randint(3, 6), rows - 2)
+        x0 = rng.randint(1, cols - 1 - ancho)
+        y0 = rng.randint(1, rows - 1 - alto)
+        for y in range(y0, y0 + alto):
+            celdas[y * cols + x0 : y * cols + x0 + ancho] = bytes([CAMINO]) * ancho
+        salas.append((x0 + ancho // 2, y0 + alto // 2))
+
+    # recorrer las salas en franjas en zigzag para unir salas cercanas;
+    # la cadena inicio -> salas -> salida deja todo conectado
+    salas.sort(key=lambda c: (c[1] // 10, c[0] if c[1] // 10 % 2 == 0 else -c[0]))
+    puntos = [inicio] + salas + [salida]
+    for (ax, ay), (bx, by) in zip(puntos, puntos[1:]):
+        if rng.random() < 0.5:
+            carvar_pasillo(celdas, cols, ax, ay, bx, ay)
+            carvar_pasillo(celdas, cols, bx, ay, bx, by)
+        else:
+            carvar_pasillo(celdas, cols, ax, ay, ax, by)
+            carvar_pasillo(celdas, cols, ax, by, bx, by)
+
+    grilla = GrillaBits(cols, rows)
+    return decorar(grilla, grilla.de_celdas(celdas, (CAMINO,)), rng)
+
+
+GENERADORES = {
+    "clasico": generar_clasico,
+    "laberinto": generar_laberinto,
+    "cuevas": generar_cuevas,
+    "salas": generar_salas,
+}
+
+
+# =========================
+# RESERVA DE MAPAS
+# =========================
+
+
+def largo_minimo_mapa(cols, rows, generador):
+    """Camino mínimo del inicio a la salida que se le exige al mapa."""
+    return int(LARGO_MINIMO_MAPA.get(generador, 1.0) * (cols + rows - 6))
+
+
+def generar_validado(cols, rows, generador, semillas, largo_minimo=0):
+    """Genera con semillas sucesivas hasta que la salida quede lejos.
+
+    Descarta los mapas sin camino del jugador hasta la salida o con uno más
+    corto que largo_minimo. Tras INTENTOS_MAPA semillas acepta el mapa con
+    el camino más largo, para no quedarse generando para siempre.
+    Devuelve (game_map, semilla, distancia).
+    """
+    mejor = None
+    for _ in range(INTENTOS_MAPA):
+        semilla = next(semillas)
+        game_map = GameMap(cols, rows)
+        game_map.generar(random.Random(semilla), generador)
+        distancia = game_map.distancia_salida()
+        if distancia >= max(largo_minimo, 0):
+            return game_map, semilla, distancia
+        if distancia >= 0 and (mejor is None or distancia > mejor[2]):
+            mejor = (game_map, semilla, distancia)
+    if mejor is None:
+        raise RuntimeError(f"El generador {generador} no produjo mapas jugables")
+    return mejor
+
+
+class PoolMapas:
+    """Mapas de una configuración generados y validados por un hilo de fondo.
+
+    tomar() entrega un mapa listo al instante; mientras la partida corre el
+    hilo repone la reserva. Con archivo, tras detener() el hilo guarda los
+    mapas que sobran y la próxima ejecución empieza con ellos.
+    """
+
+    def __init__(
+        self,
+        cols,
+        rows,
+        generador="clasico",
+        tamano=TAMANO_RESERVA,
+        semilla=None,
+        largo_minimo=0,
+        archivo=None,
+    ):
+        self.cols = cols
+        self.rows = rows
+        self.generador = generador
+        self.largo_minimo = largo_minimo
+        self.archivo = archivo
+        if semilla is None:
+            semilla = random.randrange(2**32)
+        # next() sobre itertools.count es atómico: el hilo y tomar() nunca
+        # repiten semilla
+        self.semillas = itertools.count(semilla)
+        self.listos = queue.Queue(maxsize=tamano)
+        self.detenido = threading.Event()
+
+        if archivo:
+            self.cargar()
+        # sin daemon: al salir, el proceso espera a que el hilo guarde la
+        # reserva, pero la ventana ya se cerró
+        self.hilo = threading.Thread(target=self.llenar)
+        self.hilo.start()
+
+    def activo(self):
+        # si el programa termina sin detener() (un error), el hilo sale solo
+        return not self.detenido.is_set() and threading.main_thread().is_alive()
+
+    def llenar(self):
+        while self.activo():
+            listo = generar_validado(
+                self.cols,
+                self.rows,
+                self.generador,
+                self.semillas,
+                self.largo_minimo,
+            )
+            # el índice de zonas también se arma acá y no al empezar la partida
+            listo[0].zonas
+            while self.activo():
+                try:
+                    self.listos.put(listo, timeout=0.2)
+                    break
+                except queue.Full:
+                    pass
+        if self.detenido.is_set() and self.archivo:
+            self.guardar()
+
+    def tomar(self):
+        """Devuelve (game_map, semilla); si no hay reserva genera en el momento."""
+        try:
+            game_map, semilla, _ = self.listos.get_nowait()
+        except queue.Empty:
+            game_map, semilla, _ = generar_validado(
+                self.cols,
+                self.rows,
+                self.generador,
+                self.semillas,
+                self.largo_minimo,
+            )
+        return game_map, semilla
+
+    def detener(self):
+        """Pide al hilo que termine sin esperarlo; él guarda la reserva."""
+        self.detenido.set()
+
+    def guardar(self):
+        """Escribe los mapas de la reserva, uno por línea (celdas con zlib)."""
+        lineas = []
+        while True:
+            try:
+                game_map, semilla, distancia = self.listos.get_nowait()
+            except queue.Empty:
+                break
+            datos = zlib.compress(bytes(game_map.celdas))
+            registro = {
+                "version": VERSION_REPLAY,
+                "cols": game_map.cols,
+                "rows": game_map.rows,
+                "generador": self.generador,
+                "semilla": semilla,
+                "distancia": distancia,
+                "celdas": base64.b64encode(datos).decode("ascii"),
+            }
+            lineas.append(json.dumps(registro) + "\n")
+        try:
+            with open(self.archivo, "w", encoding="utf-8") as f:
+                f.writelines(lineas)
+        except OSError:
+            pass
+
+    def cargar(self):
+        if not os.path.exists(self.archivo):
+            return
+        try:
+            with open(self.archivo, "r", encoding="utf-8") as f:
+                for linea in f:
+                    registro = json.loads(linea)
+                    if (
+                        registro["cols"],
+                        registro["rows"],
+                        registro["generador"],
+                    ) != (self.cols, self.rows, self.generador):
+                        continue
+                    if registro.get("version") != VERSION_REPLAY:
+                        continue  # otro generador: la semilla no lo reproduce
+                    if registro["distancia"] < self.largo_minimo:
+                        continue  # guardado con un largo mínimo anterior
+                    celdas = zlib.decompress(base64.b64decode(registro["celdas"]))
+                    if len(celdas) != self.cols * self.rows:
+                        continue
+                    game_map = GameMap(self.cols, self.rows)
+                    game_map.asignar(celdas)
+                    self.listos.put_nowait(
+                        (game_map, registro["semilla"], registro["distancia"])
+                    )
+        except (OSError, ValueError, KeyError, zlib.error, queue.Full):
+            # archivo dañado o con más mapas de los que caben: lo ya cargado sirve
+            pass
+
+
+# =========================
+# NAVEGACIÓN DE ENEMIGOS
+# =========================
+
+
+class CampoDistancias:
+    """Distancias desde el jugador por el terreno que pisan los enemigos.
+
+    Lo comparten todos los enemigos y se mantiene de forma incremental:
+    - mover_objetivo(x, y) solo reinicia la búsqueda (O(1)); las distancias
+      se expanden a pedido, así que el costo depende de qué tan lejos están
+      los enemigos y no del tamaño del mapa.
+    - cambiar_celda(x, y) repara solo la zona cuyas distancias cambian
+      cuando una celda se abre o se cierra para los enemigos.
+    Con limite, las celdas a más de esa distancia quedan sin distancia (-1)
+    y la búsqueda nunca pasa de ese radio.
+    Internamente es un Dijkstra con cubetas (pesos unitarios) reanudable.
+    """
+
+    def __init__(self, game_map, limite=None):
+        self.game_map = game_map
+        n = game_map.cols * game_map.rows
+        self.limite = limite
+        self.objetivo = None
+        # una celda tiene distancia si marca == epoca y está cerrada
+        # (definitiva) si cerrada == epoca; cambiar de época borra todo
+        self.dist = array("i", [0]) * n
+        self.marca = array("I", [0]) * n
+        self.cerrada = array("I", [0]) * n
+        self.epoca = 0
+        # cubetas[d] = celdas pendientes de expandir a distancia d
+        self.cubetas = []
+        self.actual = 0
+        # componentes de ZonasEnemigo que llegan al objetivo; las demás
+        # celdas no tienen camino y se responden sin expandir. Se calculan
+        # para un índice y sus cambios (clave); None si el índice no vigente
+        self.alcanzables = None
+        self.clave_alcanzables = None
+
+    def mover_objetivo(self, x, y):
+        if (x, y) == self.objetivo:
+            return
+        self.objetivo = (x, y)
+        self.epoca += 1
+        if self.epoca > 0xFFFFFFFF:
+            self.marca = array("I", [0]) * len(self.marca)
+            self.cerrada = array("I", [0]) * len(self.cerrada)
+            self.epoca = 1
+        k = y * self.game_map.cols + x
+        self.marca[k] = self.epoca
+        self.dist[k] = 0
+        self.cubetas = [[k]]
+        self.actual = 0
+        self.clave_alcanzables = None
+
+    def distancia(self, x, y):
+        """Pasos hasta el objetivo, o -1 si no hay camino."""
+        cols = self.game_map.cols
+        if not (0 <= x < cols and 0 <= y < self.game_map.rows):
+            return -1
+        return self.distancia_celda(y * cols + x)
+
+    def distancia_celda(self, k):
+        """Como distancia() con el índice plano de una celda dentro del mapa."""
+        epoca = self.epoca
+        # una celda cerrada es definitiva salvo que una celda abierta después
+        # haya dejado pendientes más cerca que ella
+        if self.cerrada[k] == epoca and self.dist[k] <= self.actual:
+            return self.dist[k]
+        if self.marca[k] != epoca:
+            if not self.game_map.paso[k] & PASO_ENEMIGO:
+                return -1
+            zonas = self.game_map.zonas
+            alcanzables = self.revisar_alcanzables(zonas)
+            if alcanzables is not None:
+                if zonas.raiz(zonas.componente[k]) not in alcanzables:
+                    return -1
+        self.expandir_hasta(k)
+        return self.dist[k] if self.marca[k] == epoca else -1
+
+    def revisar_alcanzables(self, zonas):
+        """Las componentes que llegan al objetivo según zonas (None si no sirve)."""
+        if self.clave_alcanzables != (zonas, zonas.cambios):
+            self.clave_alcanzables = (zonas, zonas.cambios)
+            self.alcanzables = None
+            if zonas.vigente:
+                ox, oy = self.objetivo
+                k = oy * self.game_map.cols + ox
+                self.alcanzables = frozenset(zonas.alrededor(k))
+        return self.alcanzables
+
+    def expandir_hasta(self, objetivo):
+        """Expande hasta que ninguna celda pendiente pueda mejorar objetivo."""
+        cols = self.game_map.cols
+        n = len(self.dist)
+        paso = self.game_map.paso
+        marca = self.marca
+        dist = self.dist
+        cerrada = self.cerrada
+        epoca = self.epoca
+        cubetas = self.cubetas
+        # con límite, las celdas a esa distancia ya no se expanden
+        ultima = len(dist) if self.limite is None else self.limite
+        d = self.actual
+        while d < len(cubetas):
+            cubeta = cubetas[d]
+            if not cubeta:
+                d += 1
+                continue
+            if marca[objetivo] == epoca and dist[objetivo] <= d:
+                break
+            k = cubeta.pop()
+            if marca[k] != epoca or dist[k] != d or cerrada[k] == epoca:
+                continue  # entrada vieja
+            cerrada[k] = epoca
+            if d >= ultima:
+                continue
+            x = k % cols
+            for v in (
+                k - cols,
+                k + cols,
+                k - 1 if x > 0 else -1,
+                k + 1 if x < cols - 1 else -1,
+            ):
+                if (
+                    0 <= v < n
+                    and paso[v] & PASO_ENEMIGO
+                    and (marca[v] != epoca or dist[v] > d + 1)
+                ):
+                    marca[v] = epoca
+                    dist[v] = d + 1
+                    cerrada[v] = 0
+                    if len(cubetas) == d + 1:
+                        cubetas.append([])
+                    cubetas[d + 1].append(v)
+        self.actual = d
+
+    def relajar(self, k, d):
+        if self.marca[k] == self.epoca and self.dist[k] <= d:
+            return
+        if self.limite is not None and d > self.limite:
+            return
+        self.marca[k] = self.epoca
+        self.dist[k] = d
+        self.cerrada[k] = 0  # se reabre si ya estaba cerrada
+        cubetas = self.cubetas
+        while len(cubetas) <= d:
+            cubetas.append([])
+        cubetas[d].append(k)
+        if d < self.actual:
+            self.actual = d
+
+    def vecinos(self, k):
+        cols = self.game_map.cols
+        x = k % cols
+        v = []
+        if k >= cols:
+            v.append(k - cols)
+        if k + cols < len(self.dist):
+            v.append(k + cols)
+        if x > 0:
+            v.append(k - 1)
+        if x < cols - 1:
+            v.append(k + 1)
+        return v
+
+    def cambiar_celda(self, x, y):
+        """Repara las distancias tras cambiar el paso de enemigos en (x, y)."""
+        if self.objetivo is None:
+            return
+        cols = self.game_map.cols
+        if (x, y) == self.objetivo:
+            return
+        k = y * cols + x
+        marca = self.marca
+        dist = self.dist
+        epoca = self.epoca
+
+        if self.game_map.paso[k] & PASO_ENEMIGO:
+            # se abrió: puede acortar caminos a partir de sus vecinos
+            for u in self.vecinos(k):
+                if marca[u] == epoca:
+                    self.relajar(k, dist[u] + 1)
+            return
+
+        if marca[k] != epoca:
+            return  # la búsqueda todavía no llegó hasta aquí
+
+        # se cerró: buscar las celdas que solo tenían camino a través de k,
+        # por niveles de distancia creciente
+        afectadas = {k}
+        cola = [k]
+        for v in cola:
+            for w in self.vecinos(v):
+                if w in afectadas or marca[w] != epoca or dist[w] != dist[v] + 1:
+                    continue
+                apoyo = False
+                for u in self.vecinos(w):
+                    if (
+                        u not in afectadas
+                        and marca[u] == epoca
+                        and dist[u] == dist[w] - 1
+                    ):
+                        apoyo = True
+                        break
+                if not apoyo:
+                    afectadas.add(w)
+                    cola.append(w)
+
+        for v in afectadas:
+            marca[v] = 0
+            self.cerrada[v] = 0
+        # recalcular desde el borde que no cambió
+        for v in cola[1:]:
+            for u in self.vecinos(v):
+                if marca[u] == epoca:
+                    self.relajar(v, dist[u] + 1)
+
+
+class CampoLejano:
+    """Distancias atrasadas para los enemigos fuera del radio del campo exacto.
+
+    Es un BFS completo desde una posición reciente del jugador (el ancla)
+    que se rehace de a pedazos: avanzar() expande a lo sumo `cuota` celdas
+    por tick y, al terminar, el nuevo campo reemplaza al anterior. Un paso
+    del jugador cambia cada distancia en 1 como mucho, así que para un
+    enemigo lejano seguir un campo de hace unos segundos alcanza.
+    El trabajo se cuenta en celdas y no en tiempo, así la partida sigue
+    siendo reproducible, y reconstruir() lo rehace al cargar una partida.
+    """
+
+    def __init__(self, game_map):
+        self.game_map = game_map
+        # campo en uso: -1 = sin camino; None hasta que termina el primero
+        self.dist = None
+        self.ancla = None
+        # BFS en curso: distancias, celdas que pisan los enemigos y todavía
+        # no se alcanzaron, cola y cuántas celdas de la cola se expandieron
+        self.ancla_nueva = None
+        self.nueva = None
+        self.libre = None
+        self.cola = None
+        self.hecho = 0
+        self.cuota = 0
+
+    def avanzar(self, x, y):
+        """El trabajo de un tick; si no hay un BFS en curso empieza en (x, y)."""
+        if self.nueva is None:
+            if self.ancla is not None:
+                ax, ay = self.ancla
+                if abs(x - ax) + abs(y - ay) < ALEJAMIENTO_ANCLA:
+                    return  # el campo en uso todavía sirve
+            self.empezar(x, y)
+        self.expandir(self.cuota)
+
+    def empezar(self, x, y):
+        game_map = self.game_map
+        k = y * game_map.cols + x
+        self.ancla_nueva = (x, y)
+        self.nueva = array("i", [-1]) * (game_map.cols * game_map.rows)
+        self.nueva[k] = 0
+        self.libre = bytearray(game_map.paso.translate(TABLA_TRAMOS))
+        self.libre[k] = 0
+        self.cola = [k]
+        self.hecho = 0
+        zonas = game_map.zonas
+        area = 1 + sum(zonas.tamano(c) for c in zonas.alrededor(k))
+        self.cuota = min(CUOTA_CAMPO_LEJANO, -(-area // PERIODO_CAMPO_LEJANO))
+
+    def expandir(self, cuantas):
+        cols = self.game_map.cols
+        dist = self.nueva
+        libre = self.libre
+        cola = self.cola
+        agregar = cola.append
+        hecho = self.hecho
+        fin = hecho + cuantas
+        # se recorre la cola por tramos (las celdas agregadas quedan para el
+        # siguiente); los bordes del mapa son muro: k + desplazamiento no se sale
+        while hecho < fin:
+            tramo = cola[hecho:fin]
+            if not tramo:
+                break
+            hecho += len(tramo)
+            for k in tramo:
+                d = dist[k] + 1
+                v = k - cols
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+                v = k + cols
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+                v = k - 1
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+                v = k + 1
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+        self.hecho = hecho
+        if hecho == len(cola):
+            self.dist = dist
+            self.ancla = self.ancla_nueva
+            self.ancla_nueva = self.nueva = self.libre = self.cola = None
+            self.hecho = 0
+
+    def cambiar_terreno(self):
+        # descartar ambos campos mantiene cada uno hecho sobre un solo terreno,
+        # que es lo que reconstruir() puede repetir
+        self.dist = self.ancla = None
+        self.ancla_nueva = self.nueva = self.libre = self.cola = None
+        self.hecho = 0
+
+    def reconstruir(self, ancla, ancla_nueva, hecho):
+        """Rehace el estado guardado con ancla, ancla_nueva y hecho."""
+        self.cambiar_terreno()
+        if ancla is not None:
+            self.empezar(*ancla)
+            self.expandir(len(self.nueva))
+        if ancla_nueva is not None:
+            self.empezar(*ancla_nueva)
+            self.expandir(hecho)
+
+
 # =========================
 # ENTIDADES
 # =========================
 
 
 class Jugador:
-    def __init__(self, x, y):
+    def __init__(self, x, y, tick=0):
         self.x = x
         self.y = y
         self.energia_max = 100
         self.energia = self.energia_max
-        self.ultima_recuperacion = time.time()
+        self.ultima_recuperacion = tick
 
     def mover(self, dx, dy, game_map, correr=False):
         pasos = 2 if correr and self.energia >= 10 else 1
         for _ in range(pasos):
             nx = self.x + dx
             ny = self.y + dy
-            cas = game_map.casilla(nx, ny)
-            if cas.puede_pasar_jugador():
+            if game_map.puede_pasar_jugador(nx, ny):
                 self.x = nx
                 self.y = ny
             else:
@@ -200,70 +1458,1338 @@ class Jugador:
         if correr and pasos == 2:
             self.energia = max(0, self.energia - 10)
 
-    def actualizar_energia(self):
-        ahora = time.time()
-        # recupera 1 punto por segundo
-        if ahora - self.ultima_recuperacion >= 1.0:
-            self.energia = min(self.energia_max, self.energia + 1)
-            self.ultima_recuperacion = ahora
+    def recuperar_energia(self, tick):
+        # 1 punto; GameState lo programa cada RECUPERACION_ENERGIA ticks
+        self.energia = min(self.energia_max, self.energia + 1)
+        self.ultima_recuperacion = tick
+
+
+class TablaEnemigos:
+    """Todos los enemigos como columnas paralelas (array), una fila por enemigo.
+
+    GameState mueve y revive recorriendo las columnas con índices planos de
+    celda, sin objetos intermedios, lo que permite hordas de miles de
+    enemigos. Para el resto del código (dibujo, colisiones, políticas del
+    simulador) cada fila también se ve como un Enemigo en `filas`.
+    """
+
+    def __init__(self, cols):
+        self.cols = cols
+        self.x = array("i")
+        self.y = array("i")
+        self.vivo = array("b")
+        self.tick_muerte = array("i")  # -1 = sin definir
+        self.velocidad = array("d")  # factor de dificultad
+        self.intervalo = array("i")
+        self.ultimo_movimiento = array("i")
+        self.filas = []
+        # (dx, dy, desplazamiento del índice plano) en el orden de DIRECCIONES
+        self.vecinos = [(dx, dy, dy * cols + dx) for dx, dy in DIRECCIONES]
+
+    def __len__(self):
+        return len(self.filas)
+
+    def agregar(self, x, y, velocidad=1.0, tick=0):
+        self.x.append(x)
+        self.y.append(y)
+        self.vivo.append(1)
+        self.tick_muerte.append(-1)
+        self.velocidad.append(velocidad)
+        # enemigos más rápidos se mueven más seguido: 6, 4 y 3 ticks
+        self.intervalo.append(
+            max(INTERVALO_MINIMO_ENEMIGO, round(INTERVALO_ENEMIGO / velocidad))
+        )
+        self.ultimo_movimiento.append(tick)
+        enemigo = Enemigo(self, len(self.filas))
+        self.filas.append(enemigo)
+        return enemigo
+
+    def asignar_columnas(self, columnas):
+        """Reemplaza todas las filas por las columnas dadas (nombre -> array)."""
+        for nombre, valores in columnas.items():
+            setattr(self, nombre, valores)
+        self.filas = [Enemigo(self, i) for i in range(len(self.x))]
+
+    def revivir(self, i, x, y):
+        self.x[i] = x
+        self.y[i] = y
+        self.vivo[i] = 1
+        self.tick_muerte[i] = -1
+
+    def mover(self, i, jugador, game_map, modo, tick, campo, lejano=None):
+        """Un paso del enemigo i según el campo; True si cambió de celda.
+
+        No revisa si le toca moverse: eso lo hace quien recorre la tabla.
+        Fuera del radio del campo se usa el CampoLejano, si hay.
+        """
+        self.ultimo_movimiento[i] = tick
+        x = self.x[i]
+        y = self.y[i]
+        k = y * self.cols + x
+        paso = game_map.paso
+        distancia = campo.distancia_celda
+        # fuera del radio del campo (si ya la línea recta lo supera ni se
+        # consulta) se sigue el campo lejano; sin camino en ninguno de los
+        # dos, la distancia en línea recta
+        lejos = (
+            campo.limite is not None
+            and abs(x - jugador.x) + abs(y - jugador.y) > campo.limite
+        )
+        conectado = not lejos and distancia(k) >= 0
+        atrasada = None
+        if not conectado and lejano is not None and lejano.dist is not None:
+            if lejano.dist[k] >= 0:
+                atrasada = lejano.dist
+        huir = modo != MODO_ESCAPA
+        mejor = None
+        mejor_dist = None
+        # los bordes del mapa son muro: k + desplazamiento no se sale
+        for dx, dy, desplazamiento in self.vecinos:
+            v = k + desplazamiento
+            if not paso[v] & PASO_ENEMIGO:
+                continue
+            if conectado:
+                d = distancia(v)
+                if d < 0:
+                    continue  # más allá del límite del campo
+            elif atrasada is not None:
+                d = atrasada[v]
+            else:
+                d = abs(x + dx - jugador.x) + abs(y + dy - jugador.y)
+            # perseguir -> minimizar distancia; huir -> maximizarla
+            if mejor_dist is None or (d > mejor_dist if huir else d < mejor_dist):
+                mejor_dist = d
+                mejor = (dx, dy)
+        if mejor is None:
+            return False
+        self.x[i] = x + mejor[0]
+        self.y[i] = y + mejor[1]
+        return True
+
+
+def columna_enemigo(nombre, leer=None, escribir=None):
+    """Propiedad de Enemigo que lee y escribe su fila en una columna."""
+
+    def get(self):
+        valor = getattr(self.tabla, nombre)[self.i]
+        return leer(valor) if leer else valor
+
+    def set(self, valor):
+        getattr(self.tabla, nombre)[self.i] = escribir(valor) if escribir else valor
+
+    return property(get, set)
 
 
 class Enemigo:
-    def __init__(self, x, y, velocidad=1.0):
+    """Una fila de TablaEnemigos vista como objeto."""
+
+    __slots__ = ("tabla", "i")
+
+    x = columna_enemigo("x")
+    y = columna_enemigo("y")
+    vivo = columna_enemigo("vivo", bool, int)
+    tick_muerte = columna_enemigo(
+        "tick_muerte",
+        lambda t: None if t < 0 else t,
+        lambda t: -1 if t is None else t,
+    )
+    velocidad = columna_enemigo("velocidad")
+    intervalo = columna_enemigo("intervalo")
+    ultimo_movimiento = columna_enemigo("ultimo_movimiento")
+
+    def __init__(self, tabla, i):
+        self.tabla = tabla
+        self.i = i
+
+    def listo_para_moverse(self, tick):
+        return tick - self.ultimo_movimiento >= self.intervalo
+
+    def mover(self, jugador, game_map, modo, tick, campo, lejano=None):
+        if not self.vivo:
+            return
+        if not self.listo_para_moverse(tick):
+            return
+        self.tabla.mover(self.i, jugador, game_map, modo, tick, campo, lejano)
+
+
+class Trampa:
+    def __init__(self, x, y, tick=0):
         self.x = x
         self.y = y
-        self.vivo = True
-        self.tiempo_muerte = None
-        self.velocidad = velocidad  # factor de dificultad
-        self.ultimo_movimiento = time.time()
+        self.colocada_en = tick
 
-    def listo_para_moverse(self):
-        # enemigos más rápidos se mueven más seguido
-        intervalo = max(0.2, 0.6 / self.velocidad)
-        return time.time() - self.ultimo_movimiento >= intervalo
 
-    def mover(self, jugador, game_map, modo):
-        if not self.vivo:
+# =========================
+# RELOJES
+# =========================
+# La partida avanza en ticks fijos; el reloj solo dice cuántos tocan. En el
+# juego es el tiempo monótono real y en simulaciones o pruebas uno virtual
+# que se adelanta a mano, así que GameState nunca consulta la hora.
+
+
+class RelojMonotono:
+    """Segundos reales desde su creación, sin saltos por cambios de hora."""
+
+    def __init__(self):
+        self.origen = time.monotonic()
+
+    def ahora(self):
+        return time.monotonic() - self.origen
+
+
+class RelojVirtual:
+    """Reloj manual: solo avanza cuando se llama a avanzar()."""
+
+    def __init__(self, segundos=0.0):
+        self.segundos = segundos
+
+    def ahora(self):
+        return self.segundos
+
+    def avanzar(self, segundos):
+        self.segundos += segundos
+
+
+# =========================
+# PLANIFICADOR DEL LOOP
+# =========================
+# Tk llama a un único callback; el planificador decide en cada llamada
+# cuántos ticks tocan según el reloj, si queda presupuesto para dibujar y
+# cuándo volver a llamar. Un cuadro lento retrasa el dibujo, no la partida.
+
+
+class Planificador:
+    def __init__(
+        self, reloj, presupuesto=PRESUPUESTO_LOOP, max_ticks=MAX_TICKS_POR_LLAMADA
+    ):
+        self.reloj = reloj
+        self.presupuesto = presupuesto
+        self.max_ticks = max_ticks
+        self.velocidad = 1.0
+        # instante del reloj que corresponde al tick 0
+        self.origen = 0.0
+        self.inicio_llamada = 0.0
+        self.intervalo_dibujo = 1 / TICKS_POR_SEGUNDO
+        self.ultimo_dibujo = None
+        self.ticks_descartados = 0
+        self.frames_omitidos = 0
+        self.llamadas_excedidas = 0
+
+    def iniciar(self, tick=0, velocidad=1.0):
+        """Empieza a contar desde tick; velocidad > 1 acelera (replays)."""
+        self.velocidad = velocidad
+        self.origen = self.reloj.ahora() - tick / (TICKS_POR_SEGUNDO * velocidad)
+        self.intervalo_dibujo = 1 / TICKS_POR_SEGUNDO
+        self.ultimo_dibujo = None
+        self.ticks_descartados = 0
+        self.frames_omitidos = 0
+        self.llamadas_excedidas = 0
+
+    def tick_objetivo(self):
+        transcurrido = (self.reloj.ahora() - self.origen) * self.velocidad
+        return int(transcurrido * TICKS_POR_SEGUNDO)
+
+    def empezar_llamada(self):
+        self.inicio_llamada = self.reloj.ahora()
+
+    def excedido(self):
+        return self.reloj.ahora() - self.inicio_llamada > self.presupuesto
+
+    def ticks_pendientes(self, tick):
+        """Ticks a correr en esta llamada, como mucho max_ticks (por velocidad).
+
+        Un atraso mayor no se recupera: se corre el origen y la partida va
+        más lenta un momento en vez de avanzar a saltos.
+        """
+        pendientes = self.tick_objetivo() - tick
+        tope = max(self.max_ticks, int(self.max_ticks * self.velocidad))
+        if pendientes > tope:
+            descartados = pendientes - tope
+            self.origen += descartados / (TICKS_POR_SEGUNDO * self.velocidad)
+            self.ticks_descartados += descartados
+            pendientes = tope
+        return max(0, pendientes)
+
+    def toca_dibujar(self):
+        """Si esta llamada dibuja; cuenta los cuadros que se omiten."""
+        if self.ultimo_dibujo is None:
+            return True
+        espera = self.reloj.ahora() - self.ultimo_dibujo
+        if espera >= 1 / FPS_MINIMO:
+            return True
+        # medio tick de tolerancia por el jitter de after()
+        if self.excedido() or espera < self.intervalo_dibujo - 0.5 / TICKS_POR_SEGUNDO:
+            self.frames_omitidos += 1
+            return False
+        return True
+
+    def dibujado(self, inicio):
+        """Ajusta el intervalo de dibujo según lo que costó el cuadro."""
+        ahora = self.reloj.ahora()
+        costo = ahora - inicio
+        self.ultimo_dibujo = ahora
+        if costo > self.presupuesto / 2:
+            self.intervalo_dibujo = min(self.intervalo_dibujo * 2, 1 / FPS_MINIMO)
+        elif costo < self.presupuesto / 4:
+            self.intervalo_dibujo = max(
+                self.intervalo_dibujo * 0.75, 1 / TICKS_POR_SEGUNDO
+            )
+
+    def terminar_llamada(self, tick):
+        """Milisegundos hasta la próxima llamada, cuando toque el tick siguiente."""
+        if self.excedido():
+            self.llamadas_excedidas += 1
+        siguiente = self.origen + (tick + 1) / (TICKS_POR_SEGUNDO * self.velocidad)
+        return max(1, int((siguiente - self.reloj.ahora()) * 1000) + 1)
+
+    def resumen(self):
+        return (
+            f"ticks descartados {self.ticks_descartados} | "
+            f"cuadros omitidos {self.frames_omitidos} | "
+            f"llamadas excedidas {self.llamadas_excedidas} | "
+            f"dibujo cada {self.intervalo_dibujo * 1000:.0f} ms"
+        )
+
+
+# =========================
+# ÍNDICE DE OCUPACIÓN
+# =========================
+
+
+class IndiceOcupacion:
+    """Entidades registradas por celda, para consultar una posición en O(1)."""
+
+    def __init__(self, cols):
+        self.cols = cols
+        self.celdas = {}  # índice plano -> lista de entidades
+
+    def agregar(self, entidad, x=None, y=None):
+        if x is None:
+            x, y = entidad.x, entidad.y
+        k = y * self.cols + x
+        self.celdas.setdefault(k, []).append(entidad)
+
+    def quitar(self, entidad, x=None, y=None):
+        if x is None:
+            x, y = entidad.x, entidad.y
+        k = y * self.cols + x
+        lista = self.celdas[k]
+        lista.remove(entidad)
+        if not lista:
+            del self.celdas[k]
+
+    def mover(self, entidad, x0, y0, x=None, y=None):
+        """Actualiza el registro de una entidad que pasó de (x0, y0) a su celda."""
+        self.quitar(entidad, x0, y0)
+        self.agregar(entidad, x, y)
+
+    def en(self, x, y):
+        return self.celdas.get(y * self.cols + x, ())
+
+
+# =========================
+# INSTRUMENTACIÓN
+# =========================
+# Latencias en nanosegundos (perf_counter_ns) agrupadas en cubetas log2:
+# registrar una medición es un bit_length y un incremento, así que puede
+# quedar activa siempre.
+
+
+class Histograma:
+    """La cubeta i cuenta las mediciones con i bits: [2**(i-1), 2**i) ns."""
+
+    def __init__(self):
+        self.cubetas = [0] * 64
+        self.cantidad = 0
+        self.total = 0
+        self.maximo = 0
+
+    def registrar(self, ns):
+        self.cubetas[ns.bit_length()] += 1
+        self.cantidad += 1
+        self.total += ns
+        if ns > self.maximo:
+            self.maximo = ns
+
+    def media(self):
+        return self.total / self.cantidad if self.cantidad else 0.0
+
+    def percentil(self, p):
+        """Cota superior (ns) del percentil p según las cubetas."""
+        limite = p / 100 * self.cantidad
+        acumulado = 0
+        for i, n in enumerate(self.cubetas):
+            acumulado += n
+            if n and acumulado >= limite:
+                return min(2**i - 1, self.maximo)
+        return 0
+
+    def a_dict(self):
+        return {
+            "cantidad": self.cantidad,
+            "total_ns": self.total,
+            "maximo_ns": self.maximo,
+            # cota superior de la cubeta -> mediciones
+            "cubetas": {2**i - 1: n for i, n in enumerate(self.cubetas) if n},
+        }
+
+
+def formatear_ns(ns):
+    if ns >= 1_000_000:
+        return f"{ns / 1_000_000:.1f}ms"
+    return f"{ns / 1000:.0f}us"
+
+
+class Instrumentacion:
+    """Un Histograma por fase del tick, del dibujo y del jitter de root.after."""
+
+    def __init__(self):
+        self.fases = {}
+
+    def registrar(self, fase, ns):
+        histograma = self.fases.get(fase)
+        if histograma is None:
+            histograma = self.fases[fase] = Histograma()
+        histograma.registrar(ns)
+
+    def reiniciar(self):
+        self.fases = {}
+
+    def resumen(self):
+        """Una línea por fase con media, p50, p99 y máximo."""
+        lineas = [f"{'fase':<9}{'n':>7}{'media':>8}{'p50':>8}{'p99':>8}{'max':>8}"]
+        for fase, h in self.fases.items():
+            lineas.append(
+                f"{fase:<9}{h.cantidad:>7}{formatear_ns(h.media()):>8}"
+                f"{formatear_ns(h.percentil(50)):>8}"
+                f"{formatear_ns(h.percentil(99)):>8}{formatear_ns(h.maximo):>8}"
+            )
+        return lineas
+
+    def exportar(self, ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(
+                {fase: h.a_dict() for fase, h in self.fases.items()}, f, indent=2
+            )
+
+
+# =========================
+# TEMPORIZADORES
+# =========================
+# Lo que la partida hace en un tick futuro (revivir un enemigo, gastar una
+# trampa, terminar el cooldown, recuperar energía) se programa en un heap
+# por tick. Cada tick mira solo el primero, así que los temporizadores que
+# faltan no cuestan nada. No se guardan en las instantáneas: se rearman
+# desde el estado, y la clave ordena los que vencen juntos siempre igual.
+
+EVENTO_ENERGIA = 0
+EVENTO_COOLDOWN = 1
+EVENTO_TRAMPA = 2  # clave: tick de colocación; dato: la trampa
+EVENTO_RESPAWN = 3  # clave: índice del enemigo
+
+
+class Temporizadores:
+    def __init__(self):
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def programar(self, tick, tipo, clave=0, dato=None):
+        heapq.heappush(self.heap, (tick, tipo, clave, dato))
+
+    def vencidos(self, tick):
+        """Saca los eventos con tick <= tick, en orden (tick, tipo, clave)."""
+        heap = self.heap
+        if not heap or heap[0][0] > tick:
+            return ()
+        lista = []
+        while heap and heap[0][0] <= tick:
+            lista.append(heapq.heappop(heap))
+        return lista
+
+
+# =========================
+# MOTOR DEL JUEGO
+# =========================
+
+# Entradas del jugador aceptadas por GameState.step
+ENTRADA_MOVER = "mover"  # ("mover", dx, dy, correr)
+ENTRADA_TRAMPA = "trampa"  # ("trampa",)
+
+# Instantáneas binarias de una partida (GameState.a_bytes / desde_bytes):
+# un encabezado fijo, los textos, el estado del rng, los enemigos y trampas
+# como columnas (un array por atributo) y el terreno comprimido con zlib.
+MAGIA_PARTIDA = b"PRTD"
+VERSION_PARTIDA = 2
+# magia, versión, cols, rows, inicio, salida, tick, puntaje, atrapados,
+# escapados, tick de la última trampa, running, victoria (-1 = sin definir),
+# factor, jugador (x, y, energía, energía máx, última recuperación), campo
+# lejano (ancla, ancla nueva, celdas hechas; -1 = sin ancla), cantidad de
+# enemigos, de trampas y largo del terreno (0 = no incluido)
+ENCABEZADO_PARTIDA = struct.Struct("<4sB6IIiIIiBbd5i5iIII")
+COLUMNAS_ENEMIGO = (
+    ("x", "i"),
+    ("y", "i"),
+    ("vivo", "b"),
+    ("tick_muerte", "i"),  # -1 = sin definir
+    ("velocidad", "d"),
+    ("intervalo", "i"),
+    ("ultimo_movimiento", "i"),
+)
+COLUMNAS_TRAMPA = (("x", "i"), ("y", "i"), ("colocada_en", "i"))
+
+
+def empaquetar(tipo, valores):
+    """Bytes little-endian de un array de `tipo`."""
+    datos = array(tipo, valores)
+    if sys.byteorder == "big":
+        datos.byteswap()
+    return datos.tobytes()
+
+
+def desempaquetar(vista, pos, tipo, n):
+    """Lee n valores de `tipo` desde vista[pos:]; devuelve (array, pos siguiente)."""
+    datos = array(tipo)
+    fin = pos + n * datos.itemsize
+    if fin > len(vista):
+        raise ValueError("Instantánea incompleta")
+    datos.frombytes(vista[pos:fin])
+    if sys.byteorder == "big":
+        datos.byteswap()
+    return datos, fin
+
+
+# Validaciones al leer instantáneas y replays: un archivo corrupto tiene que
+# dar ValueError y no fallar (o colgarse) más adelante.
+
+
+def revisar_textos(modo, dificultad, generador):
+    if (
+        modo not in (MODO_ESCAPA, MODO_CAZADOR)
+        or dificultad not in DIFICULTADES
+        or generador not in GENERADORES
+    ):
+        raise ValueError(f"Partida desconocida: {modo}, {dificultad}, {generador}")
+
+
+def revisar_posiciones(cols, rows, xs, ys):
+    """ValueError si alguna posición (xs[i], ys[i]) cae fuera del mapa."""
+    if xs and not (
+        0 <= min(xs) and max(xs) < cols and 0 <= min(ys) and max(ys) < rows
+    ):
+        raise ValueError("Posición fuera del mapa")
+
+
+class GameState:
+    """Reglas de una partida, sin depender de la interfaz gráfica."""
+
+    def __init__(self, game_map=None, rng=random):
+        self.game_map = game_map or GameMap(ANCHO_MAPA, ALTO_MAPA)
+        self.campo = CampoDistancias(self.game_map, RADIO_CAMPO)
+        self.lejano = CampoLejano(self.game_map)
+        # fuente de azar de la partida; un random.Random con semilla la hace
+        # reproducible
+        self.rng = rng
+        self.modo = None
+        self.dificultad = "Normal"
+        self.generador = "clasico"
+        self.factor_dificultad = DIFICULTADES[self.dificultad]
+
+        self.jugador = None
+        # estado de los enemigos en columnas; enemigos es su vista como objetos
+        self.tabla_enemigos = TablaEnemigos(self.game_map.cols)
+        self.enemigos = self.tabla_enemigos.filas
+        self.trampas = []
+        self.ultimo_trampa = -COOLDOWN_TRAMPA
+        self.trampa_lista = True  # la pone en True un EVENTO_COOLDOWN
+        self.ocupacion_enemigos = IndiceOcupacion(self.game_map.cols)
+        self.ocupacion_trampas = IndiceOcupacion(self.game_map.cols)
+        self.temporizadores = Temporizadores()
+
+        # ticks simulados desde el inicio de la partida
+        self.tick = 0
+        self.puntaje = 0
+        self.enemigos_atrapados = 0
+        self.enemigos_escapados = 0
+
+        self.running = False
+        self.victoria = None
+        self.motivo = ""
+        # Instrumentacion opcional: si está, step mide cada fase del tick
+        self.instrumentacion = None
+
+    def iniciar(
+        self,
+        modo,
+        dificultad,
+        factor=None,
+        num_enemigos=None,
+        generador=None,
+        game_map=None,
+    ):
+        """Prepara una partida; con game_map usa ese mapa ya generado."""
+        self.modo = modo
+        self.dificultad = dificultad
+        if generador is not None:
+            self.generador = generador
+        # factor y num_enemigos permiten probar valores fuera de las tablas
+        self.factor_dificultad = (
+            DIFICULTADES[dificultad] if factor is None else factor
+        )
+        self.tick = 0
+
+        # Generar mapa nuevo, salvo que venga uno de la reserva
+        if game_map is not None:
+            self.game_map = game_map
+        else:
+            self.game_map.generar(self.rng, self.generador)
+        horda = dificultad == DIFICULTAD_HORDA
+        self.campo = CampoDistancias(self.game_map, RADIO_CAMPO)
+        self.lejano = CampoLejano(self.game_map)
+
+        # Crear jugador en inicio
+        ix, iy = self.game_map.inicio
+        self.jugador = Jugador(ix, iy, self.tick)
+
+        # Crear enemigos
+        self.tabla_enemigos = TablaEnemigos(self.game_map.cols)
+        self.enemigos = self.tabla_enemigos.filas
+        self.ocupacion_enemigos = IndiceOcupacion(self.game_map.cols)
+        if num_enemigos is None:
+            num_enemigos = ENEMIGOS_POR_DIFICULTAD[dificultad]
+            if horda:
+                paso = self.game_map.paso
+                libres = paso.count(PASO_ENEMIGO) + paso.count(
+                    PASO_ENEMIGO | PASO_JUGADOR
+                )
+                num_enemigos = min(num_enemigos, libres // CELDAS_POR_ENEMIGO)
+        for i in range(num_enemigos):
+            ex, ey = self.generar_posicion_enemigo()
+            enemigo = self.tabla_enemigos.agregar(
+                ex, ey, velocidad=self.factor_dificultad, tick=self.tick
+            )
+            if horda:
+                # turnos repartidos: cada tick se mueve solo una fracción
+                enemigo.ultimo_movimiento -= i % enemigo.intervalo
+            self.ocupacion_enemigos.agregar(enemigo)
+
+        self.trampas = []
+        self.ocupacion_trampas = IndiceOcupacion(self.game_map.cols)
+        self.ultimo_trampa = -COOLDOWN_TRAMPA
+        self.programar_temporizadores()
+
+        self.puntaje = 0
+        self.enemigos_atrapados = 0
+        self.enemigos_escapados = 0
+        self.running = True
+        self.victoria = None
+        self.motivo = ""
+
+    def programar_temporizadores(self):
+        """Arma los temporizadores según el estado (al iniciar o al cargar)."""
+        temporizadores = self.temporizadores = Temporizadores()
+        temporizadores.programar(
+            self.jugador.ultima_recuperacion + RECUPERACION_ENERGIA, EVENTO_ENERGIA
+        )
+        self.trampa_lista = self.tick - self.ultimo_trampa >= COOLDOWN_TRAMPA
+        if not self.trampa_lista:
+            temporizadores.programar(
+                self.ultimo_trampa + COOLDOWN_TRAMPA, EVENTO_COOLDOWN
+            )
+        for trampa in self.trampas:
+            temporizadores.programar(
+                trampa.colocada_en + DURACION_TRAMPA,
+                EVENTO_TRAMPA,
+                trampa.colocada_en,
+                trampa,
+            )
+        for i, muerte in enumerate(self.tabla_enemigos.tick_muerte):
+            if muerte >= 0:
+                temporizadores.programar(muerte + RESPAWN_ENEMIGO, EVENTO_RESPAWN, i)
+
+    def generar_posicion_enemigo(self):
+        """Celda al azar desde donde se llega al jugador, lejos de él si se puede.
+
+        Cada sorteo es O(1) sobre el índice de zonas del mapa; tras
+        INTENTOS_POSICION_ENEMIGO sorteos cerca del jugador acepta el último
+        que no sea el inicio ni la salida. Estas solo se devuelven si la
+        componente no tiene otra celda. Con el índice no vigente (se cerró
+        alguna celda) se descartan las celdas ya cerradas.
+        """
+        game_map = self.game_map
+        zonas = game_map.zonas
+        cols = game_map.cols
+        jx = self.jugador.x
+        jy = self.jugador.y
+        # si el jugador está encerrado (túneles), la zona más grande
+        componentes = zonas.alrededor(jy * cols + jx) or zonas.mayor()
+        if not componentes:
+            raise ValueError("El mapa no tiene celdas para enemigos")
+        reservadas = (game_map.inicio, game_map.salida)
+        paso = game_map.paso
+        cerca = None
+        valida = None
+        for _ in range(INTENTOS_POSICION_ENEMIGO):
+            k = zonas.elegir(self.rng, componentes)
+            x = k % cols
+            y = k // cols
+            if (x, y) in reservadas or not paso[k] & PASO_ENEMIGO:
+                continue
+            if abs(x - jx) + abs(y - jy) >= DISTANCIA_MINIMA_ENEMIGO:
+                return x, y
+            if cerca is None:
+                cerca = zonas.cercanas(jy * cols + jx, DISTANCIA_MINIMA_ENEMIGO)
+            if k not in cerca:
+                return x, y
+            valida = (x, y)
+        if valida is not None:
+            return valida
+        # todos los sorteos cayeron en el inicio o la salida: la primera otra
+        # celda de las componentes (se revisan a lo sumo tres)
+        for k in zonas.celdas_de(componentes):
+            if (k % cols, k // cols) not in reservadas and paso[k] & PASO_ENEMIGO:
+                return k % cols, k // cols
+        return x, y
+
+    @property
+    def tiempo(self):
+        """Segundos simulados desde el inicio de la partida."""
+        return self.tick / TICKS_POR_SEGUNDO
+
+    def step(self, entradas=()):
+        """Aplica las entradas en orden y avanza la partida un tick."""
+        medir = self.instrumentacion
+        if medir:
+            t0 = time.perf_counter_ns()
+        for entrada in entradas:
+            if entrada[0] == ENTRADA_MOVER:
+                self.mover_jugador(*entrada[1:])
+            elif entrada[0] == ENTRADA_TRAMPA:
+                self.colocar_trampa()
+        if not self.running:
             return
-        if not self.listo_para_moverse():
+
+        # actualizar tiempo y energía
+        self.tick += 1
+        tick = self.tick
+        revivir = self.atender_temporizadores(tick)
+        if medir:
+            t1 = time.perf_counter_ns()
+            medir.registrar("jugador", t1 - t0)
+
+        # un solo campo de distancias (y uno lejano) para todos los enemigos
+        jugador = self.jugador
+        self.campo.mover_objetivo(jugador.x, jugador.y)
+        self.lejano.avanzar(jugador.x, jugador.y)
+        self.game_map.avanzar_zonas(CUOTA_ZONAS)
+        if medir:
+            t2 = time.perf_counter_ns()
+            medir.registrar("campo", t2 - t1)
+
+        terminada = self.mover_enemigos(tick, revivir)
+        if medir:
+            t3 = time.perf_counter_ns()
+            medir.registrar("enemigos", t3 - t2)
+        if terminada:
             return
-        self.ultimo_movimiento = time.time()
 
-        # Direcciones posibles
-        dirs = [(0, -1), (0, 1), (-1, 0), (1, 0)]
-        mejor_dx, mejor_dy = 0, 0
+        # actualizar puntaje en función del tiempo (modo escapa)
+        if self.modo == MODO_ESCAPA:
+            base = max(0, 1000 - tick // TICKS_POR_SEGUNDO * 10)
+            self.puntaje = (
+                int(base * self.factor_dificultad) + self.enemigos_atrapados * 30
+            )
+        # en modo cazador ya se actualiza en los eventos
+        if medir:
+            medir.registrar("puntaje", time.perf_counter_ns() - t3)
+
+    def atender_temporizadores(self, tick):
+        """Eventos vencidos; devuelve los enemigos a revivir en este tick.
+
+        Los respawns los hace mover_enemigos en su recorrido, en el orden de
+        los índices, para que el rng se consuma siempre igual.
+        """
+        revivir = set()
+        for _, tipo, clave, dato in self.temporizadores.vencidos(tick):
+            if tipo == EVENTO_RESPAWN:
+                revivir.add(clave)
+            elif tipo == EVENTO_ENERGIA:
+                self.jugador.recuperar_energia(tick)
+                self.temporizadores.programar(
+                    tick + RECUPERACION_ENERGIA, EVENTO_ENERGIA
+                )
+            elif tipo == EVENTO_COOLDOWN:
+                self.trampa_lista = True
+            elif tipo == EVENTO_TRAMPA and dato in self.trampas:
+                # si no está, ya atrapó a un enemigo
+                self.quitar_trampa(dato)
+        return revivir
+
+    def mover_enemigos(self, tick, revivir=()):
+        """IA, respawns, colisiones y trampas; True si terminó la partida."""
+        jugador = self.jugador
+        # enemigos en la celda del jugador (él se movió o ellos siguen ahí)
+        for enemigo in list(self.ocupacion_enemigos.en(jugador.x, jugador.y)):
+            if self.revisar_enemigo(enemigo, tick):
+                return True
+
+        # un recorrido por las columnas; solo se tocan objetos para los
+        # enemigos que reviven o cambian de celda
+        tabla = self.tabla_enemigos
+        xs = tabla.x
+        ys = tabla.y
+        vivo = tabla.vivo
+        intervalo = tabla.intervalo
+        ultimo = tabla.ultimo_movimiento
+        filas = tabla.filas
+        for i in range(len(vivo)):
+            if not vivo[i]:
+                if i in revivir:
+                    tabla.revivir(i, *self.generar_posicion_enemigo())
+                    self.ocupacion_enemigos.agregar(filas[i])
+                    if self.revisar_enemigo(filas[i], tick):
+                        return True
+                continue
+            if tick - ultimo[i] < intervalo[i]:
+                continue
 
-        def distancia(a, b):
-            return abs(a[0] - b[0]) + abs(a[1] - b[1])
+            # solo los enemigos que cambian de celda pueden chocar con algo
+            x0 = xs[i]
+            y0 = ys[i]
+            if tabla.mover(
+                i, jugador, self.game_map, self.modo, tick, self.campo, self.lejano
+            ):
+                self.ocupacion_enemigos.mover(filas[i], x0, y0, xs[i], ys[i])
+                if self.revisar_enemigo(filas[i], tick):
+                    return True
+        return False
 
-        mejor_dist = None
-        for dx, dy in dirs:
-            nx = self.x + dx
-            ny = self.y + dy
-            cas = game_map.casilla(nx, ny)
-            if not cas.puede_pasar_enemigo():
-                continue
-            d = distancia((nx, ny), (jugador.x, jugador.y))
-            if modo == MODO_ESCAPA:
-                # perseguir -> minimizar distancia
-                if mejor_dist is None or d < mejor_dist:
-                    mejor_dist = d
-                    mejor_dx, mejor_dy = dx, dy
-            else:
-                # huir -> maximizar distancia
-                if mejor_dist is None or d > mejor_dist:
-                    mejor_dist = d
-                    mejor_dx, mejor_dy = dx, dy
+    def revisar_enemigo(self, enemigo, tick):
+        """Colisiones del enemigo en su celda; True si terminó la partida."""
+        jugador = self.jugador
+        x = enemigo.x
+        y = enemigo.y
+        if x == jugador.x and y == jugador.y:
+            if self.modo == MODO_ESCAPA:
+                # si enemigo toca al jugador -> pierde
+                self.fin_partida(victoria=False, motivo="Un cazador te atrapó.")
+                return True
+            # modo cazador: si jugador toca enemigo -> lo atrapa
+            self.enemigos_atrapados += 1
+            # puntos positivos
+            self.puntaje += int(100 * self.factor_dificultad * 2)
+            self.matar_enemigo(enemigo, tick)
+        elif self.modo == MODO_CAZADOR:
+            # enemigos pueden escapar por la salida en modo cazador
+            if self.game_map.es_salida(x, y):
+                self.enemigos_escapados += 1
+                self.puntaje -= int(50 * self.factor_dificultad)
+                self.matar_enemigo(enemigo, tick)
+        else:
+            # trampas en modo escapa
+            trampas = self.ocupacion_trampas.en(x, y)
+            if trampas:
+                # enemigo muere, trampa desaparece
+                self.quitar_trampa(trampas[0])
+                self.matar_enemigo(enemigo, tick)
+                # bono pequeño
+                self.puntaje += int(30 * self.factor_dificultad)
+        return False
 
-        self.x += mejor_dx
-        self.y += mejor_dy
+    def matar_enemigo(self, enemigo, tick):
+        enemigo.vivo = False
+        enemigo.tick_muerte = tick
+        self.ocupacion_enemigos.quitar(enemigo)
+        self.temporizadores.programar(tick + RESPAWN_ENEMIGO, EVENTO_RESPAWN, enemigo.i)
 
+    def quitar_trampa(self, trampa):
+        self.ocupacion_trampas.quitar(trampa)
+        self.trampas.remove(trampa)
 
-class Trampa:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.colocada_en = time.time()
+    def mover_jugador(self, dx, dy, correr):
+        if not self.running:
+            return
+        self.jugador.mover(dx, dy, self.game_map, correr)
+        # Si llega a salida en modo escapa -> gana
+        if self.modo == MODO_ESCAPA and self.game_map.es_salida(
+            self.jugador.x, self.jugador.y
+        ):
+            self.fin_partida(victoria=True, motivo="¡Escapaste a tiempo!")
+
+    def colocar_trampa(self):
+        if not self.running:
+            return False
+        if self.modo != MODO_ESCAPA:
+            return False
+        # máximo 3 trampas y cooldown
+        if len(self.trampas) >= 3:
+            return False
+        if not self.trampa_lista:
+            return False
+        # Trampa en posición del jugador
+        tick = self.tick
+        trampa = Trampa(self.jugador.x, self.jugador.y, tick)
+        self.trampas.append(trampa)
+        self.ocupacion_trampas.agregar(trampa)
+        self.ultimo_trampa = tick
+        self.trampa_lista = False
+        self.temporizadores.programar(tick + COOLDOWN_TRAMPA, EVENTO_COOLDOWN)
+        self.temporizadores.programar(
+            tick + DURACION_TRAMPA, EVENTO_TRAMPA, tick, trampa
+        )
+        return True
+
+    def cambiar_casilla(self, x, y, codigo):
+        self.game_map.cambiar_casilla(x, y, codigo)
+        self.campo.cambiar_celda(x, y)
+        self.lejano.cambiar_terreno()
+
+    def fin_partida(self, victoria, motivo):
+        self.running = False
+        self.victoria = victoria
+        self.motivo = motivo
+
+        if self.modo == MODO_CAZADOR:
+            # Ajuste final de puntaje por tiempo: bonus pequeño
+            self.puntaje += int(
+                max(0, 500 - self.tick // TICKS_POR_SEGUNDO * 5)
+                * self.factor_dificultad
+            )
+
+    # ---------- INSTANTÁNEAS ----------
+
+    def a_bytes(self, terreno=True):
+        """Instantánea binaria; sin terreno hace falta el mapa para cargarla."""
+        game_map = self.game_map
+        jugador = self.jugador
+        lejano = self.lejano
+        comprimido = zlib.compress(game_map.celdas, 1) if terreno else b""
+        partes = [
+            ENCABEZADO_PARTIDA.pack(
+                MAGIA_PARTIDA,
+                VERSION_PARTIDA,
+                game_map.cols,
+                game_map.rows,
+                *game_map.inicio,
+                *game_map.salida,
+                self.tick,
+                self.puntaje,
+                self.enemigos_atrapados,
+                self.enemigos_escapados,
+                self.ultimo_trampa,
+                self.running,
+                -1 if self.victoria is None else self.victoria,
+                self.factor_dificultad,
+                jugador.x,
+                jugador.y,
+                jugador.energia,
+                jugador.energia_max,
+                jugador.ultima_recuperacion,
+                *(lejano.ancla or (-1, -1)),
+                *(lejano.ancla_nueva or (-1, -1)),
+                lejano.hecho,
+                len(self.enemigos),
+                len(self.trampas),
+                len(comprimido),
+            )
+        ]
+        for texto in (self.modo, self.dificultad, self.generador, self.motivo):
+            crudo = texto.encode("utf-8")
+            partes.append(struct.pack("<H", len(crudo)))
+            partes.append(crudo)
+
+        # con el estado del rng los respawns siguen igual que sin guardar
+        version, interno, gauss = self.rng.getstate()
+        partes.append(struct.pack("<BH", version, len(interno)))
+        partes.append(empaquetar("I", interno))
+        partes.append(struct.pack("<?d", gauss is not None, gauss or 0.0))
+
+        # los enemigos ya están en columnas; las trampas se pasan a columnas
+        for nombre, tipo in COLUMNAS_ENEMIGO:
+            partes.append(empaquetar(tipo, getattr(self.tabla_enemigos, nombre)))
+        for nombre, tipo in COLUMNAS_TRAMPA:
+            partes.append(empaquetar(tipo, [getattr(t, nombre) for t in self.trampas]))
+        partes.append(comprimido)
+        return b"".join(partes)
+
+    @classmethod
+    def desde_bytes(cls, datos, game_map=None):
+        """Reconstruye una partida de a_bytes(); game_map si no trae terreno."""
+        vista = memoryview(datos)
+        (
+            magia,
+            version,
+            cols,
+            rows,
+            ix,
+            iy,
+            sx,
+            sy,
+            tick,
+            puntaje,
+            atrapados,
+            escapados,
+            ultimo_trampa,
+            running,
+            victoria,
+            factor,
+            jx,
+            jy,
+            energia,
+            energia_max,
+            recuperacion,
+            ax,
+            ay,
+            nx,
+            ny,
+            hecho,
+            n_enemigos,
+            n_trampas,
+            largo_terreno,
+        ) = ENCABEZADO_PARTIDA.unpack_from(vista)
+        if magia != MAGIA_PARTIDA or version != VERSION_PARTIDA:
+            raise ValueError("No es una partida guardada compatible")
+        pos = ENCABEZADO_PARTIDA.size
+
+        textos = []
+        for _ in range(4):
+            (largo,) = struct.unpack_from("<H", vista, pos)
+            pos += 2
+            textos.append(str(vista[pos : pos + largo], "utf-8"))
+            pos += largo
+        modo, dificultad, generador, motivo = textos
+        revisar_textos(modo, dificultad, generador)
+
+        version_rng, n = struct.unpack_from("<BH", vista, pos)
+        interno, pos = desempaquetar(vista, pos + 3, "I", n)
+        hay_gauss, gauss = struct.unpack_from("<?d", vista, pos)
+        pos += 9
+        rng = random.Random()
+        rng.setstate((version_rng, tuple(interno), gauss if hay_gauss else None))
+
+        columnas = []
+        for n, campos in ((n_enemigos, COLUMNAS_ENEMIGO), (n_trampas, COLUMNAS_TRAMPA)):
+            valores = {}
+            for nombre, tipo in campos:
+                valores[nombre], pos = desempaquetar(vista, pos, tipo, n)
+            columnas.append(valores)
+        enemigos, trampas = columnas
+        revisar_posiciones(cols, rows, [jx, ix, sx], [jy, iy, sy])
+        revisar_posiciones(cols, rows, enemigos["x"], enemigos["y"])
+        revisar_posiciones(cols, rows, trampas["x"], trampas["y"])
+        for x, y in ((ax, ay), (nx, ny)):
+            if x >= 0:  # -1 = sin ancla
+                revisar_posiciones(cols, rows, [x], [y])
+
+        if largo_terreno:
+            celdas = zlib.decompress(vista[pos : pos + largo_terreno])
+            if len(celdas) != cols * rows:
+                raise ValueError("Terreno de otro tamaño")
+            game_map = GameMap(cols, rows)
+            game_map.inicio = (ix, iy)
+            game_map.salida = (sx, sy)
+            game_map.asignar(celdas)
+        elif game_map is None:
+            raise ValueError("La instantánea no incluye el terreno")
+        elif (game_map.cols, game_map.rows) != (cols, rows):
+            raise ValueError("La instantánea es de otro mapa")
+
+        estado = cls(game_map, rng=rng)
+        estado.modo = modo
+        estado.dificultad = dificultad
+        estado.lejano.reconstruir(
+            None if ax < 0 else (ax, ay), None if nx < 0 else (nx, ny), hecho
+        )
+        estado.generador = generador
+        estado.motivo = motivo
+        estado.factor_dificultad = factor
+        estado.tick = tick
+        estado.puntaje = puntaje
+        estado.enemigos_atrapados = atrapados
+        estado.enemigos_escapados = escapados
+        estado.ultimo_trampa = ultimo_trampa
+        estado.running = bool(running)
+        estado.victoria = None if victoria < 0 else bool(victoria)
+
+        jugador = estado.jugador = Jugador(jx, jy, recuperacion)
+        jugador.energia = energia
+        jugador.energia_max = energia_max
+
+        estado.tabla_enemigos.asignar_columnas(enemigos)
+        estado.enemigos = estado.tabla_enemigos.filas
+        for enemigo in estado.enemigos:
+            if enemigo.vivo:
+                estado.ocupacion_enemigos.agregar(enemigo)
+        for i in range(n_trampas):
+            trampa = Trampa(trampas["x"][i], trampas["y"][i], trampas["colocada_en"][i])
+            estado.trampas.append(trampa)
+            estado.ocupacion_trampas.agregar(trampa)
+        estado.programar_temporizadores()
+        return estado
+
+
+# =========================
+# REPLAYS
+# =========================
+# Una partida se reproduce con la semilla del mapa, la semilla de la
+# partida (aparición de enemigos) y las entradas del jugador con el tick en
+# que llegaron. El archivo guarda un encabezado y luego, por cada entrada,
+# la distancia en ticks a la anterior como varint y un byte con su código.
+
+MAGIA_REPLAY = b"RPLY"
+# 2: las trampas se gastan (DURACION_TRAMPA); 3: aparición por zonas;
+# 4: campo con RADIO_CAMPO y campo lejano; 5: laberinto y cuevas con Eller
+VERSION_REPLAY = 5
+CODIGO_TRAMPA = 2 * len(DIRECCIONES)  # 0..7 son movimientos (dirección, correr)
+LADOS_REPLAY = range(3, 4097)  # columnas y filas aceptadas al leer un replay
+SNAPSHOT_CADA = 60 * TICKS_POR_SEGUNDO  # ticks entre estados guardados al reproducir
+CARPETA_REPLAYS = "replays"
+
+
+def escribir_varint(buffer, n):
+    while n >= 0x80:
+        buffer.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+def leer_varint(datos, pos):
+    """Devuelve (valor, posición siguiente)."""
+    n = 0
+    corrimiento = 0
+    while True:
+        if pos >= len(datos):
+            raise ValueError("Replay incompleto")
+        byte = datos[pos]
+        pos += 1
+        n |= (byte & 0x7F) << corrimiento
+        if byte < 0x80:
+            return n, pos
+        corrimiento += 7
+
+
+def codigo_entrada(entrada):
+    if entrada[0] == ENTRADA_TRAMPA:
+        return CODIGO_TRAMPA
+    _, dx, dy, correr = entrada
+    return 2 * DIRECCIONES.index((dx, dy)) + bool(correr)
+
+
+def entrada_de_codigo(codigo):
+    if codigo == CODIGO_TRAMPA:
+        return (ENTRADA_TRAMPA,)
+    if codigo > CODIGO_TRAMPA:
+        raise ValueError(f"Código de entrada desconocido: {codigo}")
+    dx, dy = DIRECCIONES[codigo // 2]
+    return (ENTRADA_MOVER, dx, dy, bool(codigo % 2))
+
+
+class Grabacion:
+    """Encabezado de una partida y sus entradas, en el formato de replay."""
+
+    def __init__(
+        self,
+        modo,
+        dificultad,
+        generador,
+        cols,
+        rows,
+        semilla_mapa,
+        semilla_partida,
+        num_enemigos,
+        factor,
+        jugador="",
+    ):
+        self.modo = modo
+        self.dificultad = dificultad
+        self.generador = generador
+        self.cols = cols
+        self.rows = rows
+        self.semilla_mapa = semilla_mapa
+        self.semilla_partida = semilla_partida
+        self.num_enemigos = num_enemigos
+        self.factor = factor
+        self.jugador = jugador
+        # resultado declarado, para comparar al reproducir
+        self.ticks = 0
+        self.puntaje = 0
+        self.eventos = bytearray()
+        self.ultimo_tick = 0
+
+    def registrar(self, tick, entrada):
+        escribir_varint(self.eventos, tick - self.ultimo_tick)
+        self.eventos.append(codigo_entrada(entrada))
+        self.ultimo_tick = tick
+
+    def terminar(self, ticks, puntaje):
+        self.ticks = ticks
+        self.puntaje = puntaje
+
+    def entradas(self):
+        """Lista de (tick, entrada) en orden."""
+        lista = []
+        tick = 0
+        pos = 0
+        while pos < len(self.eventos):
+            delta, pos = leer_varint(self.eventos, pos)
+            tick += delta
+            if pos == len(self.eventos):
+                raise ValueError("Replay incompleto")
+            lista.append((tick, entrada_de_codigo(self.eventos[pos])))
+            pos += 1
+        return lista
+
+    def a_bytes(self):
+        datos = bytearray(MAGIA_REPLAY)
+        datos.append(VERSION_REPLAY)
+        for texto in (self.modo, self.dificultad, self.generador, self.jugador):
+            crudo = texto.encode("utf-8")
+            escribir_varint(datos, len(crudo))
+            datos += crudo
+        for n in (
+            self.cols,
+            self.rows,
+            self.semilla_mapa,
+            self.semilla_partida,
+            self.num_enemigos,
+            self.ticks,
+            # zigzag: el puntaje puede ser negativo
+            2 * self.puntaje if self.puntaje >= 0 else -2 * self.puntaje - 1,
+        ):
+            escribir_varint(datos, n)
+        datos += struct.pack("<d", self.factor)
+        escribir_varint(datos, len(self.eventos))
+        datos += self.eventos
+        return bytes(datos)
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        if datos[:5] != MAGIA_REPLAY + bytes([VERSION_REPLAY]):
+            raise ValueError("No es un replay compatible")
+        pos = 5
+        textos = []
+        for _ in range(4):
+            largo, pos = leer_varint(datos, pos)
+            if pos + largo > len(datos):
+                raise ValueError("Replay incompleto")
+            textos.append(bytes(datos[pos : pos + largo]).decode("utf-8"))
+            pos += largo
+        numeros = []
+        for _ in range(7):
+            n, pos = leer_varint(datos, pos)
+            numeros.append(n)
+        if pos + 8 > len(datos):
+            raise ValueError("Replay incompleto")
+        (factor,) = struct.unpack_from("<d", datos, pos)
+        pos += 8
+        largo, pos = leer_varint(datos, pos)
+        if pos + largo > len(datos):
+            raise ValueError("Replay incompleto")
+
+        modo, dificultad, generador, jugador = textos
+        cols, rows, semilla_mapa, semilla_partida, num_enemigos = numeros[:5]
+        revisar_textos(modo, dificultad, generador)
+        # un tamaño corrupto podría pedir un mapa enorme o uno que no se puede
+        # generar
+        if cols not in LADOS_REPLAY or rows not in LADOS_REPLAY:
+            raise ValueError(f"Tamaño de mapa inválido: {cols}x{rows}")
+        if num_enemigos > cols * rows:
+            raise ValueError(f"Demasiados enemigos: {num_enemigos}")
+        grabacion = cls(
+            modo,
+            dificultad,
+            generador,
+            cols,
+            rows,
+            semilla_mapa,
+            semilla_partida,
+            num_enemigos,
+            factor,
+            jugador,
+        )
+        puntaje = numeros[6] // 2 if numeros[6] % 2 == 0 else -(numeros[6] + 1) // 2
+        grabacion.terminar(numeros[5], puntaje)
+        grabacion.eventos = bytearray(datos[pos : pos + largo])
+        entradas = grabacion.entradas()
+        if entradas:
+            # para seguir grabando al continuar una partida guardada
+            grabacion.ultimo_tick = entradas[-1][0]
+        return grabacion
+
+    def guardar(self, ruta):
+        with open(ruta, "wb") as f:
+            f.write(self.a_bytes())
+
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, "rb") as f:
+            return cls.desde_bytes(f.read())
+
+
+class Reproductor:
+    """Vuelve a simular una Grabacion tick a tick.
+
+    Cada SNAPSHOT_CADA ticks guarda una instantánea binaria (sin terreno,
+    que no cambia) del estado, así ir_a() salta
+    a cualquier tick ya visitado (o lo alcanza simulando) sin empezar de
+    cero.
+    """
+
+    def __init__(self, grabacion):
+        self.grabacion = grabacion
+        # entradas agrupadas por el tick en que se aplican
+        self.por_tick = {}
+        for tick, entrada in grabacion.entradas():
+            self.por_tick.setdefault(tick, []).append(entrada)
+        self.snapshots = {}
+        self.estado = self.estado_inicial()
+        self.guardar_snapshot()
+
+    def estado_inicial(self):
+        g = self.grabacion
+        game_map = GameMap(g.cols, g.rows)
+        game_map.generar(random.Random(g.semilla_mapa), g.generador)
+        estado = GameState(game_map, rng=random.Random(g.semilla_partida))
+        estado.iniciar(
+            g.modo,
+            g.dificultad,
+            factor=g.factor,
+            num_enemigos=g.num_enemigos,
+            generador=g.generador,
+            game_map=game_map,
+        )
+        return estado
+
+    def avanzar(self):
+        """Un tick con las entradas grabadas para él."""
+        estado = self.estado
+        estado.step(self.por_tick.get(estado.tick, ()))
+        if estado.tick % SNAPSHOT_CADA == 0:
+            self.guardar_snapshot()
+
+    def terminado(self):
+        return not self.estado.running or self.estado.tick >= self.grabacion.ticks
+
+    def jugar(self):
+        """Reproduce hasta el final lo más rápido posible; devuelve el estado."""
+        while not self.terminado():
+            self.avanzar()
+        return self.estado
+
+    def guardar_snapshot(self):
+        self.snapshots[self.estado.tick] = self.estado.a_bytes(terreno=False)
+
+    def ir_a(self, tick):
+        """Deja el estado en `tick` partiendo del snapshot anterior más cercano."""
+        base = max(t for t in self.snapshots if t <= tick)
+        if not base <= self.estado.tick <= tick:
+            self.estado = GameState.desde_bytes(
+                self.snapshots[base], self.estado.game_map
+            )
+        while self.estado.tick < tick and not self.terminado():
+            self.avanzar()
+        return self.estado
 
 
 # =========================
@@ -271,33 +2797,950 @@ class Trampa:
 # =========================
 
 
+class TopPuntajes:
+    """Los k mejores puntajes de un modo en un min-heap acotado.
+
+    Con puntajes iguales queda primero el más antiguo, como al ordenar la
+    lista completa.
+    """
+
+    def __init__(self, k=5):
+        self.k = k
+        # (puntaje, -secuencia, nombre): la raíz es la entrada que sobra
+        self.heap = []
+
+    def agregar(self, puntaje, secuencia, nombre):
+        entrada = (puntaje, -secuencia, nombre)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entrada)
+        elif entrada > self.heap[0]:
+            heapq.heapreplace(self.heap, entrada)
+
+    def mejores(self):
+        return [
+            {"nombre": nombre, "puntaje": puntaje}
+            for puntaje, _, nombre in sorted(self.heap, reverse=True)
+        ]
+
+
 class ScoreManager:
-    def __init__(self, archivo):
+    """Puntajes en una bitácora append-only con top 5 por modo en memoria.
+
+    Cada resultado es una línea JSON al final de `archivo`, que conserva
+    toda la historia. Los fsync se agrupan (cada FSYNC_CADA registros o
+    FSYNC_SEGUNDOS) y cada COMPACTAR_CADA registros se escribe de forma
+    atómica una instantánea con los tops y la posición en la bitácora, así
+    que al arrancar solo se relee lo agregado después. Un corte a mitad de
+    escritura deja a lo sumo una línea incompleta al final, que se descarta.
+    """
+
+    def __init__(self, archivo, antiguo=None, k=5):
         self.archivo = archivo
-        self.data = {MODO_ESCAPA: [], MODO_CAZADOR: []}
+        self.archivo_snapshot = archivo + ".snap"
+        self.k = k
+        self.tops = {MODO_ESCAPA: TopPuntajes(k), MODO_CAZADOR: TopPuntajes(k)}
+        self.registros = 0
+        self.pendientes = 0
+        self.desde_compactar = 0
+        self.ultimo_fsync = time.monotonic()
         self.cargar()
+        self.log = open(self.archivo, "a", encoding="utf-8")
+        if antiguo and self.registros == 0:
+            self.importar(antiguo)
 
     def cargar(self):
-        if os.path.exists(self.archivo):
+        inicio = self.cargar_snapshot()
+        if not os.path.exists(self.archivo):
+            return
+        with open(self.archivo, "rb") as f:
+            f.seek(inicio)
+            datos = f.read()
+        # una línea sin "\n" final quedó a medio escribir: se corta
+        completo = datos.rfind(b"\n") + 1
+        if completo < len(datos):
+            with open(self.archivo, "r+b") as f:
+                f.truncate(inicio + completo)
+        for linea in datos[:completo].splitlines():
             try:
-                with open(self.archivo, "r", encoding="utf-8") as f:
-                    self.data = json.load(f)
-            except Exception:
-                self.data = {MODO_ESCAPA: [], MODO_CAZADOR: []}
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            self.aplicar(registro)
+
+    def cargar_snapshot(self):
+        """Restaura los tops de la instantánea; devuelve desde dónde leer."""
+        try:
+            with open(self.archivo_snapshot, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot["offset"] > os.path.getsize(self.archivo):
+                return 0  # la bitácora no corresponde a la instantánea
+            for modo, entradas in snapshot["tops"].items():
+                top = self.tops.setdefault(modo, TopPuntajes(self.k))
+                for puntaje, secuencia, nombre in entradas:
+                    top.agregar(puntaje, secuencia, nombre)
+            self.registros = snapshot["registros"]
+            return snapshot["offset"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.tops = {
+                MODO_ESCAPA: TopPuntajes(self.k),
+                MODO_CAZADOR: TopPuntajes(self.k),
+            }
+            self.registros = 0
+            return 0
+
+    def importar(self, antiguo):
+        """Pasa a la bitácora los puntajes del scores.json anterior."""
+        try:
+            with open(antiguo, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for modo, lista in data.items():
+            for p in lista:
+                self.agregar_puntaje(modo, p["nombre"], p["puntaje"])
+        self.sincronizar()
+
+    def aplicar(self, registro):
+        top = self.tops.setdefault(registro["modo"], TopPuntajes(self.k))
+        top.agregar(registro["puntaje"], self.registros, registro["nombre"])
+        self.registros += 1
+
+    def nuevo_registro(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        """Registro a guardar; sin fecha (epoch) lleva la de ahora."""
+        return {
+            "modo": modo,
+            "dificultad": dificultad,
+            "nombre": nombre,
+            "puntaje": int(puntaje),
+            "fecha": round(time.time() if fecha is None else float(fecha), 3),
+        }
+
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        registro = self.nuevo_registro(modo, nombre, puntaje, dificultad, fecha)
+        self.log.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.log.flush()
+        self.aplicar(registro)
+
+        self.pendientes += 1
+        self.desde_compactar += 1
+        if (
+            self.pendientes >= FSYNC_CADA
+            or time.monotonic() - self.ultimo_fsync >= FSYNC_SEGUNDOS
+        ):
+            self.sincronizar()
+        if self.desde_compactar >= COMPACTAR_CADA:
+            self.compactar()
+
+    def agregar_lote(self, registros):
+        """Agrega (modo, nombre, puntaje, dificultad[, fecha]) con un solo fsync.
+
+        Todo o nada: un registro inválido da ValueError o TypeError antes de
+        escribir, y si la escritura falla se corta la bitácora donde estaba,
+        así reintentar el lote no duplica registros.
+        """
+        nuevos = [self.nuevo_registro(*registro) for registro in registros]
+        texto = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in nuevos)
+        if self.log.closed:
+            self.log = open(self.archivo, "a", encoding="utf-8")
+        inicio = self.log.tell()
+        try:
+            self.log.write(texto)
+            self.log.flush()
+            os.fsync(self.log.fileno())
+        except OSError:
+            self.deshacer(inicio)
+            raise
+        self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+        for registro in nuevos:
+            self.aplicar(registro)
+        self.desde_compactar += len(nuevos)
+        if self.desde_compactar >= COMPACTAR_CADA:
+            try:
+                self.compactar()
+            except OSError:
+                pass  # el lote ya está guardado; se compacta en el próximo
+
+    def deshacer(self, inicio):
+        """Corta la bitácora en `inicio` tras una escritura fallida."""
+        try:
+            self.log.close()
+        except OSError:
+            pass  # el buffer que no se pudo escribir se descarta
+        try:
+            os.truncate(self.archivo, inicio)
+        except OSError:
+            pass  # la línea incompleta se descarta al cargar
+        # si no se puede reabrir, el próximo agregar_lote lo intenta de nuevo
+        self.log = open(self.archivo, "a", encoding="utf-8")
+
+    def sincronizar(self):
+        """fsync de todo lo escrito desde el último."""
+        if self.pendientes:
+            os.fsync(self.log.fileno())
+            self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+
+    def compactar(self):
+        """Escribe la instantánea en un temporal y la reemplaza atómicamente."""
+        self.sincronizar()
+        snapshot = {
+            "offset": self.log.tell(),
+            "registros": self.registros,
+            "tops": {
+                modo: [[p, -s, n] for p, s, n in top.heap]
+                for modo, top in self.tops.items()
+            },
+        }
+        temporal = self.archivo_snapshot + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo_snapshot)
+        self.desde_compactar = 0
+
+    def cerrar(self):
+        if self.desde_compactar:
+            self.compactar()
+        self.log.close()
+
+    def obtener_top(self, modo, n=5):
+        top = self.tops.get(modo)
+        return top.mejores()[:n] if top else []
 
-    def guardar(self):
-        with open(self.archivo, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+    def obtener_top5(self, modo):
+        return self.obtener_top(modo, 5)
+
+
+class SQLiteScoreManager:
+    """Puntajes en SQLite (modo WAL) con la misma interfaz que ScoreManager.
+
+    Guarda todos los resultados. Los índices por modo y puntaje, por
+    dificultad, por jugador y por fecha hacen que los tops y las consultas
+    por jugador o por fechas lean solo las filas pedidas aunque haya
+    millones. WAL deja que varios procesos del juego escriban a la vez; el
+    timeout de la conexión los hace esperar al lock en vez de fallar.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.conexion = sqlite3.connect(archivo, timeout=5.0)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        with self.conexion:
+            self.conexion.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS puntajes (
+                    id INTEGER PRIMARY KEY,
+                    modo TEXT NOT NULL,
+                    dificultad TEXT,
+                    nombre TEXT NOT NULL,
+                    puntaje INTEGER NOT NULL,
+                    fecha REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_modo_puntaje
+                    ON puntajes (modo, puntaje DESC, id);
+                CREATE INDEX IF NOT EXISTS idx_modo_dificultad_puntaje
+                    ON puntajes (modo, dificultad, puntaje DESC, id);
+                CREATE INDEX IF NOT EXISTS idx_nombre
+                    ON puntajes (nombre, modo, puntaje DESC);
+                CREATE INDEX IF NOT EXISTS idx_fecha ON puntajes (fecha);
+                CREATE INDEX IF NOT EXISTS idx_modo_fecha
+                    ON puntajes (modo, fecha);
+                """
+            )
+
+    @staticmethod
+    def fila(modo, nombre, puntaje, dificultad=None, fecha=None):
+        """Valores para el INSERT; sin fecha (epoch) lleva la de ahora."""
+        fecha = time.time() if fecha is None else float(fecha)
+        return (modo, dificultad, nombre, int(puntaje), fecha)
+
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        self.agregar_lote([(modo, nombre, puntaje, dificultad, fecha)])
+
+    def agregar_lote(self, registros):
+        """Agrega (modo, nombre, puntaje, dificultad[, fecha]) en una transacción."""
+        filas = [self.fila(*registro) for registro in registros]
+        with self.conexion:
+            self.conexion.executemany(
+                "INSERT INTO puntajes (modo, dificultad, nombre, puntaje, fecha)"
+                " VALUES (?, ?, ?, ?, ?)",
+                filas,
+            )
+
+    def obtener_top(self, modo, n=5, dificultad=None):
+        """Los n mejores del modo (y de la dificultad, si se indica)."""
+        if dificultad is None:
+            filas = self.conexion.execute(
+                "SELECT nombre, puntaje FROM puntajes WHERE modo = ?"
+                " ORDER BY puntaje DESC, id LIMIT ?",
+                (modo, n),
+            )
+        else:
+            filas = self.conexion.execute(
+                "SELECT nombre, puntaje FROM puntajes"
+                " WHERE modo = ? AND dificultad = ?"
+                " ORDER BY puntaje DESC, id LIMIT ?",
+                (modo, dificultad, n),
+            )
+        return [{"nombre": nombre, "puntaje": puntaje} for nombre, puntaje in filas]
+
+    def obtener_top5(self, modo):
+        return self.obtener_top(modo, 5)
+
+    def mejores_de(self, nombre):
+        """Mejor puntaje del jugador en cada modo: {modo: puntaje}."""
+        filas = self.conexion.execute(
+            "SELECT modo, MAX(puntaje) FROM puntajes WHERE nombre = ? GROUP BY modo",
+            (nombre,),
+        )
+        return dict(filas)
+
+    def puntajes_entre(self, desde, hasta, modo=None):
+        """Resultados con fecha (epoch) en [desde, hasta), los más nuevos primero."""
+        consulta = (
+            "SELECT modo, dificultad, nombre, puntaje, fecha FROM puntajes"
+            " WHERE fecha >= ? AND fecha < ?"
+        )
+        parametros = [desde, hasta]
+        if modo is not None:
+            consulta += " AND modo = ?"
+            parametros.append(modo)
+        filas = self.conexion.execute(consulta + " ORDER BY fecha DESC", parametros)
+        return [
+            {
+                "modo": m,
+                "dificultad": d,
+                "nombre": nombre,
+                "puntaje": puntaje,
+                "fecha": fecha,
+            }
+            for m, d, nombre, puntaje, fecha in filas
+        ]
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+class RemoteScoreManager:
+    """Cliente del servidor de puntajes (servidor_puntajes.py).
+
+    Habla JSON por líneas sobre TCP ("host:puerto") o un socket Unix
+    ("unix:/ruta"). Si el servidor no responde, los registros se agregan a
+    `respaldo` y se reenvían antes del siguiente lote que sí llegue.
+    """
+
+    def __init__(self, direccion=DIRECCION_PUNTAJES, respaldo=ARCHIVO_PENDIENTES):
+        self.direccion = direccion
+        self.respaldo = respaldo
+        self.conexion = None
+        self.archivo = None
+
+    def conectar(self):
+        if self.direccion.startswith("unix:"):
+            conexion = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conexion.settimeout(TIMEOUT_PUNTAJES)
+            conexion.connect(self.direccion[len("unix:") :])
+        else:
+            host, puerto = self.direccion.rsplit(":", 1)
+            conexion = socket.create_connection(
+                (host, int(puerto)), timeout=TIMEOUT_PUNTAJES
+            )
+        self.conexion = conexion
+        self.archivo = conexion.makefile("rwb")
+
+    def pedir(self, pedido):
+        """Envía un pedido y devuelve la respuesta; OSError si no hay servidor."""
+        try:
+            if self.conexion is None:
+                self.conectar()
+            self.archivo.write(json.dumps(pedido).encode("utf-8") + b"\n")
+            self.archivo.flush()
+            linea = self.archivo.readline()
+            if not linea:
+                raise ConnectionError("el servidor cerró la conexión")
+        except OSError:
+            self.cerrar()
+            raise
+        respuesta = json.loads(linea)
+        if not respuesta.get("ok"):
+            raise ValueError(respuesta.get("error", "pedido rechazado"))
+        return respuesta
+
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        self.agregar_lote([(modo, nombre, puntaje, dificultad, fecha)])
+
+    def agregar_lote(self, registros):
+        """Envía los registros en un solo pedido: el servidor los guarda todos
+        o los rechaza todos con ValueError (y entonces no van al respaldo)."""
+        ahora = round(time.time(), 3)
+        registros = [list(r) for r in registros]
+        for registro in registros:
+            # la fecha es la del cliente, aunque llegue tarde desde el respaldo
+            if len(registro) < 5 or registro[4] is None:
+                # sin dificultad el registro queda en None, no con la fecha
+                registro.extend([None] * (4 - len(registro)))
+                registro[4:] = [ahora]
+        try:
+            self.enviar_respaldo()
+            self.pedir({"op": "agregar_lote", "registros": registros})
+        except OSError:
+            # lo que no llegó queda en el respaldo para el próximo envío
+            self.escribir_respaldo(self.leer_respaldo() + registros)
+
+    def enviar_respaldo(self):
+        """Reenvía el respaldo; OSError (y el resto sigue ahí) si no llega."""
+        registros = self.leer_respaldo()
+        for i in range(0, len(registros), LOTE_PUNTAJES):
+            lote = registros[i : i + LOTE_PUNTAJES]
+            try:
+                self.pedir({"op": "agregar_lote", "registros": lote})
+            except ValueError:
+                # un registro inválido no debe trabar al resto: de a uno
+                for j, registro in enumerate(lote):
+                    try:
+                        self.pedir({"op": "agregar_lote", "registros": [registro]})
+                    except ValueError as error:
+                        avisos.warning("Puntaje descartado %r: %s", registro, error)
+                    except OSError:
+                        self.escribir_respaldo(registros[i + j :])
+                        raise
+            except OSError:
+                self.escribir_respaldo(registros[i:])
+                raise
+        if os.path.exists(self.respaldo):
+            os.remove(self.respaldo)
+
+    def escribir_respaldo(self, registros):
+        temporal = self.respaldo + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.respaldo)
+
+    def leer_respaldo(self):
+        if not os.path.exists(self.respaldo):
+            return []
+        registros = []
+        with open(self.respaldo, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registros.append(json.loads(linea))
+                except ValueError:
+                    continue  # línea cortada por una caída
+        return registros
+
+    def obtener_top(self, modo, n=5):
+        return self.pedir({"op": "top", "modo": modo, "n": n})["top"]
 
-    def agregar_puntaje(self, modo, nombre, puntaje):
-        lista = self.data.get(modo, [])
-        lista.append({"nombre": nombre, "puntaje": puntaje})
-        lista.sort(key=lambda x: x["puntaje"], reverse=True)
-        self.data[modo] = lista[:5]
-        self.guardar()
+    def obtener_top5(self, modo):
+        return self.obtener_top(modo, 5)
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.archivo.close()
+            self.conexion.close()
+        self.conexion = None
+        self.archivo = None
+
+
+# Errores con los que un backend rechaza un lote por su contenido (reintentarlo
+# no sirve); cualquier otro OSError o sqlite3.Error se reintenta
+RECHAZOS_PUNTAJE = (
+    ValueError,
+    TypeError,
+    sqlite3.IntegrityError,
+    sqlite3.InterfaceError,
+)
+
+
+class PersistenciaPuntajes:
+    """Guarda puntajes desde un hilo propio para no tocar el disco desde Tk.
+
+    agregar_puntaje solo actualiza una vista en memoria de los tops y
+    encola el registro; el hilo escribe en lotes con agregar_lote del
+    backend. El backend se crea dentro del hilo con `crear_backend` (una
+    conexión de sqlite3 solo puede usarse en el hilo que la abrió).
+
+    Un lote que falla por el disco o la red se reintenta entero con el
+    siguiente; si el backend lo rechaza, se escribe de a uno y se descartan
+    (con un aviso) solo los registros rechazados. Lo que sigue sin escribir
+    al cerrar queda en `respaldo` y se escribe al abrir la próxima vez.
+    """
+
+    def __init__(self, crear_backend, respaldo=ARCHIVO_SIN_ESCRIBIR):
+        self.crear_backend = crear_backend
+        self.respaldo = respaldo
+        self.cola = queue.Queue()
+        self.lock = threading.Lock()
+        self.vista = {MODO_ESCAPA: TopPuntajes(), MODO_CAZADOR: TopPuntajes()}
+        # (secuencia, registro) ya en la vista pero no escritos todavía
+        self.sin_escribir = []
+        self.secuencia = 0
+        self.hilo = threading.Thread(target=self.trabajar, daemon=True)
+        self.hilo.start()
+
+    def trabajar(self):
+        backend = self.crear_backend()
+        anteriores = self.recuperar(backend)
+        self.refrescar(backend, 0)
+
+        pendientes = []
+        terminar = False
+        while not terminar:
+            pendientes.append(self.cola.get())
+            # juntar todo lo que ya esté encolado en un solo lote
+            while len(pendientes) < LOTE_PUNTAJES:
+                try:
+                    pendientes.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            if pendientes[-1] is None:
+                pendientes.pop()
+                terminar = True
+            escritos = self.escribir(backend, pendientes)
+            if escritos:
+                del pendientes[:escritos]
+                self.refrescar(backend, escritos)
+        self.guardar_respaldo(anteriores + pendientes)
+        backend.cerrar()
+
+    def escribir(self, backend, registros):
+        """Escribe registros en orden; devuelve cuántos del principio ya no
+        están pendientes (escritos o descartados por inválidos)."""
+        if not registros:
+            return 0
+        try:
+            backend.agregar_lote(registros)
+            return len(registros)
+        except RECHAZOS_PUNTAJE:
+            pass  # agregar_lote es todo o nada: se prueba de a uno
+        except (OSError, sqlite3.Error):
+            return 0  # se reintenta con el próximo lote o al cerrar
+        for i, registro in enumerate(registros):
+            try:
+                backend.agregar_lote([registro])
+            except RECHAZOS_PUNTAJE as error:
+                avisos.warning("Puntaje descartado %r: %s", registro, error)
+            except (OSError, sqlite3.Error):
+                return i
+        return len(registros)
+
+    def recuperar(self, backend):
+        """Escribe lo que quedó en el respaldo la vez anterior; devuelve lo
+        que todavía no se pudo escribir."""
+        try:
+            with open(self.respaldo, "r", encoding="utf-8") as f:
+                lineas = f.readlines()
+        except OSError:
+            return []  # no hay respaldo
+        anteriores = []
+        for linea in lineas:
+            try:
+                anteriores.append(json.loads(linea))
+            except ValueError:
+                continue  # línea cortada por una caída
+        anteriores = anteriores[self.escribir(backend, anteriores) :]
+        self.guardar_respaldo(anteriores)
+        return anteriores
+
+    def guardar_respaldo(self, registros):
+        """Deja `registros` en el respaldo (o lo borra si no hay ninguno)."""
+        try:
+            if not registros:
+                if os.path.exists(self.respaldo):
+                    os.remove(self.respaldo)
+                return
+            temporal = self.respaldo + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                for registro in registros:
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self.respaldo)
+        except OSError as error:
+            avisos.warning("No se pudo guardar %s: %s", self.respaldo, error)
+
+    def refrescar(self, backend, escritos):
+        """Rehace la vista con los tops del backend más lo no escrito.
+
+        Con un backend compartido (remoto o SQLite) así aparecen también
+        los puntajes de otras instancias. Los `escritos` primeros registros
+        de sin_escribir ya están en el backend.
+        """
+        try:
+            tops = {m: backend.obtener_top5(m) for m in (MODO_ESCAPA, MODO_CAZADOR)}
+        except (OSError, ValueError, sqlite3.Error):
+            tops = None  # servidor caído: se conserva la vista actual
+        with self.lock:
+            del self.sin_escribir[:escritos]
+            if tops is None:
+                return
+            vista = {}
+            for modo, top in tops.items():
+                vista[modo] = TopPuntajes()
+                # lo guardado cuenta como más antiguo que lo no escrito
+                for i, p in enumerate(top):
+                    vista[modo].agregar(p["puntaje"], i - len(top), p["nombre"])
+            for secuencia, (modo, nombre, puntaje, *_) in self.sin_escribir:
+                top = vista.setdefault(modo, TopPuntajes())
+                top.agregar(puntaje, secuencia, nombre)
+            self.vista = vista
+
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None):
+        # la fecha es la del resultado, no la de cuando el hilo lo escribe
+        registro = (modo, nombre, puntaje, dificultad, round(time.time(), 3))
+        with self.lock:
+            top = self.vista.setdefault(modo, TopPuntajes())
+            top.agregar(puntaje, self.secuencia, nombre)
+            self.sin_escribir.append((self.secuencia, registro))
+            self.secuencia += 1
+        self.cola.put(registro)
 
     def obtener_top5(self, modo):
-        return self.data.get(modo, [])
+        with self.lock:
+            top = self.vista.get(modo)
+            return top.mejores() if top else []
+
+    def cerrar(self):
+        """Escribe lo pendiente y espera al hilo."""
+        self.cola.put(None)
+        self.hilo.join()
+
+
+class GuardadoPartida:
+    """Escribe o borra la partida guardada desde un hilo propio.
+
+    El autoguardado arma los bytes en el hilo de Tk y los deja aquí; open,
+    fsync y os.replace pasan en el hilo. Un pedido que llega antes de que se
+    cumpla el anterior lo reemplaza: solo importa el último estado.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.condicion = threading.Condition()
+        # bytes a escribir, b"" para borrar el archivo o None si no hay nada
+        self.pedido = None
+        self.cerrando = False
+        self.hilo = threading.Thread(target=self.trabajar, daemon=True)
+        self.hilo.start()
+
+    def guardar(self, datos):
+        with self.condicion:
+            self.pedido = datos
+            self.condicion.notify()
+
+    def borrar(self):
+        self.guardar(b"")
+
+    def trabajar(self):
+        while True:
+            with self.condicion:
+                while self.pedido is None and not self.cerrando:
+                    self.condicion.wait()
+                datos, self.pedido = self.pedido, None
+            if datos is None:
+                return  # cerrando, sin nada pendiente
+            try:
+                if datos:
+                    self.escribir(datos)
+                else:
+                    os.remove(self.archivo)
+            except OSError:
+                pass  # sin archivo que borrar, o se reintenta al autoguardar
+
+    def escribir(self, datos):
+        temporal = self.archivo + ".tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo)
+
+    def cerrar(self):
+        """Cumple el último pedido y espera al hilo."""
+        with self.condicion:
+            self.cerrando = True
+            self.condicion.notify()
+        self.hilo.join()
+
+
+# =========================
+# RENDERIZADO
+# =========================
+
+
+class CanvasRenderer:
+    """Dibuja la zona visible del mapa con items persistentes del canvas.
+
+    El terreno de la vista es una sola imagen (un bloque de TAM_CELDA por
+    celda) con la grilla encima; al mover la cámara o cambiar el terreno se
+    repintan solo las celdas cuyo color cambió. Entidades y grilla son
+    pocos items, así que el canvas no crece con el tamaño del mapa.
+    imagen crea las imágenes (tk.PhotoImage por defecto).
+    """
+
+    def __init__(
+        self, canvas, vista_cols=VISTA_COLS, vista_filas=VISTA_FILAS, imagen=None
+    ):
+        self.canvas = canvas
+        self.vista_cols = vista_cols
+        self.vista_filas = vista_filas
+        self.nueva_imagen = imagen or functools.partial(tk.PhotoImage, master=canvas)
+        self.game_map = None
+        # celda del mapa en la esquina superior izquierda de la vista
+        self.camara = None
+        self.cols = 0
+        self.filas = 0
+        # la vista a un píxel por celda, y ampliada como se muestra
+        self.imagen_celdas = None
+        self.imagen_terreno = None
+        self.colores_terreno = []
+        self.version_terreno = None
+        self.item_salida = None
+        self.item_jugador = None
+        # entidad -> [item, x, y] de lo que ya está en el canvas
+        self.items_enemigos = {}
+        self.items_trampas = {}
+        self.item_overlay = None
+
+    def preparar_mapa(self, game_map):
+        """Crea una sola vez los items del terreno visible para un mapa."""
+        self.canvas.delete("all")
+        self.game_map = game_map
+        self.camara = None
+        self.items_enemigos = {}
+        self.items_trampas = {}
+        self.item_jugador = None
+        self.item_overlay = None
+
+        self.cols = min(self.vista_cols, game_map.cols)
+        self.filas = min(self.vista_filas, game_map.rows)
+        self.canvas.config(
+            width=self.cols * TAM_CELDA, height=self.filas * TAM_CELDA
+        )
+
+        ancho = self.cols * TAM_CELDA
+        alto = self.filas * TAM_CELDA
+        self.imagen_celdas = self.nueva_imagen(width=self.cols, height=self.filas)
+        self.imagen_terreno = self.nueva_imagen(width=ancho, height=alto)
+        self.canvas.create_image(
+            0, 0, image=self.imagen_terreno, anchor="nw", tags="terreno"
+        )
+        for x in range(self.cols + 1):
+            self.canvas.create_line(
+                x * TAM_CELDA, 0, x * TAM_CELDA, alto, fill="#555555", tags="grilla"
+            )
+        for y in range(self.filas + 1):
+            self.canvas.create_line(
+                0, y * TAM_CELDA, ancho, y * TAM_CELDA, fill="#555555", tags="grilla"
+            )
+        self.colores_terreno = [None] * (self.cols * self.filas)
+        self.version_terreno = None
+
+        # salida
+        self.item_salida = self.canvas.create_rectangle(
+            0, 0, 0, 0, outline="gold", width=3, state="hidden"
+        )
+
+    def enfocar(self, x, y):
+        """Centra la cámara en (x, y) sin salir del mapa; True si se movió."""
+        cx = min(max(x - self.cols // 2, 0), self.game_map.cols - self.cols)
+        cy = min(max(y - self.filas // 2, 0), self.game_map.rows - self.filas)
+        movida = (cx, cy) != self.camara
+        if movida:
+            self.camara = (cx, cy)
+            sx, sy = self.game_map.salida
+            if self.visible(sx, sy):
+                self.canvas.coords(self.item_salida, *self.rect_celda(sx, sy, 4))
+                self.canvas.itemconfig(self.item_salida, state="normal")
+            else:
+                self.canvas.itemconfig(self.item_salida, state="hidden")
+        if movida or self.version_terreno != self.game_map.version:
+            self.pintar_terreno()
+        return movida
+
+    def pintar_terreno(self):
+        """Repinta en la imagen solo las celdas de la vista que cambiaron.
+
+        Si cambió más de un cuarto (la cámara se movió) es más barato
+        rehacer la imagen entera: un put a un píxel por celda y una copia
+        ampliada, dos llamadas a Tk en vez de una por celda.
+        """
+        cx, cy = self.camara
+        cols = self.game_map.cols
+        celdas = self.game_map.celdas
+        colores = self.colores_terreno
+        cambiadas = []
+        k = 0
+        for fy in range(self.filas):
+            base = (cy + fy) * cols + cx
+            for fx in range(self.cols):
+                color = COLORES[celdas[base + fx]]
+                if colores[k] != color:
+                    colores[k] = color
+                    cambiadas.append(k)
+                k += 1
+        self.version_terreno = self.game_map.version
+
+        if len(cambiadas) * 4 > len(colores):
+            filas = [
+                "{" + " ".join(colores[f : f + self.cols]) + "}"
+                for f in range(0, len(colores), self.cols)
+            ]
+            self.imagen_celdas.put(" ".join(filas))
+            self.imagen_terreno.tk.call(
+                self.imagen_terreno,
+                "copy",
+                self.imagen_celdas,
+                "-zoom",
+                TAM_CELDA,
+                TAM_CELDA,
+            )
+            return
+        for k in cambiadas:
+            fy, fx = divmod(k, self.cols)
+            self.imagen_terreno.put(
+                colores[k],
+                to=(
+                    fx * TAM_CELDA,
+                    fy * TAM_CELDA,
+                    (fx + 1) * TAM_CELDA,
+                    (fy + 1) * TAM_CELDA,
+                ),
+            )
+
+    def visible(self, x, y):
+        cx, cy = self.camara
+        return cx <= x < cx + self.cols and cy <= y < cy + self.filas
+
+    def dibujar(self, jugador, enemigos, trampas, ocupacion=None):
+        """Con ocupacion (enemigos vivos por celda) solo se miran las celdas
+        visibles, sin recorrer toda la horda."""
+        if jugador is None:
+            return
+        # si la cámara se mueve hay que reubicar todo lo visible
+        movida = self.enfocar(jugador.x, jugador.y)
+
+        # trampas
+        visibles = [t for t in trampas if self.visible(t.x, t.y)]
+        self.sincronizar(self.items_trampas, visibles, self.crear_trampa, 8, movida)
+
+        # enemigos
+        if ocupacion is not None:
+            visibles = self.en_vista(ocupacion)
+        else:
+            visibles = [e for e in enemigos if e.vivo and self.visible(e.x, e.y)]
+        self.sincronizar(self.items_enemigos, visibles, self.crear_enemigo, 6, movida)
+
+        # jugador
+        if self.item_jugador is None:
+            self.item_jugador = [self.crear_jugador(jugador), jugador.x, jugador.y]
+        self.mover_item(self.item_jugador, jugador, 4, movida)
+
+    def en_vista(self, ocupacion):
+        """Entidades registradas en las celdas visibles."""
+        cx, cy = self.camara
+        cols = ocupacion.cols
+        celdas = ocupacion.celdas
+        visibles = []
+        if len(celdas) < self.filas * self.cols:
+            # pocas celdas ocupadas: más barato recorrerlas que mirar la vista
+            for k, lista in celdas.items():
+                if self.visible(k % cols, k // cols):
+                    visibles.extend(lista)
+            return visibles
+        for fy in range(cy, cy + self.filas):
+            base = fy * cols + cx
+            for k in range(base, base + self.cols):
+                lista = celdas.get(k)
+                if lista:
+                    visibles.extend(lista)
+        return visibles
+
+    def mostrar_overlay(self, texto):
+        """Texto sobre todo lo demás en la esquina de la vista; None lo oculta."""
+        if texto is None:
+            if self.item_overlay is not None:
+                self.canvas.itemconfig(self.item_overlay, state="hidden")
+            return
+        if self.item_overlay is None:
+            self.item_overlay = self.canvas.create_text(
+                4,
+                4,
+                anchor="nw",
+                fill="#00ff00",
+                font=("Courier", 9),
+                tags="overlay",
+            )
+        self.canvas.itemconfig(self.item_overlay, text=texto, state="normal")
+        self.canvas.tag_raise(self.item_overlay)
+
+    def sincronizar(self, items, entidades, crear, margen, movida):
+        """Crea, mueve o borra los items para que coincidan con las entidades."""
+        actuales = set(entidades)
+        for entidad in [e for e in items if e not in actuales]:
+            self.canvas.delete(items.pop(entidad)[0])
+        for entidad in entidades:
+            registro = items.get(entidad)
+            if registro is None:
+                items[entidad] = [crear(entidad), entidad.x, entidad.y]
+            else:
+                self.mover_item(registro, entidad, margen, movida)
+
+    def mover_item(self, registro, entidad, margen, movida):
+        item, x, y = registro
+        if entidad.x == x and entidad.y == y and not movida:
+            return
+        self.canvas.coords(item, *self.rect_celda(entidad.x, entidad.y, margen))
+        registro[1] = entidad.x
+        registro[2] = entidad.y
+
+    def rect_celda(self, x, y, margen):
+        """Rectángulo en pantalla de la celda (x, y) del mapa."""
+        x -= self.camara[0]
+        y -= self.camara[1]
+        return (
+            x * TAM_CELDA + margen,
+            y * TAM_CELDA + margen,
+            (x + 1) * TAM_CELDA - margen,
+            (y + 1) * TAM_CELDA - margen,
+        )
+
+    def crear_trampa(self, trampa):
+        item = self.canvas.create_oval(
+            *self.rect_celda(trampa.x, trampa.y, 8),
+            fill="red",
+            outline="yellow",
+            tags="trampa",
+        )
+        # las trampas nuevas quedan debajo de enemigos y jugador
+        self.canvas.tag_raise("enemigo")
+        self.canvas.tag_raise("jugador")
+        return item
+
+    def crear_enemigo(self, enemigo):
+        item = self.canvas.create_rectangle(
+            *self.rect_celda(enemigo.x, enemigo.y, 6),
+            fill="#ff5555",
+            outline="black",
+            tags="enemigo",
+        )
+        self.canvas.tag_raise("jugador")
+        return item
+
+    def crear_jugador(self, jugador):
+        return self.canvas.create_oval(
+            *self.rect_celda(jugador.x, jugador.y, 4),
+            fill="#1e90ff",
+            outline="black",
+            width=2,
+            tags="jugador",
+        )
 
 
 # =========================
@@ -306,32 +3749,54 @@ class ScoreManager:
 
 
 class GameApp:
-    def __init__(self, root):
+    def __init__(self, root, reloj=None):
         self.root = root
+        self.reloj = reloj or RelojMonotono()
         self.root.title("Proyecto Cazadores - Escapa / Cazador")
 
-        self.modo_actual = None
         self.dificultad = "Normal"
-        self.factor_dificultad = DIFICULTADES[self.dificultad]
-
-        self.game_map = GameMap(ANCHO_MAPA, ALTO_MAPA)
-        self.jugador = None
-        self.enemigos = []
-        self.trampas = []
-        self.ultimo_trampa = 0
+        self.tamano_mapa = "Pequeño"
+        self.tipo_mapa = "clasico"
+        self.estado = GameState()
+        # una reserva de mapas por (tamaño, tipo) usado en esta ejecución
+        self.pools = {}
 
         self.jugador_nombre = ""
-        self.score_manager = ScoreManager(ARCHIVO_SCORES)
-
-        self.tiempo_inicio = None
-        self.puntaje = 0
-        self.enemigos_atrapados = 0
-        self.enemigos_escapados = 0
-
-        self.running = False
+        if BACKEND_PUNTAJES == "sqlite":
+            backend = functools.partial(SQLiteScoreManager, ARCHIVO_SCORES_DB)
+        elif BACKEND_PUNTAJES == "remoto":
+            backend = RemoteScoreManager
+        else:
+            backend = functools.partial(
+                ScoreManager, ARCHIVO_SCORES, ARCHIVO_SCORES_ANTIGUO
+            )
+        # el disco se toca solo desde los hilos de persistencia
+        self.score_manager = PersistenciaPuntajes(backend)
+        self.guardado = GuardadoPartida(ARCHIVO_PARTIDA)
+
+        # cuántos ticks correr y cuándo dibujar en cada llamada a loop_juego
+        self.planificador = Planificador(self.reloj)
+        # teclas pendientes, que se aplican en orden en el próximo tick
+        self.entradas = collections.deque(maxlen=ENTRADAS_EN_COLA)
+        # entradas de la partida en curso, o el replay que se está mirando
+        self.grabacion = None
+        self.reproductor = None
+        self.ultimo_autoguardado = 0
+
+        # mediciones por fase, siempre activas; F3 las muestra y F4 las exporta
+        self.instrumentacion = Instrumentacion()
+        self.estado.instrumentacion = self.instrumentacion
+        self.ver_overlay = False
+        self.ultimo_overlay = 0.0
+        self.aviso_overlay = ""
+        # instante (perf_counter_ns) en que debería correr el próximo loop_juego
+        self.loop_programado = None
 
         self.crear_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
         self.mostrar_ventana_registro()
+        # el mapa por defecto se empieza a generar mientras se llena el registro
+        self.pool_actual()
 
     # ---------- UI ----------
 
@@ -375,11 +3840,12 @@ class GameApp:
         # Canvas principal
         self.canvas = tk.Canvas(
             self.root,
-            width=ANCHO_MAPA * TAM_CELDA,
-            height=ALTO_MAPA * TAM_CELDA,
+            width=VISTA_COLS * TAM_CELDA,
+            height=VISTA_FILAS * TAM_CELDA,
             bg="black",
         )
         self.canvas.pack()
+        self.renderer = CanvasRenderer(self.canvas)
 
         # Bindings de teclado
         self.root.bind("<Up>", lambda e: self.mover_jugador(0, -1, False))
@@ -396,6 +3862,13 @@ class GameApp:
         # Colocar trampa
         self.root.bind("<space>", lambda e: self.colocar_trampa())
 
+        # Guardar y salir
+        self.root.bind("<F2>", lambda e: self.cerrar())
+
+        # Rendimiento
+        self.root.bind("<F3>", lambda e: self.alternar_overlay())
+        self.root.bind("<F4>", lambda e: self.exportar_rendimiento())
+
     def mostrar_ventana_registro(self):
         self.win_reg = tk.Toplevel(self.root)
         self.win_reg.title("Registro de jugador")
@@ -410,6 +3883,18 @@ class GameApp:
             padx=10, pady=5
         )
 
+        tk.Label(self.win_reg, text="Tamaño del mapa:").pack(padx=10, pady=5)
+        self.var_tamano = tk.StringVar(value=self.tamano_mapa)
+        tk.OptionMenu(self.win_reg, self.var_tamano, *TAMANOS_MAPA.keys()).pack(
+            padx=10, pady=5
+        )
+
+        tk.Label(self.win_reg, text="Tipo de mapa:").pack(padx=10, pady=5)
+        self.var_tipo = tk.StringVar(value=self.tipo_mapa)
+        tk.OptionMenu(self.win_reg, self.var_tipo, *GENERADORES.keys()).pack(
+            padx=10, pady=5
+        )
+
         tk.Label(self.win_reg, text="Elige modo:").pack(padx=10, pady=5)
 
         btn_escapa = tk.Button(
@@ -426,6 +3911,13 @@ class GameApp:
         )
         btn_cazador.pack(padx=10, pady=5)
 
+        if os.path.exists(ARCHIVO_PARTIDA):
+            tk.Button(
+                self.win_reg,
+                text="Continuar partida guardada",
+                command=self.continuar_desde_registro,
+            ).pack(padx=10, pady=5)
+
     def iniciar_desde_registro(self, modo):
         nombre = self.entry_nombre.get().strip()
         if not nombre:
@@ -433,255 +3925,321 @@ class GameApp:
             return
         self.jugador_nombre = nombre
         self.dificultad = self.var_dif.get()
-        self.factor_dificultad = DIFICULTADES[self.dificultad]
+        self.tamano_mapa = self.var_tamano.get()
+        self.tipo_mapa = self.var_tipo.get()
         self.win_reg.destroy()
         self.iniciar_partida(modo)
 
+    def continuar_desde_registro(self):
+        try:
+            estado, grabacion = self.cargar_partida()
+        except (OSError, ValueError, struct.error, zlib.error) as error:
+            messagebox.showwarning(
+                "Atención", f"No se pudo continuar la partida guardada: {error}"
+            )
+            return
+        self.win_reg.destroy()
+        self.continuar_partida(estado, grabacion)
+
     # ---------- LÓGICA DEL JUEGO ----------
 
     def iniciar_partida(self, modo):
-        self.modo_actual = modo
         self.lbl_info.config(
             text=f"Modo: {modo} | Jugador: {self.jugador_nombre} | Dif: {self.dificultad}"
         )
 
-        # Generar mapa nuevo
-        self.game_map.generar()
-
-        # Crear jugador en inicio
-        ix, iy = self.game_map.inicio
-        self.jugador = Jugador(ix, iy)
-
-        # Crear enemigos
-        self.enemigos = []
-        num_enemigos = (
-            3
-            if self.dificultad == "Fácil"
-            else (4 if self.dificultad == "Normal" else 5)
+        game_map, semilla_mapa = self.pool_actual().tomar()
+        # semilla propia de la partida: con la del mapa y las entradas
+        # grabadas alcanza para volver a jugarla igual
+        semilla_partida = random.randrange(2**32)
+        self.estado.rng = random.Random(semilla_partida)
+        self.estado.iniciar(
+            modo, self.dificultad, generador=self.tipo_mapa, game_map=game_map
         )
-        for _ in range(num_enemigos):
-            ex, ey = self.generar_posicion_enemigo()
-            self.enemigos.append(Enemigo(ex, ey, velocidad=self.factor_dificultad))
-
-        self.trampas = []
-        self.ultimo_trampa = 0
+        self.renderer.preparar_mapa(self.estado.game_map)
+
+        self.grabacion = Grabacion(
+            modo,
+            self.dificultad,
+            self.tipo_mapa,
+            game_map.cols,
+            game_map.rows,
+            semilla_mapa,
+            semilla_partida,
+            len(self.estado.enemigos),
+            self.estado.factor_dificultad,
+            self.jugador_nombre,
+        )
+        self.reproductor = None
+        self.ultimo_autoguardado = 0
+        self.entradas.clear()
+        self.planificador.iniciar()
+        self.actualizar_top5_labels()
+        self.loop_juego()
 
-        self.tiempo_inicio = time.time()
-        self.puntaje = 0
-        self.enemigos_atrapados = 0
-        self.enemigos_escapados = 0
-        self.running = True
+    def continuar_partida(self, estado, grabacion):
+        """Sigue una partida cargada con cargar_partida() desde su tick."""
+        self.estado = estado
+        estado.instrumentacion = self.instrumentacion
+        self.grabacion = grabacion
+        self.jugador_nombre = grabacion.jugador
+        self.dificultad = estado.dificultad
+        self.tipo_mapa = estado.generador
+        for nombre, tamano in TAMANOS_MAPA.items():
+            if tamano == (grabacion.cols, grabacion.rows):
+                self.tamano_mapa = nombre
+        self.lbl_info.config(
+            text=f"Modo: {estado.modo} | Jugador: {grabacion.jugador} | "
+            f"Dif: {estado.dificultad}"
+        )
+        self.renderer.preparar_mapa(estado.game_map)
 
+        self.reproductor = None
+        self.ultimo_autoguardado = estado.tick
+        self.entradas.clear()
+        self.planificador.iniciar(estado.tick)
         self.actualizar_top5_labels()
         self.loop_juego()
 
-    def generar_posicion_enemigo(self):
-        while True:
-            x = random.randint(1, self.game_map.cols - 2)
-            y = random.randint(1, self.game_map.rows - 2)
-            if (x, y) != self.game_map.inicio and (x, y) != self.game_map.salida:
-                cas = self.game_map.casilla(x, y)
-                if cas.puede_pasar_enemigo():
-                    return x, y
+    def reproducir(self, reproductor, velocidad=1.0):
+        """Muestra un replay en vez de una partida; las teclas no actúan."""
+        self.reproductor = reproductor
+        self.grabacion = None
+        self.estado = reproductor.estado
+        self.estado.instrumentacion = self.instrumentacion
+        g = reproductor.grabacion
+        self.lbl_info.config(
+            text=f"Replay: {g.modo} | Jugador: {g.jugador} | Dif: {g.dificultad}"
+        )
+        self.renderer.preparar_mapa(self.estado.game_map)
+        # empieza en el tick actual del reproductor (puede venir de ir_a)
+        self.entradas.clear()
+        self.planificador.iniciar(self.estado.tick, velocidad)
+        self.actualizar_top5_labels()
+        self.loop_juego()
 
     def mover_jugador(self, dx, dy, correr):
-        if not self.running:
-            return
-        self.jugador.mover(dx, dy, self.game_map, correr)
-        # Si llega a salida en modo escapa -> gana
-        if self.modo_actual == MODO_ESCAPA and self.game_map.es_salida(
-            self.jugador.x, self.jugador.y
-        ):
-            self.fin_partida(victoria=True, motivo="¡Escapaste a tiempo!")
-        self.dibujar()
+        self.encolar((ENTRADA_MOVER, dx, dy, correr))
 
     def colocar_trampa(self):
-        if not self.running:
-            return
-        if self.modo_actual != MODO_ESCAPA:
-            return
-        ahora = time.time()
-        # máximo 3 trampas y cooldown
-        if len(self.trampas) >= 3:
-            return
-        if ahora - self.ultimo_trampa < COOLDOWN_TRAMPA:
-            return
-        # Trampa en posición del jugador
-        self.trampas.append(Trampa(self.jugador.x, self.jugador.y))
-        self.ultimo_trampa = ahora
-        self.dibujar()
-
-    def loop_juego(self):
-        if not self.running:
-            return
+        self.encolar((ENTRADA_TRAMPA,))
 
-        # actualizar tiempo y energía
-        tiempo = int(time.time() - self.tiempo_inicio)
-        self.lbl_tiempo.config(text=f"Tiempo: {tiempo}s")
-        self.jugador.actualizar_energia()
-        self.actualizar_barra_energia()
-
-        # mover enemigos
-        for enemigo in self.enemigos:
-            if not enemigo.vivo:
-                # revisar respawn
-                if (
-                    enemigo.tiempo_muerte
-                    and time.time() - enemigo.tiempo_muerte >= RESPAWN_ENEMIGO
-                ):
-                    ex, ey = self.generar_posicion_enemigo()
-                    enemigo.x = ex
-                    enemigo.y = ey
-                    enemigo.vivo = True
-                    enemigo.tiempo_muerte = None
-                continue
-            enemigo.mover(self.jugador, self.game_map, self.modo_actual)
+    def encolar(self, entrada):
+        """Guarda la tecla para el próximo tick; no toca el estado ni dibuja.
 
-            # comprobar colisiones según modo
-            if self.modo_actual == MODO_ESCAPA:
-                # si enemigo toca al jugador -> pierde
-                if enemigo.x == self.jugador.x and enemigo.y == self.jugador.y:
-                    self.fin_partida(victoria=False, motivo="Un cazador te atrapó.")
-                    return
-            else:
-                # modo cazador: si jugador toca enemigo -> lo atrapa
-                if enemigo.x == self.jugador.x and enemigo.y == self.jugador.y:
-                    self.enemigos_atrapados += 1
-                    # puntos positivos
-                    self.puntaje += int(100 * self.factor_dificultad * 2)
-                    enemigo.vivo = False
-                    enemigo.tiempo_muerte = time.time()
+        Con la repetición del teclado llegan varias por tick: se aplican
+        todas en orden y se dibuja una vez.
+        """
+        if self.estado.running and not self.reproductor:
+            self.entradas.append(entrada)
 
-            # enemigos pueden escapar por la salida en modo cazador
-            if self.modo_actual == MODO_CAZADOR and self.game_map.es_salida(
-                enemigo.x, enemigo.y
-            ):
-                self.enemigos_escapados += 1
-                self.puntaje -= int(50 * self.factor_dificultad)
-                enemigo.vivo = False
-                enemigo.tiempo_muerte = time.time()
-
-        # trampas en modo escapa
-        if self.modo_actual == MODO_ESCAPA:
-            for enemigo in self.enemigos:
-                if enemigo.vivo:
-                    for trampa in list(self.trampas):
-                        if enemigo.x == trampa.x and enemigo.y == trampa.y:
-                            # enemigo muere, trampa desaparece
-                            enemigo.vivo = False
-                            enemigo.tiempo_muerte = time.time()
-                            self.trampas.remove(trampa)
-                            # bono pequeño
-                            self.puntaje += int(30 * self.factor_dificultad)
+    def loop_juego(self):
+        if not self.estado.running:
+            return
+        inicio = time.perf_counter_ns()
+        if self.loop_programado is not None:
+            self.instrumentacion.registrar("jitter", abs(inicio - self.loop_programado))
+        planificador = self.planificador
+        planificador.empezar_llamada()
+
+        # los ticks que correspondan según el reloj, aunque after() se atrase;
+        # los que no entren en el presupuesto quedan para la llamada siguiente
+        pendientes = planificador.ticks_pendientes(self.estado.tick)
+        if self.reproductor:
+            while pendientes and not self.reproductor.terminado():
+                self.reproductor.avanzar()
+                pendientes -= 1
+                if planificador.excedido():
+                    break
+            # el reproductor pudo volver a un snapshot: seguir su estado
+            self.estado = self.reproductor.estado
+            self.estado.instrumentacion = self.instrumentacion
+        else:
+            while pendientes and self.estado.running:
+                # las teclas desde el tick anterior; las siguientes vueltas
+                # de este ciclo ya no tienen
+                entradas = list(self.entradas)
+                self.entradas.clear()
+                for entrada in entradas:
+                    self.grabacion.registrar(self.estado.tick, entrada)
+                self.estado.step(entradas)
+                pendientes -= 1
+                if planificador.excedido():
+                    break
+
+        if (
+            self.grabacion
+            and self.estado.running
+            and self.estado.tick - self.ultimo_autoguardado >= AUTOGUARDADO_CADA
+        ):
+            self.guardar_partida()
 
-        # actualizar puntaje en función del tiempo (modo escapa)
-        if self.modo_actual == MODO_ESCAPA:
-            base = max(0, 1000 - tiempo * 10)
-            self.puntaje = (
-                int(base * self.factor_dificultad) + self.enemigos_atrapados * 30
+        terminada = not self.estado.running or (
+            self.reproductor and self.reproductor.terminado()
+        )
+        # el último cuadro siempre se dibuja
+        if terminada or planificador.toca_dibujar():
+            inicio_dibujo = self.reloj.ahora()
+            self.lbl_tiempo.config(text=f"Tiempo: {int(self.estado.tiempo)}s")
+            self.actualizar_barra_energia()
+            self.lbl_puntaje.config(text=f"Puntaje: {self.estado.puntaje}")
+            self.dibujar()
+            if self.ver_overlay:
+                self.actualizar_overlay()
+            planificador.dibujado(inicio_dibujo)
+
+        if terminada:
+            self.loop_programado = None
+            self.fin_partida()
+            return
+        demora = planificador.terminar_llamada(self.estado.tick)
+        fin = time.perf_counter_ns()
+        self.instrumentacion.registrar("loop", fin - inicio)
+        self.loop_programado = fin + demora * 1_000_000
+        self.root.after(demora, self.loop_juego)
+
+    def fin_partida(self):
+        estado = self.estado
+        tiempo_total = int(estado.tiempo)
+
+        self.lbl_puntaje.config(text=f"Puntaje: {estado.puntaje}")
+        if self.reproductor:
+            declarado = self.reproductor.grabacion.puntaje
+            messagebox.showinfo(
+                "Fin del replay",
+                f"{estado.motivo}\n\nPuntaje reproducido: {estado.puntaje}\n"
+                f"Puntaje declarado: {declarado}",
             )
-        # en modo cazador ya se actualiza en los eventos
-
-        self.lbl_puntaje.config(text=f"Puntaje: {self.puntaje}")
-        self.dibujar()
-
-        self.root.after(100, self.loop_juego)
-
-    def fin_partida(self, victoria, motivo):
-        self.running = False
-        tiempo_total = int(time.time() - self.tiempo_inicio)
-
-        if self.modo_actual == MODO_CAZADOR:
-            # Ajuste final de puntaje por tiempo: bonus pequeño
-            self.puntaje += int(max(0, 500 - tiempo_total * 5) * self.factor_dificultad)
-
-        self.lbl_puntaje.config(text=f"Puntaje: {self.puntaje}")
+            return
+        self.guardar_replay()
+        self.guardado.borrar()
         self.score_manager.agregar_puntaje(
-            self.modo_actual, self.jugador_nombre, self.puntaje
+            estado.modo, self.jugador_nombre, estado.puntaje, estado.dificultad
         )
         self.actualizar_top5_labels()
 
-        texto = f"{motivo}\n\nPuntaje final: {self.puntaje}\nTiempo: {tiempo_total}s"
-        if not victoria and self.modo_actual == MODO_ESCAPA:
-            titulo = "Has perdido"
-        elif not victoria:
-            titulo = "Has perdido"
-        else:
-            titulo = "¡Has ganado!"
+        texto = (
+            f"{estado.motivo}\n\nPuntaje final: {estado.puntaje}\n"
+            f"Tiempo: {tiempo_total}s"
+        )
+        titulo = "¡Has ganado!" if estado.victoria else "Has perdido"
 
         if messagebox.askyesno(titulo, texto + "\n\n¿Jugar de nuevo?"):
             self.mostrar_ventana_registro()
         else:
-            self.root.destroy()
+            self.cerrar()
+
+    def guardar_replay(self):
+        estado = self.estado
+        self.grabacion.terminar(estado.tick, estado.puntaje)
+        fecha = time.strftime("%Y%m%d-%H%M%S")
+        nombre = "".join(c for c in self.jugador_nombre if c.isalnum()) or "jugador"
+        ruta = os.path.join(
+            CARPETA_REPLAYS, f"{fecha}_{nombre}_{estado.modo}_{estado.puntaje}.rpl"
+        )
+        try:
+            os.makedirs(CARPETA_REPLAYS, exist_ok=True)
+            self.grabacion.guardar(ruta)
+        except OSError:
+            pass  # perder el replay no debe cortar el fin de la partida
+
+    def guardar_partida(self):
+        """Pasa la instantánea y la grabación de la partida al hilo de guardado.
+
+        El terreno no se guarda: se regenera con la semilla de la grabación,
+        así el archivo ocupa unos pocos KB en cualquier tamaño de mapa.
+        """
+        instantanea = self.estado.a_bytes(terreno=False)
+        self.guardado.guardar(
+            b"".join(
+                (
+                    struct.pack("<I", len(instantanea)),
+                    instantanea,
+                    self.grabacion.a_bytes(),
+                )
+            )
+        )
+        self.ultimo_autoguardado = self.estado.tick
+
+    def cargar_partida(self):
+        """Devuelve (estado, grabacion) de ARCHIVO_PARTIDA."""
+        with open(ARCHIVO_PARTIDA, "rb") as f:
+            datos = f.read()
+        (largo,) = struct.unpack_from("<I", datos)
+        grabacion = Grabacion.desde_bytes(datos[4 + largo :])
+        game_map = GameMap(grabacion.cols, grabacion.rows)
+        game_map.generar(random.Random(grabacion.semilla_mapa), grabacion.generador)
+        estado = GameState.desde_bytes(memoryview(datos)[4 : 4 + largo], game_map)
+        return estado, grabacion
+
+    def pool_actual(self):
+        cols, rows = TAMANOS_MAPA[self.tamano_mapa]
+        clave = (cols, rows, self.tipo_mapa)
+        if clave not in self.pools:
+            archivo = ARCHIVO_MAPAS.format(
+                generador=self.tipo_mapa, cols=cols, rows=rows
+            )
+            self.pools[clave] = PoolMapas(
+                cols,
+                rows,
+                self.tipo_mapa,
+                largo_minimo=largo_minimo_mapa(cols, rows, self.tipo_mapa),
+                archivo=archivo,
+            )
+        return self.pools[clave]
+
+    def cerrar(self):
+        if self.grabacion and self.estado.running:
+            self.guardar_partida()
+        for pool in self.pools.values():
+            pool.detener()
+        self.score_manager.cerrar()
+        self.guardado.cerrar()
+        self.root.destroy()
 
     # ---------- DIBUJO ----------
 
     def dibujar(self):
-        self.canvas.delete("all")
-        # terreno
-        for y in range(self.game_map.rows):
-            for x in range(self.game_map.cols):
-                cas = self.game_map.casilla(x, y)
-                color = cas.color()
-                self.canvas.create_rectangle(
-                    x * TAM_CELDA,
-                    y * TAM_CELDA,
-                    (x + 1) * TAM_CELDA,
-                    (y + 1) * TAM_CELDA,
-                    fill=color,
-                    outline="#555555",
-                )
-
-        # salida
-        sx, sy = self.game_map.salida
-        self.canvas.create_rectangle(
-            sx * TAM_CELDA + 4,
-            sy * TAM_CELDA + 4,
-            (sx + 1) * TAM_CELDA - 4,
-            (sy + 1) * TAM_CELDA - 4,
-            outline="gold",
-            width=3,
+        inicio = time.perf_counter_ns()
+        estado = self.estado
+        self.renderer.dibujar(
+            estado.jugador, estado.enemigos, estado.trampas, estado.ocupacion_enemigos
         )
+        self.instrumentacion.registrar("dibujar", time.perf_counter_ns() - inicio)
 
-        # trampas
-        for trampa in self.trampas:
-            self.canvas.create_oval(
-                trampa.x * TAM_CELDA + 8,
-                trampa.y * TAM_CELDA + 8,
-                (trampa.x + 1) * TAM_CELDA - 8,
-                (trampa.y + 1) * TAM_CELDA - 8,
-                fill="red",
-                outline="yellow",
-            )
-
-        # enemigos
-        for enemigo in self.enemigos:
-            if not enemigo.vivo:
-                continue
-            self.canvas.create_rectangle(
-                enemigo.x * TAM_CELDA + 6,
-                enemigo.y * TAM_CELDA + 6,
-                (enemigo.x + 1) * TAM_CELDA - 6,
-                (enemigo.y + 1) * TAM_CELDA - 6,
-                fill="#ff5555",
-                outline="black",
-            )
+    def alternar_overlay(self):
+        self.ver_overlay = not self.ver_overlay
+        if self.ver_overlay:
+            self.actualizar_overlay(forzar=True)
+        else:
+            self.renderer.mostrar_overlay(None)
 
-        # jugador
-        if self.jugador:
-            self.canvas.create_oval(
-                self.jugador.x * TAM_CELDA + 4,
-                self.jugador.y * TAM_CELDA + 4,
-                (self.jugador.x + 1) * TAM_CELDA - 4,
-                (self.jugador.y + 1) * TAM_CELDA - 4,
-                fill="#1e90ff",
-                outline="black",
-                width=2,
-            )
+    def actualizar_overlay(self, forzar=False):
+        """Refresca el panel de rendimiento cada REFRESCO_OVERLAY segundos."""
+        ahora = self.reloj.ahora()
+        if not forzar and ahora - self.ultimo_overlay < REFRESCO_OVERLAY:
+            return
+        self.ultimo_overlay = ahora
+        lineas = self.instrumentacion.resumen()
+        lineas.append(self.planificador.resumen())
+        if self.aviso_overlay:
+            lineas.append(self.aviso_overlay)
+        self.renderer.mostrar_overlay("\n".join(lineas))
+
+    def exportar_rendimiento(self):
+        ruta = ARCHIVO_RENDIMIENTO.format(fecha=time.strftime("%Y%m%d-%H%M%S"))
+        try:
+            self.instrumentacion.exportar(ruta)
+            self.aviso_overlay = f"Exportado a {ruta}"
+        except OSError as error:
+            self.aviso_overlay = f"No se pudo exportar: {error}"
+        self.ver_overlay = True
+        self.actualizar_overlay(forzar=True)
 
     def actualizar_barra_energia(self):
         self.canvas_energia.delete("all")
-        porc = self.jugador.energia / self.jugador.energia_max
+        jugador = self.estado.jugador
+        porc = jugador.energia / jugador.energia_max
         largo = int(120 * porc)
         color = "#00ff00" if porc > 0.5 else ("#ffff00" if porc > 0.2 else "#ff0000")
         self.canvas_energia.create_rectangle(0, 0, 120, 16, fill="#333333", outline="")
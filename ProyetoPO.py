@@ -1,28 +1,106 @@
-import tkinter as tk
-from tkinter import messagebox
+try:
+    import tkinter as tk
+    from tkinter import messagebox
+except ImportError:  # sin Tk el motor (GameState) sigue disponible
+    tk = messagebox = None
 import random
 import json
+from array import array
+import base64
+import collections
+import functools
+import heapq
+import itertools
+import logging
 import os
+import queue
+import re
+import socket
+import sqlite3
+import struct
+import sys
+import threading
 import time
+import zlib
+
+avisos = logging.getLogger(__name__)
 
 TAM_CELDA = 32
 ANCHO_MAPA = 20  # columnas
 ALTO_MAPA = 15  # filas
 
+TAMANOS_MAPA = {
+    "Pequeño": (ANCHO_MAPA, ALTO_MAPA),
+    "Grande": (200, 150),
+    "Enorme": (1000, 1000),
+}
+
+VISTA_COLS = 20
+VISTA_FILAS = 15
+
 CAMINO = 0
 MURO = 1
 LIANA = 2
 TUNEL = 3
 
+PASO_JUGADOR = 1
+PASO_ENEMIGO = 2
+
+DIRECCIONES = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
 MODO_ESCAPA = "ESCAPA"
 MODO_CAZADOR = "CAZADOR"
 
-DIFICULTADES = {"Fácil": 1.0, "Normal": 1.5, "Difícil": 2.0}
+DIFICULTADES = {"Fácil": 1.0, "Normal": 1.5, "Difícil": 2.0, "Horda": 1.0}
+ENEMIGOS_POR_DIFICULTAD = {"Fácil": 3, "Normal": 4, "Difícil": 5, "Horda": 10_000}
+
+DIFICULTAD_HORDA = "Horda"
+CELDAS_POR_ENEMIGO = 4  # en mapas chicos la horda se limita a 1 cada 4 celdas
+
+TICKS_POR_SEGUNDO = 10
+COOLDOWN_TRAMPA = 5 * TICKS_POR_SEGUNDO
+RESPAWN_ENEMIGO = 10 * TICKS_POR_SEGUNDO
+DURACION_TRAMPA = 30 * TICKS_POR_SEGUNDO  # una trampa sin usar se gasta
+
+RADIO_CAMPO = 40
+PERIODO_CAMPO_LEJANO = 3 * TICKS_POR_SEGUNDO
+CUOTA_CAMPO_LEJANO = 8000
+CUOTA_ZONAS = 10000
+ALEJAMIENTO_ANCLA = 8
+RECUPERACION_ENERGIA = TICKS_POR_SEGUNDO  # ticks por punto de energía
+INTERVALO_ENEMIGO = 6  # ticks entre pasos de un enemigo con velocidad 1.0
+INTERVALO_MINIMO_ENEMIGO = 2
+DISTANCIA_MINIMA_ENEMIGO = 5
+INTENTOS_POSICION_ENEMIGO = 8
 
-COOLDOWN_TRAMPA = 5
-RESPAWN_ENEMIGO = 10
+ARCHIVO_SCORES = "scores.jsonl"
+ARCHIVO_SCORES_ANTIGUO = "scores.json"
+FSYNC_CADA = 16  # registros por fsync agrupado
+FSYNC_SEGUNDOS = 2.0  # o antes, si pasó este tiempo desde el último
+COMPACTAR_CADA = 1000  # registros entre instantáneas
+BACKEND_PUNTAJES = "bitacora"
+ARCHIVO_SCORES_DB = "scores.db"
+DIRECCION_PUNTAJES = "127.0.0.1:8765"  # o "unix:/ruta/al/socket"
+ARCHIVO_PENDIENTES = "scores_pendientes.jsonl"  # si el servidor no está
+ARCHIVO_SIN_ESCRIBIR = "scores_sin_escribir.jsonl"
+TIMEOUT_PUNTAJES = 2.0
+LOTE_PUNTAJES = 256  # registros por escritura del hilo de persistencia
 
-ARCHIVO_SCORES = "scores.json"
+TAMANO_RESERVA = 2  # mapas listos por configuración
+INTENTOS_MAPA = 20  # semillas a probar antes de aceptar el mejor mapa
+LARGO_MINIMO_MAPA = {"clasico": 1.0, "laberinto": 1.04, "cuevas": 1.0, "salas": 1.3}
+ARCHIVO_MAPAS = "mapas_{generador}_{cols}x{rows}.jsonl"
+
+ARCHIVO_PARTIDA = "partida_guardada.bin"
+AUTOGUARDADO_CADA = 5 * TICKS_POR_SEGUNDO
+
+MAX_TICKS_POR_LLAMADA = 5
+PRESUPUESTO_LOOP = 0.08  # segundos
+FPS_MINIMO = 2
+ENTRADAS_EN_COLA = 4
+
+REFRESCO_OVERLAY = 0.5  # segundos entre actualizaciones del texto
+ARCHIVO_RENDIMIENTO = "rendimiento_{fecha}.json"
 
 
 class CasillaBase:
@@ -69,291 +147,3522 @@ class Camino(CasillaBase):
         return "#d4d4d4"
 
 
-class Muro(CasillaBase):
-    # E: ninguno
-    # S: inicializa muro
-    def __init__(self):
-        super().__init__(MURO)
+class Muro(CasillaBase):
+    # E: ninguno
+    # S: inicializa muro
+    def __init__(self):
+        super().__init__(MURO)
+
+    # E: ninguno
+    # S: color muro
+    def color(self):
+        return "#222222"
+
+
+class Liana(CasillaBase):
+    # E: ninguno
+    # S: inicializa liana
+    def __init__(self):
+        super().__init__(LIANA)
+
+    # E: ninguno
+    # S: enemigo puede pasar
+    def puede_pasar_enemigo(self):
+        return True
+
+    # E: ninguno
+    # S: color liana
+    def color(self):
+        return "#228B22"
+
+
+class Tunel(CasillaBase):
+    # E: ninguno
+    # S: inicializa túnel
+    def __init__(self):
+        super().__init__(TUNEL)
+
+    # E: ninguno
+    # S: jugador puede pasar
+    def puede_pasar_jugador(self):
+        return True
+
+    # E: ninguno
+    # S: color túnel
+    def color(self):
+        return "#4b0082"
+
+
+TERRENOS = (Camino(), Muro(), Liana(), Tunel())
+COLORES = tuple(terreno.color() for terreno in TERRENOS)
+
+TABLA_PASO = bytearray(256)
+for _terreno in TERRENOS:
+    TABLA_PASO[_terreno.codigo] = (
+        PASO_JUGADOR if _terreno.puede_pasar_jugador() else 0
+    ) | (PASO_ENEMIGO if _terreno.puede_pasar_enemigo() else 0)
+del _terreno
+
+
+TABLA_TRAMOS = bytes(1 if v & PASO_ENEMIGO else 0 for v in range(256))
+TRAMO = re.compile(b"\x01+")
+COMPONENTE_UNICA = bytes([255, 0]) + bytes(254)
+
+
+class ZonasEnemigo:
+    # E: paso, cols, de_a_partes
+    # S: índice de componentes
+    def __init__(self, paso, cols, de_a_partes=False):
+        self.paso = paso
+        self.cols = cols
+        self.vigente = True
+        self.cambios = 0
+        self.partes = self.armar()
+        if not de_a_partes:
+            for _ in self.partes:
+                pass
+
+    # E: cuota
+    # S: si el índice está listo
+    def avanzar(self, cuota):
+        hecho = 0
+        for celdas in self.partes:
+            hecho += celdas
+            if hecho >= cuota:
+                return False
+        return True
+
+    # E: ninguno
+    # S: celdas recorridas por fila
+    def armar(self):
+        paso = self.paso
+        cols = self.cols
+        n = len(paso)
+        mascara = paso.translate(TABLA_TRAMOS)
+        inicios_tramo = []
+        fines_tramo = []
+        padre = []
+        primeros = []
+        total = 0
+
+        def raiz(t):
+            while padre[t] != t:
+                padre[t] = padre[padre[t]]
+                t = padre[t]
+            return t
+
+        arriba_a = arriba_b = ()
+        arriba_t = 0
+        for base in range(0, n, cols):
+            primero = len(padre)
+            primeros.append(primero)
+            tramos = [m.span() for m in TRAMO.finditer(mascara, base, base + cols)]
+            j = 0
+            m = len(arriba_a)
+            for a, b in tramos:
+                t = len(padre)
+                padre.append(t)
+                total += 1
+                a -= cols
+                b -= cols
+                while j < m and arriba_b[j] <= a:
+                    j += 1
+                i = j
+                while i < m and arriba_a[i] < b:
+                    r1 = raiz(t)
+                    r2 = raiz(arriba_t + i)
+                    if r1 < r2:
+                        padre[r2] = r1
+                        total -= 1
+                    elif r2 < r1:
+                        padre[r1] = r2
+                        total -= 1
+                    i += 1
+            arriba_a = [a for a, _ in tramos]
+            arriba_b = [b for _, b in tramos]
+            arriba_t = primero
+            inicios_tramo += arriba_a
+            fines_tramo += arriba_b
+            yield cols
+        primeros.append(len(padre))
+
+        componente = array("i", [-1]) * n
+        if total == 1:
+            celdas = array("i")
+            for base in range(0, n, cols):
+                fila = mascara[base : base + cols]
+                celdas.extend(itertools.compress(range(base, base + cols), fila))
+                unica = fila.translate(COMPONENTE_UNICA)
+                enteros = bytearray(4 * len(unica))
+                for i in range(4):
+                    enteros[i::4] = unica
+                componente[base : base + cols] = array("i", enteros)
+                yield cols
+            bloques = [celdas]
+        else:
+            componente_tramo = []
+            bloques = []
+            for fila in range(len(primeros) - 1):
+                for t in range(primeros[fila], primeros[fila + 1]):
+                    p = padre[t]
+                    if p == t:
+                        c = len(bloques)
+                        bloques.append(array("i"))
+                    else:
+                        c = componente_tramo[p]
+                    componente_tramo.append(c)
+                    a = inicios_tramo[t]
+                    b = fines_tramo[t]
+                    bloques[c].extend(range(a, b))
+                    componente[a:b] = array("i", [c]) * (b - a)
+                yield cols
+
+        celdas = array("i")
+        self.inicios = array("i", [0])
+        copiadas = 0
+        for bloque in bloques:
+            celdas.extend(bloque)
+            self.inicios.append(len(celdas))
+            copiadas += len(bloque)
+            if copiadas >= cols:
+                yield copiadas
+                copiadas = 0
+        self.celdas = celdas
+        self.componente = componente
+        self.grupo = array("i", range(len(bloques)))
+        self.tamanos = [len(bloque) for bloque in bloques]
+        self.miembros = {}
+
+    # E: ninguno
+    # S: cantidad de componentes
+    def __len__(self):
+        return sum(1 for b, g in enumerate(self.grupo) if b == g)
+
+    # E: b
+    # S: bloque raíz de la componente
+    def raiz(self, b):
+        grupo = self.grupo
+        while grupo[b] != b:
+            grupo[b] = grupo[grupo[b]]
+            b = grupo[b]
+        return b
+
+    # E: b1, b2
+    # S: une las componentes de dos bloques
+    def unir(self, b1, b2):
+        r1 = self.raiz(b1)
+        r2 = self.raiz(b2)
+        if r1 == r2:
+            return
+        if self.tamanos[r1] < self.tamanos[r2]:
+            r1, r2 = r2, r1
+        self.grupo[r2] = r1
+        self.tamanos[r1] += self.tamanos[r2]
+        self.miembros[r1] = self.bloques(r1) + self.miembros.pop(r2, [r2])
+
+    # E: c
+    # S: bloques de la componente
+    def bloques(self, c):
+        return self.miembros.get(c, [c])
+
+    # E: k
+    # S: agrega la celda y une vecinas
+    def abrir(self, k):
+        self.cambios += 1
+        b = len(self.grupo)
+        self.celdas.append(k)
+        self.inicios.append(len(self.celdas))
+        self.grupo.append(b)
+        self.tamanos.append(1)
+        componente = self.componente
+        componente[k] = b
+        cols = self.cols
+        x = k % cols
+        for v in (
+            k - cols,
+            k + cols,
+            k - 1 if x > 0 else -1,
+            k + 1 if x < cols - 1 else -1,
+        ):
+            if 0 <= v < len(componente) and componente[v] >= 0:
+                self.unir(b, componente[v])
+
+    # E: k
+    # S: marca el índice no vigente
+    def cerrar(self, k):
+        self.cambios += 1
+        self.componente[k] = -1
+        self.vigente = False
+
+    # E: c
+    # S: celdas de la componente
+    def tamano(self, c):
+        return self.tamanos[c]
+
+    # E: k
+    # S: tupla de componentes
+    def alrededor(self, k):
+        componente = self.componente
+        n = len(componente)
+        vistas = set()
+        for v in (k, k - self.cols, k + self.cols, k - 1, k + 1):
+            if 0 <= v < n and componente[v] >= 0:
+                vistas.add(self.raiz(componente[v]))
+        return tuple(sorted(vistas))
+
+    # E: ninguno
+    # S: tupla con la componente más grande
+    def mayor(self):
+        raices = [b for b, g in enumerate(self.grupo) if b == g]
+        if not raices:
+            return ()
+        return (max(raices, key=self.tamano),)
+
+    # E: componentes
+    # S: celdas de las componentes
+    def celdas_de(self, componentes):
+        for c in componentes:
+            for b in self.bloques(c):
+                yield from self.celdas[self.inicios[b] : self.inicios[b + 1]]
+
+    # E: rng, componentes
+    # S: índice de celda
+    def elegir(self, rng, componentes):
+        i = rng.randrange(sum(self.tamano(c) for c in componentes))
+        for c in componentes:
+            for b in self.bloques(c):
+                largo = self.inicios[b + 1] - self.inicios[b]
+                if i < largo:
+                    return self.celdas[self.inicios[b] + i]
+                i -= largo
+
+    # E: k, radio
+    # S: conjunto de celdas
+    def cercanas(self, k, radio):
+        cols = self.cols
+        paso = self.paso
+        vistas = {k}
+        frontera = [k]
+        for _ in range(radio - 1):
+            siguiente = []
+            for u in frontera:
+                for v in (u - cols, u + cols, u - 1, u + 1):
+                    if v not in vistas and 0 <= v < len(paso):
+                        if paso[v] & PASO_ENEMIGO:
+                            vistas.add(v)
+                            siguiente.append(v)
+            frontera = siguiente
+        return vistas
+
+
+class GameMap:
+    # E: cols, rows
+    # S: inicializa mapa
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.celdas = bytearray([MURO]) * (cols * rows)
+        self.paso = self.celdas.translate(TABLA_PASO)
+        self.inicio = (1, 1)
+        self.salida = (cols - 2, rows - 2)
+        self.indice_zonas = None
+        self.zonas_nuevas = None
+        self.version = 0
+
+    # E: rng, generador
+    # S: terreno con el generador elegido
+    def generar(self, rng=random, generador="clasico"):
+        self.asignar(
+            GENERADORES[generador](self.cols, self.rows, self.inicio, self.salida, rng)
+        )
+
+    # E: celdas
+    # S: terreno y máscara de paso
+    def asignar(self, celdas):
+        self.celdas = bytearray(celdas)
+        self.paso = self.celdas.translate(TABLA_PASO)
+        self.indice_zonas = None
+        self.zonas_nuevas = None
+        self.version += 1
+
+    # E: ninguno
+    # S: ZonasEnemigo del terreno
+    @property
+    def zonas(self):
+        if self.indice_zonas is None:
+            self.indice_zonas = ZonasEnemigo(self.paso, self.cols)
+        return self.indice_zonas
+
+    # E: cuota
+    # S: sigue el rearmado del índice
+    def avanzar_zonas(self, cuota):
+        if self.zonas_nuevas is not None and self.zonas_nuevas.avanzar(cuota):
+            self.indice_zonas = self.zonas_nuevas
+            self.zonas_nuevas = None
+
+    # E: ninguno
+    # S: largo del camino o -1
+    def distancia_salida(self):
+        cols = self.cols
+        paso = self.paso
+        destino = self.salida[1] * cols + self.salida[0]
+        origen = self.inicio[1] * cols + self.inicio[0]
+        if not paso[origen] & PASO_JUGADOR:
+            return -1
+        visto = bytearray(len(paso))
+        visto[origen] = 1
+        frontera = [origen]
+        d = 0
+        while frontera:
+            if visto[destino]:
+                return d
+            d += 1
+            siguiente = []
+            for k in frontera:
+                for v in (k - cols, k + cols, k - 1, k + 1):
+                    if not visto[v] and paso[v] & PASO_JUGADOR:
+                        visto[v] = 1
+                        siguiente.append(v)
+            frontera = siguiente
+        return -1
+
+    # E: x, y
+    # S: código de terreno en posición
+    def codigo(self, x, y):
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.celdas[y * self.cols + x]
+        return MURO
+
+    # E: x, y
+    # S: casilla en posición
+    def casilla(self, x, y):
+        return TERRENOS[self.codigo(x, y)]
+
+    # E: x, y
+    # S: si jugador puede pasar
+    def puede_pasar_jugador(self, x, y):
+        return (
+            0 <= x < self.cols
+            and 0 <= y < self.rows
+            and self.paso[y * self.cols + x] & PASO_JUGADOR != 0
+        )
+
+    # E: x, y
+    # S: si enemigo puede pasar
+    def puede_pasar_enemigo(self, x, y):
+        return (
+            0 <= x < self.cols
+            and 0 <= y < self.rows
+            and self.paso[y * self.cols + x] & PASO_ENEMIGO != 0
+        )
+
+    # E: x, y, codigo
+    # S: cambia el terreno de una celda
+    def cambiar_casilla(self, x, y, codigo):
+        k = y * self.cols + x
+        self.celdas[k] = codigo
+        cambio = (self.paso[k] ^ TABLA_PASO[codigo]) & PASO_ENEMIGO
+        self.paso[k] = TABLA_PASO[codigo]
+        zonas = self.indice_zonas
+        if cambio and zonas is not None:
+            if self.paso[k] & PASO_ENEMIGO:
+                zonas.abrir(k)
+            else:
+                zonas.cerrar(k)
+            if not zonas.vigente:
+                self.zonas_nuevas = ZonasEnemigo(self.paso, self.cols, True)
+        self.version += 1
+
+    # E: x, y
+    # S: si es salida
+    def es_salida(self, x, y):
+        return (x, y) == self.salida
+
+
+TABLA_RELLENO = bytes([CAMINO] * 141 + [MURO] * 38 + [LIANA] * 38 + [TUNEL] * 39)
+ASCII_A_BIT = bytes.maketrans(b"01", b"\x00\x01")
+PASO_CUEVAS = 10  # separación entre los nodos del esqueleto de las cuevas
+
+
+class GrillaBits:
+    # E: cols, rows
+    # S: máscaras de borde
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.n = cols * rows
+        self.todo = (1 << self.n) - 1
+        self.col0 = int(("0" * (cols - 1) + "1") * rows, 2)
+        self.ultima_col = self.col0 << (cols - 1)
+        self.fila0 = (1 << cols) - 1
+        self.ultima_fila = self.fila0 << (self.n - cols)
+        self.borde = self.col0 | self.ultima_col | self.fila0 | self.ultima_fila
+
+    # E: celdas, codigos
+    # S: bitset
+    def de_celdas(self, celdas, codigos):
+        tabla = bytes(0x31 if c in codigos else 0x30 for c in range(256))
+        return int(celdas.translate(tabla)[::-1], 2)
+
+    # E: capas
+    # S: bytearray de códigos
+    def a_celdas(self, capas):
+        total = int.from_bytes(bytes([MURO]) * self.n, "little")
+        for bits, codigo in capas:
+            bytes_capa = format(bits, f"0{self.n}b")[::-1].encode("ascii")
+            total += (codigo - MURO) * int.from_bytes(
+                bytes_capa.translate(ASCII_A_BIT), "little"
+            )
+        return bytearray(total.to_bytes(self.n, "little"))
+
+    # E: rng, veces
+    # S: bitset al azar
+    def aleatorio(self, rng, veces=1):
+        bits = self.todo
+        for _ in range(veces):
+            bits &= rng.getrandbits(self.n)
+        return bits
+
+    # E: bits, fuera
+    # S: bitset de vecinos
+    def vecinos(self, bits, fuera=False):
+        return (
+            self.desde_oeste(bits, fuera)
+            | self.desde_este(bits, fuera)
+            | self.desde_norte(bits, fuera)
+            | self.desde_sur(bits, fuera)
+        )
+
+    # E: bits, fuera
+    # S: bitset desplazado
+    def desde_oeste(self, bits, fuera=False):
+        bits = (bits << 1) & self.todo & ~self.col0
+        return bits | self.col0 if fuera else bits
+
+    # E: bits, fuera
+    # S: bitset desplazado
+    def desde_este(self, bits, fuera=False):
+        bits = (bits >> 1) & ~self.ultima_col
+        return bits | self.ultima_col if fuera else bits
+
+    # E: bits, fuera
+    # S: bitset desplazado
+    def desde_norte(self, bits, fuera=False):
+        bits = (bits << self.cols) & self.todo
+        return bits | self.fila0 if fuera else bits
+
+    # E: bits, fuera
+    # S: bitset desplazado
+    def desde_sur(self, bits, fuera=False):
+        bits = bits >> self.cols
+        return bits | self.ultima_fila if fuera else bits
+
+    # E: semilla, abiertas, pasos
+    # S: bitset alcanzado
+    def crecer(self, semilla, abiertas, pasos):
+        alcanzadas = semilla
+        for _ in range(pasos):
+            alcanzadas |= self.vecinos(alcanzadas) & abiertas
+        return alcanzadas
+
+    # E: x, y
+    # S: bit de la celda
+    def bit(self, x, y):
+        return 1 << (y * self.cols + x)
+
+
+# E: celdas, cols, rows, inicio, salida, rng
+# S: carva camino monótono
+def carvar_recorrido(celdas, cols, rows, inicio, salida, rng):
+    x, y = inicio
+    sx, sy = salida
+
+    celdas[y * cols + x] = CAMINO
+    while (x, y) != (sx, sy):
+        dx = sx - x
+        dy = sy - y
+        opciones = []
+        if dx > 0:
+            opciones.append((1, 0))
+        if dx < 0:
+            opciones.append((-1, 0))
+        if dy > 0:
+            opciones.append((0, 1))
+        if dy < 0:
+            opciones.append((0, -1))
+        if not opciones:
+            break
+        mx, my = rng.choice(opciones)
+        nx, ny = x + mx, y + my
+        if 0 < nx < cols - 1 and 0 < ny < rows - 1:
+            x, y = nx, ny
+            celdas[y * cols + x] = CAMINO
+
+
+# E: celdas, cols, ax, ay, bx, by, codigo
+# S: carva pasillo recto
+def carvar_pasillo(celdas, cols, ax, ay, bx, by, codigo=CAMINO):
+    if ay == by:
+        x0, x1 = min(ax, bx), max(ax, bx)
+        celdas[ay * cols + x0 : ay * cols + x1 + 1] = bytes([codigo]) * (x1 - x0 + 1)
+    else:
+        y0, y1 = min(ay, by), max(ay, by)
+        celdas[y0 * cols + ax : y1 * cols + ax + 1 : cols] = bytes([codigo]) * (
+            y1 - y0 + 1
+        )
+
+
+# E: celdas, cols, rows, paso, codigo, rng
+# S: carva árbol aleatorio
+def carvar_arbol(celdas, cols, rows, paso, codigo, rng):
+    ancho = (cols - 3) // paso + 1
+    alto = (rows - 3) // paso + 1
+    n = cols * rows
+    der = list(range(ancho))
+    izq = list(range(ancho))
+    marcas = bytearray(n)
+    for j in range(alto):
+        k0 = (1 + paso * j) * cols + 1
+        fin = k0 + paso * (ancho - 1)
+        ultima = j == alto - 1
+        azar = rng.randbytes(2 * ancho)
+
+        este = bytearray(ancho - 1)
+        for x in range(ancho - 1):
+            d = der[x]
+            if d != x + 1 and (ultima or azar[x] & 1):
+                i = izq[x + 1]
+                der[x] = x + 1
+                izq[x + 1] = x
+                der[i] = d
+                izq[d] = i
+                este[x] = 255
+        marcas[k0 : fin + 1 : paso] = b"\xff" * ancho
+        for d in range(1, paso):
+            marcas[k0 + d : fin : paso] = este
+        if ultima:
+            break
+
+        sur = bytearray(b"\xff") * ancho
+        for x in range(ancho):
+            d = der[x]
+            if d != x and azar[ancho + x] & 1:
+                i = izq[x]
+                der[i] = d
+                izq[d] = i
+                der[x] = izq[x] = x
+                sur[x] = 0
+        for d in range(1, paso):
+            marcas[k0 + d * cols : fin + d * cols + 1 : paso] = sur
+
+    mascara = int.from_bytes(marcas, "little")
+    previas = int.from_bytes(celdas, "little")
+    carvadas = int.from_bytes(bytes([codigo]) * n, "little")
+    celdas[:] = ((previas & ~mascara) | (carvadas & mascara)).to_bytes(n, "little")
+
+
+# E: grilla, camino, rng, liana
+# S: bytearray con lianas y túneles
+def decorar(grilla, camino, rng, liana=0):
+    candidatos = grilla.vecinos(camino) & ~camino & ~liana & ~grilla.borde
+    azar = grilla.aleatorio(rng, 2)
+    elegir = rng.getrandbits(grilla.n)
+    liana |= candidatos & azar & elegir
+    tunel = candidatos & azar & ~elegir
+    return grilla.a_celdas([(camino, CAMINO), (liana, LIANA), (tunel, TUNEL)])
+
+
+# E: cols, rows, inicio, salida, rng
+# S: bytearray de terreno
+def generar_clasico(cols, rows, inicio, salida, rng):
+    n = cols * rows
+    celdas = bytearray(rng.randbytes(n).translate(TABLA_RELLENO))
+    celdas[:cols] = celdas[n - cols :] = bytes([MURO]) * cols
+    celdas[::cols] = celdas[cols - 1 :: cols] = bytes([MURO]) * rows
+
+    carvar_recorrido(celdas, cols, rows, inicio, salida, rng)
+    return celdas
+
+
+# E: cols, rows, inicio, salida, rng
+# S: bytearray de terreno
+def generar_laberinto(cols, rows, inicio, salida, rng):
+    celdas = bytearray([MURO]) * (cols * rows)
+    carvar_arbol(celdas, cols, rows, 2, CAMINO, rng)
+
+    for x, y in (inicio, salida):
+        celdas[y * cols + x] = CAMINO
+        if x % 2 == 0:
+            x -= 1
+            celdas[y * cols + x] = CAMINO
+        if y % 2 == 0:
+            celdas[(y - 1) * cols + x] = CAMINO
+
+    grilla = GrillaBits(cols, rows)
+    return decorar(grilla, grilla.de_celdas(celdas, (CAMINO,)), rng)
+
+
+# E: grilla, muros
+# S: bitset suavizado
+def mayoria_muros(grilla, muros):
+    oeste = grilla.desde_oeste(muros, True)
+    este = grilla.desde_este(muros, True)
+    vecinos = [
+        muros,
+        oeste,
+        este,
+        grilla.desde_norte(muros, True),
+        grilla.desde_sur(muros, True),
+        grilla.desde_norte(oeste, True),
+        grilla.desde_norte(este, True),
+        grilla.desde_sur(oeste, True),
+        grilla.desde_sur(este, True),
+    ]
+    c = [0, 0, 0, 0]
+    for bits in vecinos:
+        for i in range(4):
+            c[i], bits = c[i] ^ bits, c[i] & bits
+            if not bits:
+                break
+    return c[3] | (c[2] & (c[1] | c[0]))
+
+
+# E: cols, rows, inicio, salida, rng, pasos
+# S: bytearray de terreno
+def generar_cuevas(cols, rows, inicio, salida, rng, pasos=4):
+    grilla = GrillaBits(cols, rows)
+    n = grilla.n
+    muros = rng.getrandbits(n) & (
+        rng.getrandbits(n) | rng.getrandbits(n) | rng.getrandbits(n)
+    )
+    for _ in range(pasos):
+        muros = mayoria_muros(grilla, muros | grilla.borde)
+    abiertas = grilla.todo & ~(muros | grilla.borde)
+
+    celdas = bytearray([MURO]) * n
+    carvar_recorrido(celdas, cols, rows, inicio, salida, rng)
+    recorrido = grilla.de_celdas(celdas, (CAMINO,))
+    carvar_arbol(celdas, cols, rows, PASO_CUEVAS, CAMINO, rng)
+    esqueleto = grilla.de_celdas(celdas, (CAMINO,))
+
+    alcanzadas = grilla.crecer(esqueleto, abiertas, 2 * PASO_CUEVAS)
+    camino = alcanzadas & (abiertas | recorrido)
+    return decorar(grilla, camino, rng, liana=alcanzadas & ~camino)
+
+
+# E: cols, rows, inicio, salida, rng
+# S: bytearray de terreno
+def generar_salas(cols, rows, inicio, salida, rng):
+    celdas = bytearray([MURO]) * (cols * rows)
+    salas = []
+    for _ in range(max(2, cols * rows // 150)):
+        ancho = min(rng.randint(3, 8), cols - 2)
+        alto = min(rng.randint(3, 6), rows - 2)
+        x0 = rng.randint(1, cols - 1 - ancho)
+        y0 = rng.randint(1, rows - 1 - alto)
+        for y in range(y0, y0 + alto):
+            celdas[y * cols + x0 : y * cols + x0 + ancho] = bytes([CAMINO]) * ancho
+        salas.append((x0 + ancho // 2, y0 + alto // 2))
+
+    salas.sort(key=lambda c: (c[1] // 10, c[0] if c[1] // 10 % 2 == 0 else -c[0]))
+    puntos = [inicio] + salas + [salida]
+    for (ax, ay), (bx, by) in zip(puntos, puntos[1:]):
+        if rng.random() < 0.5:
+            carvar_pasillo(celdas, cols, ax, ay, bx, ay)
+            carvar_pasillo(celdas, cols, bx, ay, bx, by)
+        else:
+            carvar_pasillo(celdas, cols, ax, ay, ax, by)
+            carvar_pasillo(celdas, cols, ax, by, bx, by)
+
+    grilla = GrillaBits(cols, rows)
+    return decorar(grilla, grilla.de_celdas(celdas, (CAMINO,)), rng)
+
+
+GENERADORES = {
+    "clasico": generar_clasico,
+    "laberinto": generar_laberinto,
+    "cuevas": generar_cuevas,
+    "salas": generar_salas,
+}
+
+
+# E: cols, rows, generador
+# S: largo mínimo del camino
+def largo_minimo_mapa(cols, rows, generador):
+    return int(LARGO_MINIMO_MAPA.get(generador, 1.0) * (cols + rows - 6))
+
+
+# E: cols, rows, generador, semillas, largo_minimo
+# S: (game_map, semilla, distancia)
+def generar_validado(cols, rows, generador, semillas, largo_minimo=0):
+    mejor = None
+    for _ in range(INTENTOS_MAPA):
+        semilla = next(semillas)
+        game_map = GameMap(cols, rows)
+        game_map.generar(random.Random(semilla), generador)
+        distancia = game_map.distancia_salida()
+        if distancia >= max(largo_minimo, 0):
+            return game_map, semilla, distancia
+        if distancia >= 0 and (mejor is None or distancia > mejor[2]):
+            mejor = (game_map, semilla, distancia)
+    if mejor is None:
+        raise RuntimeError(f"El generador {generador} no produjo mapas jugables")
+    return mejor
+
+
+class PoolMapas:
+    # E: cols, rows, generador, tamano, semilla, largo_minimo, archivo
+    # S: reserva con hilo de fondo
+    def __init__(
+        self,
+        cols,
+        rows,
+        generador="clasico",
+        tamano=TAMANO_RESERVA,
+        semilla=None,
+        largo_minimo=0,
+        archivo=None,
+    ):
+        self.cols = cols
+        self.rows = rows
+        self.generador = generador
+        self.largo_minimo = largo_minimo
+        self.archivo = archivo
+        if semilla is None:
+            semilla = random.randrange(2**32)
+        self.semillas = itertools.count(semilla)
+        self.listos = queue.Queue(maxsize=tamano)
+        self.detenido = threading.Event()
+
+        if archivo:
+            self.cargar()
+        self.hilo = threading.Thread(target=self.llenar)
+        self.hilo.start()
+
+    # E: ninguno
+    # S: si el hilo debe seguir
+    def activo(self):
+        return not self.detenido.is_set() and threading.main_thread().is_alive()
+
+    # E: ninguno
+    # S: repone la reserva
+    def llenar(self):
+        while self.activo():
+            listo = generar_validado(
+                self.cols,
+                self.rows,
+                self.generador,
+                self.semillas,
+                self.largo_minimo,
+            )
+            listo[0].zonas
+            while self.activo():
+                try:
+                    self.listos.put(listo, timeout=0.2)
+                    break
+                except queue.Full:
+                    pass
+        if self.detenido.is_set() and self.archivo:
+            self.guardar()
+
+    # E: ninguno
+    # S: (game_map, semilla)
+    def tomar(self):
+        try:
+            game_map, semilla, _ = self.listos.get_nowait()
+        except queue.Empty:
+            game_map, semilla, _ = generar_validado(
+                self.cols,
+                self.rows,
+                self.generador,
+                self.semillas,
+                self.largo_minimo,
+            )
+        return game_map, semilla
+
+    # E: ninguno
+    # S: hilo avisado
+    def detener(self):
+        self.detenido.set()
+
+    # E: ninguno
+    # S: archivo con los mapas
+    def guardar(self):
+        lineas = []
+        while True:
+            try:
+                game_map, semilla, distancia = self.listos.get_nowait()
+            except queue.Empty:
+                break
+            datos = zlib.compress(bytes(game_map.celdas))
+            registro = {
+                "version": VERSION_REPLAY,
+                "cols": game_map.cols,
+                "rows": game_map.rows,
+                "generador": self.generador,
+                "semilla": semilla,
+                "distancia": distancia,
+                "celdas": base64.b64encode(datos).decode("ascii"),
+            }
+            lineas.append(json.dumps(registro) + "\n")
+        try:
+            with open(self.archivo, "w", encoding="utf-8") as f:
+                f.writelines(lineas)
+        except OSError:
+            pass
+
+    # E: ninguno
+    # S: reserva con mapas del archivo
+    def cargar(self):
+        if not os.path.exists(self.archivo):
+            return
+        try:
+            with open(self.archivo, "r", encoding="utf-8") as f:
+                for linea in f:
+                    registro = json.loads(linea)
+                    if (
+                        registro["cols"],
+                        registro["rows"],
+                        registro["generador"],
+                    ) != (self.cols, self.rows, self.generador):
+                        continue
+                    if registro.get("version") != VERSION_REPLAY:
+                        continue
+                    if registro["distancia"] < self.largo_minimo:
+                        continue
+                    celdas = zlib.decompress(base64.b64decode(registro["celdas"]))
+                    if len(celdas) != self.cols * self.rows:
+                        continue
+                    game_map = GameMap(self.cols, self.rows)
+                    game_map.asignar(celdas)
+                    self.listos.put_nowait(
+                        (game_map, registro["semilla"], registro["distancia"])
+                    )
+        except (OSError, ValueError, KeyError, zlib.error, queue.Full):
+            pass
+
+
+class CampoDistancias:
+    # E: game_map, limite
+    # S: ninguno
+    def __init__(self, game_map, limite=None):
+        self.game_map = game_map
+        n = game_map.cols * game_map.rows
+        self.limite = limite
+        self.objetivo = None
+        self.dist = array("i", [0]) * n
+        self.marca = array("I", [0]) * n
+        self.cerrada = array("I", [0]) * n
+        self.epoca = 0
+        self.cubetas = []
+        self.actual = 0
+        self.alcanzables = None
+        self.clave_alcanzables = None
+
+    # E: x, y
+    # S: reinicia la búsqueda desde el objetivo
+    def mover_objetivo(self, x, y):
+        if (x, y) == self.objetivo:
+            return
+        self.objetivo = (x, y)
+        self.epoca += 1
+        if self.epoca > 0xFFFFFFFF:
+            self.marca = array("I", [0]) * len(self.marca)
+            self.cerrada = array("I", [0]) * len(self.cerrada)
+            self.epoca = 1
+        k = y * self.game_map.cols + x
+        self.marca[k] = self.epoca
+        self.dist[k] = 0
+        self.cubetas = [[k]]
+        self.actual = 0
+        self.clave_alcanzables = None
+
+    # E: x, y
+    # S: pasos hasta el objetivo o -1
+    def distancia(self, x, y):
+        cols = self.game_map.cols
+        if not (0 <= x < cols and 0 <= y < self.game_map.rows):
+            return -1
+        return self.distancia_celda(y * cols + x)
+
+    # E: k
+    # S: distancia o -1
+    def distancia_celda(self, k):
+        epoca = self.epoca
+        if self.cerrada[k] == epoca and self.dist[k] <= self.actual:
+            return self.dist[k]
+        if self.marca[k] != epoca:
+            if not self.game_map.paso[k] & PASO_ENEMIGO:
+                return -1
+            zonas = self.game_map.zonas
+            alcanzables = self.revisar_alcanzables(zonas)
+            if alcanzables is not None:
+                if zonas.raiz(zonas.componente[k]) not in alcanzables:
+                    return -1
+        self.expandir_hasta(k)
+        return self.dist[k] if self.marca[k] == epoca else -1
+
+    # E: zonas
+    # S: componentes alcanzables o None
+    def revisar_alcanzables(self, zonas):
+        if self.clave_alcanzables != (zonas, zonas.cambios):
+            self.clave_alcanzables = (zonas, zonas.cambios)
+            self.alcanzables = None
+            if zonas.vigente:
+                ox, oy = self.objetivo
+                k = oy * self.game_map.cols + ox
+                self.alcanzables = frozenset(zonas.alrededor(k))
+        return self.alcanzables
+
+    # E: objetivo
+    # S: expande hasta fijar la distancia
+    def expandir_hasta(self, objetivo):
+        cols = self.game_map.cols
+        n = len(self.dist)
+        paso = self.game_map.paso
+        marca = self.marca
+        dist = self.dist
+        cerrada = self.cerrada
+        epoca = self.epoca
+        cubetas = self.cubetas
+        ultima = len(dist) if self.limite is None else self.limite
+        d = self.actual
+        while d < len(cubetas):
+            cubeta = cubetas[d]
+            if not cubeta:
+                d += 1
+                continue
+            if marca[objetivo] == epoca and dist[objetivo] <= d:
+                break
+            k = cubeta.pop()
+            if marca[k] != epoca or dist[k] != d or cerrada[k] == epoca:
+                continue
+            cerrada[k] = epoca
+            if d >= ultima:
+                continue
+            x = k % cols
+            for v in (
+                k - cols,
+                k + cols,
+                k - 1 if x > 0 else -1,
+                k + 1 if x < cols - 1 else -1,
+            ):
+                if (
+                    0 <= v < n
+                    and paso[v] & PASO_ENEMIGO
+                    and (marca[v] != epoca or dist[v] > d + 1)
+                ):
+                    marca[v] = epoca
+                    dist[v] = d + 1
+                    cerrada[v] = 0
+                    if len(cubetas) == d + 1:
+                        cubetas.append([])
+                    cubetas[d + 1].append(v)
+        self.actual = d
+
+    # E: k, d
+    # S: mejora la distancia de una celda
+    def relajar(self, k, d):
+        if self.marca[k] == self.epoca and self.dist[k] <= d:
+            return
+        if self.limite is not None and d > self.limite:
+            return
+        self.marca[k] = self.epoca
+        self.dist[k] = d
+        self.cerrada[k] = 0
+        cubetas = self.cubetas
+        while len(cubetas) <= d:
+            cubetas.append([])
+        cubetas[d].append(k)
+        if d < self.actual:
+            self.actual = d
+
+    # E: k
+    # S: índices vecinos dentro del mapa
+    def vecinos(self, k):
+        cols = self.game_map.cols
+        x = k % cols
+        v = []
+        if k >= cols:
+            v.append(k - cols)
+        if k + cols < len(self.dist):
+            v.append(k + cols)
+        if x > 0:
+            v.append(k - 1)
+        if x < cols - 1:
+            v.append(k + 1)
+        return v
+
+    # E: x, y
+    # S: repara distancias tras un cambio
+    def cambiar_celda(self, x, y):
+        if self.objetivo is None:
+            return
+        cols = self.game_map.cols
+        if (x, y) == self.objetivo:
+            return
+        k = y * cols + x
+        marca = self.marca
+        dist = self.dist
+        epoca = self.epoca
+
+        if self.game_map.paso[k] & PASO_ENEMIGO:
+            for u in self.vecinos(k):
+                if marca[u] == epoca:
+                    self.relajar(k, dist[u] + 1)
+            return
+
+        if marca[k] != epoca:
+            return
+
+        afectadas = {k}
+        cola = [k]
+        for v in cola:
+            for w in self.vecinos(v):
+                if w in afectadas or marca[w] != epoca or dist[w] != dist[v] + 1:
+                    continue
+                apoyo = False
+                for u in self.vecinos(w):
+                    if (
+                        u not in afectadas
+                        and marca[u] == epoca
+                        and dist[u] == dist[w] - 1
+                    ):
+                        apoyo = True
+                        break
+                if not apoyo:
+                    afectadas.add(w)
+                    cola.append(w)
+
+        for v in afectadas:
+            marca[v] = 0
+            self.cerrada[v] = 0
+        for v in cola[1:]:
+            for u in self.vecinos(v):
+                if marca[u] == epoca:
+                    self.relajar(v, dist[u] + 1)
+
+
+class CampoLejano:
+    # E: game_map
+    # S: ninguno
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.dist = None
+        self.ancla = None
+        self.ancla_nueva = None
+        self.nueva = None
+        self.libre = None
+        self.cola = None
+        self.hecho = 0
+        self.cuota = 0
+
+    # E: x, y
+    # S: expande la cuota de un tick
+    def avanzar(self, x, y):
+        if self.nueva is None:
+            if self.ancla is not None:
+                ax, ay = self.ancla
+                if abs(x - ax) + abs(y - ay) < ALEJAMIENTO_ANCLA:
+                    return
+            self.empezar(x, y)
+        self.expandir(self.cuota)
+
+    # E: x, y
+    # S: inicia un BFS desde el ancla
+    def empezar(self, x, y):
+        game_map = self.game_map
+        k = y * game_map.cols + x
+        self.ancla_nueva = (x, y)
+        self.nueva = array("i", [-1]) * (game_map.cols * game_map.rows)
+        self.nueva[k] = 0
+        self.libre = bytearray(game_map.paso.translate(TABLA_TRAMOS))
+        self.libre[k] = 0
+        self.cola = [k]
+        self.hecho = 0
+        zonas = game_map.zonas
+        area = 1 + sum(zonas.tamano(c) for c in zonas.alrededor(k))
+        self.cuota = min(CUOTA_CAMPO_LEJANO, -(-area // PERIODO_CAMPO_LEJANO))
+
+    # E: cuantas
+    # S: expande celdas y cambia de campo al terminar
+    def expandir(self, cuantas):
+        cols = self.game_map.cols
+        dist = self.nueva
+        libre = self.libre
+        cola = self.cola
+        agregar = cola.append
+        hecho = self.hecho
+        fin = hecho + cuantas
+        while hecho < fin:
+            tramo = cola[hecho:fin]
+            if not tramo:
+                break
+            hecho += len(tramo)
+            for k in tramo:
+                d = dist[k] + 1
+                v = k - cols
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+                v = k + cols
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+                v = k - 1
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+                v = k + 1
+                if libre[v]:
+                    libre[v] = 0
+                    dist[v] = d
+                    agregar(v)
+        self.hecho = hecho
+        if hecho == len(cola):
+            self.dist = dist
+            self.ancla = self.ancla_nueva
+            self.ancla_nueva = self.nueva = self.libre = self.cola = None
+            self.hecho = 0
+
+    # E: ninguno
+    # S: descarta los campos
+    def cambiar_terreno(self):
+        self.dist = self.ancla = None
+        self.ancla_nueva = self.nueva = self.libre = self.cola = None
+        self.hecho = 0
+
+    # E: ancla, ancla_nueva, hecho
+    # S: rehace el estado guardado
+    def reconstruir(self, ancla, ancla_nueva, hecho):
+        self.cambiar_terreno()
+        if ancla is not None:
+            self.empezar(*ancla)
+            self.expandir(len(self.nueva))
+        if ancla_nueva is not None:
+            self.empezar(*ancla_nueva)
+            self.expandir(hecho)
+
+
+class Jugador:
+    # E: x, y, tick
+    # S: inicializa jugador
+    def __init__(self, x, y, tick=0):
+        self.x = x
+        self.y = y
+        self.energia_max = 100
+        self.energia = self.energia_max
+        self.ultima_recuperacion = tick
+
+    # E: dx, dy, game_map, correr
+    # S: mueve jugador
+    def mover(self, dx, dy, game_map, correr=False):
+        pasos = 2 if correr and self.energia >= 10 else 1
+        for _ in range(pasos):
+            nx = self.x + dx
+            ny = self.y + dy
+            if game_map.puede_pasar_jugador(nx, ny):
+                self.x = nx
+                self.y = ny
+            else:
+                break
+        if correr and pasos == 2:
+            self.energia = max(0, self.energia - 10)
+
+    # E: tick
+    # S: energía +1
+    def recuperar_energia(self, tick):
+        self.energia = min(self.energia_max, self.energia + 1)
+        self.ultima_recuperacion = tick
+
+
+class TablaEnemigos:
+    # E: cols
+    # S: ninguno
+    def __init__(self, cols):
+        self.cols = cols
+        self.x = array("i")
+        self.y = array("i")
+        self.vivo = array("b")
+        self.tick_muerte = array("i")
+        self.velocidad = array("d")
+        self.intervalo = array("i")
+        self.ultimo_movimiento = array("i")
+        self.filas = []
+        self.vecinos = [(dx, dy, dy * cols + dx) for dx, dy in DIRECCIONES]
+
+    # E: ninguno
+    # S: cantidad de enemigos
+    def __len__(self):
+        return len(self.filas)
+
+    # E: x, y, velocidad, tick
+    # S: Enemigo de la nueva fila
+    def agregar(self, x, y, velocidad=1.0, tick=0):
+        self.x.append(x)
+        self.y.append(y)
+        self.vivo.append(1)
+        self.tick_muerte.append(-1)
+        self.velocidad.append(velocidad)
+        self.intervalo.append(
+            max(INTERVALO_MINIMO_ENEMIGO, round(INTERVALO_ENEMIGO / velocidad))
+        )
+        self.ultimo_movimiento.append(tick)
+        enemigo = Enemigo(self, len(self.filas))
+        self.filas.append(enemigo)
+        return enemigo
+
+    # E: columnas
+    # S: ninguno
+    def asignar_columnas(self, columnas):
+        for nombre, valores in columnas.items():
+            setattr(self, nombre, valores)
+        self.filas = [Enemigo(self, i) for i in range(len(self.x))]
+
+    # E: i, x, y
+    # S: ninguno
+    def revivir(self, i, x, y):
+        self.x[i] = x
+        self.y[i] = y
+        self.vivo[i] = 1
+        self.tick_muerte[i] = -1
+
+    # E: i, jugador, game_map, modo, tick, campo
+    # S: True si cambió de celda
+    def mover(self, i, jugador, game_map, modo, tick, campo, lejano=None):
+        self.ultimo_movimiento[i] = tick
+        x = self.x[i]
+        y = self.y[i]
+        k = y * self.cols + x
+        paso = game_map.paso
+        distancia = campo.distancia_celda
+        lejos = (
+            campo.limite is not None
+            and abs(x - jugador.x) + abs(y - jugador.y) > campo.limite
+        )
+        conectado = not lejos and distancia(k) >= 0
+        atrasada = None
+        if not conectado and lejano is not None and lejano.dist is not None:
+            if lejano.dist[k] >= 0:
+                atrasada = lejano.dist
+        huir = modo != MODO_ESCAPA
+        mejor = None
+        mejor_dist = None
+        for dx, dy, desplazamiento in self.vecinos:
+            v = k + desplazamiento
+            if not paso[v] & PASO_ENEMIGO:
+                continue
+            if conectado:
+                d = distancia(v)
+                if d < 0:
+                    continue
+            elif atrasada is not None:
+                d = atrasada[v]
+            else:
+                d = abs(x + dx - jugador.x) + abs(y + dy - jugador.y)
+            if mejor_dist is None or (d > mejor_dist if huir else d < mejor_dist):
+                mejor_dist = d
+                mejor = (dx, dy)
+        if mejor is None:
+            return False
+        self.x[i] = x + mejor[0]
+        self.y[i] = y + mejor[1]
+        return True
+
+
+# E: nombre, leer, escribir
+# S: property
+def columna_enemigo(nombre, leer=None, escribir=None):
+    def get(self):
+        valor = getattr(self.tabla, nombre)[self.i]
+        return leer(valor) if leer else valor
+
+    def set(self, valor):
+        getattr(self.tabla, nombre)[self.i] = escribir(valor) if escribir else valor
+
+    return property(get, set)
+
+
+class Enemigo:
+    __slots__ = ("tabla", "i")
+
+    x = columna_enemigo("x")
+    y = columna_enemigo("y")
+    vivo = columna_enemigo("vivo", bool, int)
+    tick_muerte = columna_enemigo(
+        "tick_muerte",
+        lambda t: None if t < 0 else t,
+        lambda t: -1 if t is None else t,
+    )
+    velocidad = columna_enemigo("velocidad")
+    intervalo = columna_enemigo("intervalo")
+    ultimo_movimiento = columna_enemigo("ultimo_movimiento")
+
+    # E: tabla, i
+    # S: vista de la fila i
+    def __init__(self, tabla, i):
+        self.tabla = tabla
+        self.i = i
+
+    # E: tick
+    # S: indica si puede moverse
+    def listo_para_moverse(self, tick):
+        return tick - self.ultimo_movimiento >= self.intervalo
+
+    # E: jugador, game_map, modo, tick, campo
+    # S: mueve enemigo
+    def mover(self, jugador, game_map, modo, tick, campo, lejano=None):
+        if not self.vivo:
+            return
+        if not self.listo_para_moverse(tick):
+            return
+        self.tabla.mover(self.i, jugador, game_map, modo, tick, campo, lejano)
+
+
+class Trampa:
+    # E: x, y, tick
+    # S: inicializa trampa
+    def __init__(self, x, y, tick=0):
+        self.x = x
+        self.y = y
+        self.colocada_en = tick
+
+
+class RelojMonotono:
+    # E: ninguno
+    # S: reloj en cero
+    def __init__(self):
+        self.origen = time.monotonic()
+
+    # E: ninguno
+    # S: segundos transcurridos
+    def ahora(self):
+        return time.monotonic() - self.origen
+
+
+class RelojVirtual:
+    # E: segundos
+    # S: reloj detenido
+    def __init__(self, segundos=0.0):
+        self.segundos = segundos
+
+    # E: ninguno
+    # S: segundos del reloj
+    def ahora(self):
+        return self.segundos
+
+    # E: segundos
+    # S: reloj adelantado
+    def avanzar(self, segundos):
+        self.segundos += segundos
+
+
+class Planificador:
+    # E: reloj, presupuesto, max_ticks
+    # S: planificador sin iniciar
+    def __init__(
+        self, reloj, presupuesto=PRESUPUESTO_LOOP, max_ticks=MAX_TICKS_POR_LLAMADA
+    ):
+        self.reloj = reloj
+        self.presupuesto = presupuesto
+        self.max_ticks = max_ticks
+        self.velocidad = 1.0
+        self.origen = 0.0
+        self.inicio_llamada = 0.0
+        self.intervalo_dibujo = 1 / TICKS_POR_SEGUNDO
+        self.ultimo_dibujo = None
+        self.ticks_descartados = 0
+        self.frames_omitidos = 0
+        self.llamadas_excedidas = 0
+
+    # E: tick, velocidad
+    # S: origen y contadores reiniciados
+    def iniciar(self, tick=0, velocidad=1.0):
+        self.velocidad = velocidad
+        self.origen = self.reloj.ahora() - tick / (TICKS_POR_SEGUNDO * velocidad)
+        self.intervalo_dibujo = 1 / TICKS_POR_SEGUNDO
+        self.ultimo_dibujo = None
+        self.ticks_descartados = 0
+        self.frames_omitidos = 0
+        self.llamadas_excedidas = 0
+
+    # E: ninguno
+    # S: tick que corresponde al reloj
+    def tick_objetivo(self):
+        transcurrido = (self.reloj.ahora() - self.origen) * self.velocidad
+        return int(transcurrido * TICKS_POR_SEGUNDO)
+
+    # E: ninguno
+    # S: inicio de la llamada anotado
+    def empezar_llamada(self):
+        self.inicio_llamada = self.reloj.ahora()
+
+    # E: ninguno
+    # S: True si se pasó el presupuesto
+    def excedido(self):
+        return self.reloj.ahora() - self.inicio_llamada > self.presupuesto
+
+    # E: tick
+    # S: ticks a correr ahora
+    def ticks_pendientes(self, tick):
+        pendientes = self.tick_objetivo() - tick
+        tope = max(self.max_ticks, int(self.max_ticks * self.velocidad))
+        if pendientes > tope:
+            descartados = pendientes - tope
+            self.origen += descartados / (TICKS_POR_SEGUNDO * self.velocidad)
+            self.ticks_descartados += descartados
+            pendientes = tope
+        return max(0, pendientes)
+
+    # E: ninguno
+    # S: True si se dibuja este cuadro
+    def toca_dibujar(self):
+        if self.ultimo_dibujo is None:
+            return True
+        espera = self.reloj.ahora() - self.ultimo_dibujo
+        if espera >= 1 / FPS_MINIMO:
+            return True
+        if self.excedido() or espera < self.intervalo_dibujo - 0.5 / TICKS_POR_SEGUNDO:
+            self.frames_omitidos += 1
+            return False
+        return True
+
+    # E: inicio
+    # S: intervalo de dibujo ajustado
+    def dibujado(self, inicio):
+        ahora = self.reloj.ahora()
+        costo = ahora - inicio
+        self.ultimo_dibujo = ahora
+        if costo > self.presupuesto / 2:
+            self.intervalo_dibujo = min(self.intervalo_dibujo * 2, 1 / FPS_MINIMO)
+        elif costo < self.presupuesto / 4:
+            self.intervalo_dibujo = max(
+                self.intervalo_dibujo * 0.75, 1 / TICKS_POR_SEGUNDO
+            )
+
+    # E: tick
+    # S: milisegundos hasta la próxima llamada
+    def terminar_llamada(self, tick):
+        if self.excedido():
+            self.llamadas_excedidas += 1
+        siguiente = self.origen + (tick + 1) / (TICKS_POR_SEGUNDO * self.velocidad)
+        return max(1, int((siguiente - self.reloj.ahora()) * 1000) + 1)
+
+    # E: ninguno
+    # S: línea de texto
+    def resumen(self):
+        return (
+            f"ticks descartados {self.ticks_descartados} | "
+            f"cuadros omitidos {self.frames_omitidos} | "
+            f"llamadas excedidas {self.llamadas_excedidas} | "
+            f"dibujo cada {self.intervalo_dibujo * 1000:.0f} ms"
+        )
+
+
+class IndiceOcupacion:
+    # E: cols
+    # S: inicializa índice por celda
+    def __init__(self, cols):
+        self.cols = cols
+        self.celdas = {}
+
+    # E: entidad, x, y
+    # S: ninguno
+    def agregar(self, entidad, x=None, y=None):
+        if x is None:
+            x, y = entidad.x, entidad.y
+        k = y * self.cols + x
+        self.celdas.setdefault(k, []).append(entidad)
+
+    # E: entidad, x, y
+    # S: borra entidad de su celda
+    def quitar(self, entidad, x=None, y=None):
+        if x is None:
+            x, y = entidad.x, entidad.y
+        k = y * self.cols + x
+        lista = self.celdas[k]
+        lista.remove(entidad)
+        if not lista:
+            del self.celdas[k]
+
+    # E: entidad, x0, y0, x, y
+    # S: ninguno
+    def mover(self, entidad, x0, y0, x=None, y=None):
+        self.quitar(entidad, x0, y0)
+        self.agregar(entidad, x, y)
+
+    # E: x, y
+    # S: entidades en la celda
+    def en(self, x, y):
+        return self.celdas.get(y * self.cols + x, ())
+
+
+class Histograma:
+    # E: ninguno
+    # S: ninguno
+    def __init__(self):
+        self.cubetas = [0] * 64
+        self.cantidad = 0
+        self.total = 0
+        self.maximo = 0
+
+    # E: ns
+    # S: ninguno
+    def registrar(self, ns):
+        self.cubetas[ns.bit_length()] += 1
+        self.cantidad += 1
+        self.total += ns
+        if ns > self.maximo:
+            self.maximo = ns
+
+    # E: ninguno
+    # S: media en ns
+    def media(self):
+        return self.total / self.cantidad if self.cantidad else 0.0
+
+    # E: p
+    # S: cota superior en ns
+    def percentil(self, p):
+        limite = p / 100 * self.cantidad
+        acumulado = 0
+        for i, n in enumerate(self.cubetas):
+            acumulado += n
+            if n and acumulado >= limite:
+                return min(2**i - 1, self.maximo)
+        return 0
+
+    # E: ninguno
+    # S: diccionario para JSON
+    def a_dict(self):
+        return {
+            "cantidad": self.cantidad,
+            "total_ns": self.total,
+            "maximo_ns": self.maximo,
+            "cubetas": {2**i - 1: n for i, n in enumerate(self.cubetas) if n},
+        }
+
+
+# E: ns
+# S: texto en us o ms
+def formatear_ns(ns):
+    if ns >= 1_000_000:
+        return f"{ns / 1_000_000:.1f}ms"
+    return f"{ns / 1000:.0f}us"
+
+
+class Instrumentacion:
+    # E: ninguno
+    # S: ninguno
+    def __init__(self):
+        self.fases = {}
+
+    # E: fase, ns
+    # S: ninguno
+    def registrar(self, fase, ns):
+        histograma = self.fases.get(fase)
+        if histograma is None:
+            histograma = self.fases[fase] = Histograma()
+        histograma.registrar(ns)
+
+    # E: ninguno
+    # S: ninguno
+    def reiniciar(self):
+        self.fases = {}
+
+    # E: ninguno
+    # S: lista de líneas
+    def resumen(self):
+        lineas = [f"{'fase':<9}{'n':>7}{'media':>8}{'p50':>8}{'p99':>8}{'max':>8}"]
+        for fase, h in self.fases.items():
+            lineas.append(
+                f"{fase:<9}{h.cantidad:>7}{formatear_ns(h.media()):>8}"
+                f"{formatear_ns(h.percentil(50)):>8}"
+                f"{formatear_ns(h.percentil(99)):>8}{formatear_ns(h.maximo):>8}"
+            )
+        return lineas
+
+    # E: ruta
+    # S: archivo JSON
+    def exportar(self, ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(
+                {fase: h.a_dict() for fase, h in self.fases.items()}, f, indent=2
+            )
+
+
+EVENTO_ENERGIA = 0
+EVENTO_COOLDOWN = 1
+EVENTO_TRAMPA = 2  # clave: tick de colocación; dato: la trampa
+EVENTO_RESPAWN = 3  # clave: índice del enemigo
+
+
+class Temporizadores:
+    # E: ninguno
+    # S: heap vacío
+    def __init__(self):
+        self.heap = []
+
+    # E: ninguno
+    # S: cantidad de eventos
+    def __len__(self):
+        return len(self.heap)
+
+    # E: tick, tipo, clave, dato
+    # S: evento en el heap
+    def programar(self, tick, tipo, clave=0, dato=None):
+        heapq.heappush(self.heap, (tick, tipo, clave, dato))
+
+    # E: tick
+    # S: lista de eventos vencidos
+    def vencidos(self, tick):
+        heap = self.heap
+        if not heap or heap[0][0] > tick:
+            return ()
+        lista = []
+        while heap and heap[0][0] <= tick:
+            lista.append(heapq.heappop(heap))
+        return lista
+
+
+ENTRADA_MOVER = "mover"  # ("mover", dx, dy, correr)
+ENTRADA_TRAMPA = "trampa"  # ("trampa",)
+
+MAGIA_PARTIDA = b"PRTD"
+VERSION_PARTIDA = 2
+ENCABEZADO_PARTIDA = struct.Struct("<4sB6IIiIIiBbd5i5iIII")
+COLUMNAS_ENEMIGO = (
+    ("x", "i"),
+    ("y", "i"),
+    ("vivo", "b"),
+    ("tick_muerte", "i"),
+    ("velocidad", "d"),
+    ("intervalo", "i"),
+    ("ultimo_movimiento", "i"),
+)
+COLUMNAS_TRAMPA = (("x", "i"), ("y", "i"), ("colocada_en", "i"))
+
+
+# E: tipo, valores
+# S: bytes little-endian
+def empaquetar(tipo, valores):
+    datos = array(tipo, valores)
+    if sys.byteorder == "big":
+        datos.byteswap()
+    return datos.tobytes()
+
+
+# E: vista, pos, tipo, n
+# S: array y posición siguiente
+def desempaquetar(vista, pos, tipo, n):
+    datos = array(tipo)
+    fin = pos + n * datos.itemsize
+    if fin > len(vista):
+        raise ValueError("Instantánea incompleta")
+    datos.frombytes(vista[pos:fin])
+    if sys.byteorder == "big":
+        datos.byteswap()
+    return datos, fin
+
+
+# E: modo, dificultad, generador
+# S: ValueError si alguno es desconocido
+def revisar_textos(modo, dificultad, generador):
+    if (
+        modo not in (MODO_ESCAPA, MODO_CAZADOR)
+        or dificultad not in DIFICULTADES
+        or generador not in GENERADORES
+    ):
+        raise ValueError(f"Partida desconocida: {modo}, {dificultad}, {generador}")
+
+
+# E: cols, rows, xs, ys
+# S: ValueError si alguna posición cae fuera del mapa
+def revisar_posiciones(cols, rows, xs, ys):
+    if xs and not (
+        0 <= min(xs) and max(xs) < cols and 0 <= min(ys) and max(ys) < rows
+    ):
+        raise ValueError("Posición fuera del mapa")
+
+
+class GameState:
+    # E: game_map, rng
+    # S: inicializa estado de partida
+    def __init__(self, game_map=None, rng=random):
+        self.game_map = game_map or GameMap(ANCHO_MAPA, ALTO_MAPA)
+        self.campo = CampoDistancias(self.game_map, RADIO_CAMPO)
+        self.lejano = CampoLejano(self.game_map)
+        self.rng = rng
+        self.modo = None
+        self.dificultad = "Normal"
+        self.generador = "clasico"
+        self.factor_dificultad = DIFICULTADES[self.dificultad]
+
+        self.jugador = None
+        self.tabla_enemigos = TablaEnemigos(self.game_map.cols)
+        self.enemigos = self.tabla_enemigos.filas
+        self.trampas = []
+        self.ultimo_trampa = -COOLDOWN_TRAMPA
+        self.trampa_lista = True
+        self.ocupacion_enemigos = IndiceOcupacion(self.game_map.cols)
+        self.ocupacion_trampas = IndiceOcupacion(self.game_map.cols)
+        self.temporizadores = Temporizadores()
+
+        self.tick = 0
+        self.puntaje = 0
+        self.enemigos_atrapados = 0
+        self.enemigos_escapados = 0
+
+        self.running = False
+        self.victoria = None
+        self.motivo = ""
+        self.instrumentacion = None
+
+    # E: modo, dificultad, factor, num_enemigos, generador, game_map
+    # S: configura partida
+    def iniciar(
+        self,
+        modo,
+        dificultad,
+        factor=None,
+        num_enemigos=None,
+        generador=None,
+        game_map=None,
+    ):
+        """Prepara una partida; con game_map usa ese mapa ya generado."""
+        self.modo = modo
+        self.dificultad = dificultad
+        if generador is not None:
+            self.generador = generador
+        self.factor_dificultad = (
+            DIFICULTADES[dificultad] if factor is None else factor
+        )
+        self.tick = 0
+
+        if game_map is not None:
+            self.game_map = game_map
+        else:
+            self.game_map.generar(self.rng, self.generador)
+        horda = dificultad == DIFICULTAD_HORDA
+        self.campo = CampoDistancias(self.game_map, RADIO_CAMPO)
+        self.lejano = CampoLejano(self.game_map)
+
+        ix, iy = self.game_map.inicio
+        self.jugador = Jugador(ix, iy, self.tick)
+
+        self.tabla_enemigos = TablaEnemigos(self.game_map.cols)
+        self.enemigos = self.tabla_enemigos.filas
+        self.ocupacion_enemigos = IndiceOcupacion(self.game_map.cols)
+        if num_enemigos is None:
+            num_enemigos = ENEMIGOS_POR_DIFICULTAD[dificultad]
+            if horda:
+                paso = self.game_map.paso
+                libres = paso.count(PASO_ENEMIGO) + paso.count(
+                    PASO_ENEMIGO | PASO_JUGADOR
+                )
+                num_enemigos = min(num_enemigos, libres // CELDAS_POR_ENEMIGO)
+        for i in range(num_enemigos):
+            ex, ey = self.generar_posicion_enemigo()
+            enemigo = self.tabla_enemigos.agregar(
+                ex, ey, velocidad=self.factor_dificultad, tick=self.tick
+            )
+            if horda:
+                enemigo.ultimo_movimiento -= i % enemigo.intervalo
+            self.ocupacion_enemigos.agregar(enemigo)
+
+        self.trampas = []
+        self.ocupacion_trampas = IndiceOcupacion(self.game_map.cols)
+        self.ultimo_trampa = -COOLDOWN_TRAMPA
+        self.programar_temporizadores()
+
+        self.puntaje = 0
+        self.enemigos_atrapados = 0
+        self.enemigos_escapados = 0
+        self.running = True
+        self.victoria = None
+        self.motivo = ""
+
+    # E: ninguno
+    # S: temporizadores rearmados
+    def programar_temporizadores(self):
+        temporizadores = self.temporizadores = Temporizadores()
+        temporizadores.programar(
+            self.jugador.ultima_recuperacion + RECUPERACION_ENERGIA, EVENTO_ENERGIA
+        )
+        self.trampa_lista = self.tick - self.ultimo_trampa >= COOLDOWN_TRAMPA
+        if not self.trampa_lista:
+            temporizadores.programar(
+                self.ultimo_trampa + COOLDOWN_TRAMPA, EVENTO_COOLDOWN
+            )
+        for trampa in self.trampas:
+            temporizadores.programar(
+                trampa.colocada_en + DURACION_TRAMPA,
+                EVENTO_TRAMPA,
+                trampa.colocada_en,
+                trampa,
+            )
+        for i, muerte in enumerate(self.tabla_enemigos.tick_muerte):
+            if muerte >= 0:
+                temporizadores.programar(muerte + RESPAWN_ENEMIGO, EVENTO_RESPAWN, i)
+
+    # E: ninguno
+    # S: genera pos enemigo
+    def generar_posicion_enemigo(self):
+        game_map = self.game_map
+        zonas = game_map.zonas
+        cols = game_map.cols
+        jx = self.jugador.x
+        jy = self.jugador.y
+        componentes = zonas.alrededor(jy * cols + jx) or zonas.mayor()
+        if not componentes:
+            raise ValueError("El mapa no tiene celdas para enemigos")
+        reservadas = (game_map.inicio, game_map.salida)
+        paso = game_map.paso
+        cerca = None
+        valida = None
+        for _ in range(INTENTOS_POSICION_ENEMIGO):
+            k = zonas.elegir(self.rng, componentes)
+            x = k % cols
+            y = k // cols
+            if (x, y) in reservadas or not paso[k] & PASO_ENEMIGO:
+                continue
+            if abs(x - jx) + abs(y - jy) >= DISTANCIA_MINIMA_ENEMIGO:
+                return x, y
+            if cerca is None:
+                cerca = zonas.cercanas(jy * cols + jx, DISTANCIA_MINIMA_ENEMIGO)
+            if k not in cerca:
+                return x, y
+            valida = (x, y)
+        if valida is not None:
+            return valida
+        for k in zonas.celdas_de(componentes):
+            if (k % cols, k // cols) not in reservadas and paso[k] & PASO_ENEMIGO:
+                return k % cols, k // cols
+        return x, y
+
+    # E: ninguno
+    # S: segundos simulados
+    @property
+    def tiempo(self):
+        return self.tick / TICKS_POR_SEGUNDO
+
+    # E: entradas
+    # S: avanza la partida un tick
+    def step(self, entradas=()):
+        medir = self.instrumentacion
+        if medir:
+            t0 = time.perf_counter_ns()
+        for entrada in entradas:
+            if entrada[0] == ENTRADA_MOVER:
+                self.mover_jugador(*entrada[1:])
+            elif entrada[0] == ENTRADA_TRAMPA:
+                self.colocar_trampa()
+        if not self.running:
+            return
+
+        self.tick += 1
+        tick = self.tick
+        revivir = self.atender_temporizadores(tick)
+        if medir:
+            t1 = time.perf_counter_ns()
+            medir.registrar("jugador", t1 - t0)
+
+        jugador = self.jugador
+        self.campo.mover_objetivo(jugador.x, jugador.y)
+        self.lejano.avanzar(jugador.x, jugador.y)
+        self.game_map.avanzar_zonas(CUOTA_ZONAS)
+        if medir:
+            t2 = time.perf_counter_ns()
+            medir.registrar("campo", t2 - t1)
+
+        terminada = self.mover_enemigos(tick, revivir)
+        if medir:
+            t3 = time.perf_counter_ns()
+            medir.registrar("enemigos", t3 - t2)
+        if terminada:
+            return
+
+        if self.modo == MODO_ESCAPA:
+            base = max(0, 1000 - tick // TICKS_POR_SEGUNDO * 10)
+            self.puntaje = (
+                int(base * self.factor_dificultad) + self.enemigos_atrapados * 30
+            )
+        if medir:
+            medir.registrar("puntaje", time.perf_counter_ns() - t3)
+
+    # E: tick
+    # S: enemigos a revivir
+    def atender_temporizadores(self, tick):
+        revivir = set()
+        for _, tipo, clave, dato in self.temporizadores.vencidos(tick):
+            if tipo == EVENTO_RESPAWN:
+                revivir.add(clave)
+            elif tipo == EVENTO_ENERGIA:
+                self.jugador.recuperar_energia(tick)
+                self.temporizadores.programar(
+                    tick + RECUPERACION_ENERGIA, EVENTO_ENERGIA
+                )
+            elif tipo == EVENTO_COOLDOWN:
+                self.trampa_lista = True
+            elif tipo == EVENTO_TRAMPA and dato in self.trampas:
+                self.quitar_trampa(dato)
+        return revivir
+
+    # E: tick, revivir
+    # S: True si terminó la partida
+    def mover_enemigos(self, tick, revivir=()):
+        jugador = self.jugador
+        for enemigo in list(self.ocupacion_enemigos.en(jugador.x, jugador.y)):
+            if self.revisar_enemigo(enemigo, tick):
+                return True
+
+        tabla = self.tabla_enemigos
+        xs = tabla.x
+        ys = tabla.y
+        vivo = tabla.vivo
+        intervalo = tabla.intervalo
+        ultimo = tabla.ultimo_movimiento
+        filas = tabla.filas
+        for i in range(len(vivo)):
+            if not vivo[i]:
+                if i in revivir:
+                    tabla.revivir(i, *self.generar_posicion_enemigo())
+                    self.ocupacion_enemigos.agregar(filas[i])
+                    if self.revisar_enemigo(filas[i], tick):
+                        return True
+                continue
+            if tick - ultimo[i] < intervalo[i]:
+                continue
+
+            x0 = xs[i]
+            y0 = ys[i]
+            if tabla.mover(
+                i, jugador, self.game_map, self.modo, tick, self.campo, self.lejano
+            ):
+                self.ocupacion_enemigos.mover(filas[i], x0, y0, xs[i], ys[i])
+                if self.revisar_enemigo(filas[i], tick):
+                    return True
+        return False
+
+    # E: enemigo, tick
+    # S: si terminó la partida
+    def revisar_enemigo(self, enemigo, tick):
+        jugador = self.jugador
+        x = enemigo.x
+        y = enemigo.y
+        if x == jugador.x and y == jugador.y:
+            if self.modo == MODO_ESCAPA:
+                self.fin_partida(victoria=False, motivo="Un cazador te atrapó.")
+                return True
+            self.enemigos_atrapados += 1
+            self.puntaje += int(100 * self.factor_dificultad * 2)
+            self.matar_enemigo(enemigo, tick)
+        elif self.modo == MODO_CAZADOR:
+            if self.game_map.es_salida(x, y):
+                self.enemigos_escapados += 1
+                self.puntaje -= int(50 * self.factor_dificultad)
+                self.matar_enemigo(enemigo, tick)
+        else:
+            trampas = self.ocupacion_trampas.en(x, y)
+            if trampas:
+                self.quitar_trampa(trampas[0])
+                self.matar_enemigo(enemigo, tick)
+                self.puntaje += int(30 * self.factor_dificultad)
+        return False
+
+    # E: enemigo, tick
+    # S: marca enemigo muerto
+    def matar_enemigo(self, enemigo, tick):
+        enemigo.vivo = False
+        enemigo.tick_muerte = tick
+        self.ocupacion_enemigos.quitar(enemigo)
+        self.temporizadores.programar(tick + RESPAWN_ENEMIGO, EVENTO_RESPAWN, enemigo.i)
+
+    # E: trampa
+    # S: trampa quitada
+    def quitar_trampa(self, trampa):
+        self.ocupacion_trampas.quitar(trampa)
+        self.trampas.remove(trampa)
+
+    # E: dx, dy, correr
+    # S: mueve jugador
+    def mover_jugador(self, dx, dy, correr):
+        if not self.running:
+            return
+        self.jugador.mover(dx, dy, self.game_map, correr)
+        if self.modo == MODO_ESCAPA and self.game_map.es_salida(
+            self.jugador.x, self.jugador.y
+        ):
+            self.fin_partida(victoria=True, motivo="¡Escapaste a tiempo!")
+
+    # E: ninguno
+    # S: si colocó trampa
+    def colocar_trampa(self):
+        if not self.running:
+            return False
+        if self.modo != MODO_ESCAPA:
+            return False
+        if len(self.trampas) >= 3:
+            return False
+        if not self.trampa_lista:
+            return False
+        tick = self.tick
+        trampa = Trampa(self.jugador.x, self.jugador.y, tick)
+        self.trampas.append(trampa)
+        self.ocupacion_trampas.agregar(trampa)
+        self.ultimo_trampa = tick
+        self.trampa_lista = False
+        self.temporizadores.programar(tick + COOLDOWN_TRAMPA, EVENTO_COOLDOWN)
+        self.temporizadores.programar(
+            tick + DURACION_TRAMPA, EVENTO_TRAMPA, tick, trampa
+        )
+        return True
+
+    # E: x, y, codigo
+    # S: cambia terreno y avisa al campo
+    def cambiar_casilla(self, x, y, codigo):
+        self.game_map.cambiar_casilla(x, y, codigo)
+        self.campo.cambiar_celda(x, y)
+        self.lejano.cambiar_terreno()
+
+    # E: victoria, motivo
+    # S: cierra partida
+    def fin_partida(self, victoria, motivo):
+        self.running = False
+        self.victoria = victoria
+        self.motivo = motivo
+
+        if self.modo == MODO_CAZADOR:
+            self.puntaje += int(
+                max(0, 500 - self.tick // TICKS_POR_SEGUNDO * 5)
+                * self.factor_dificultad
+            )
+
+    # E: terreno
+    # S: instantánea binaria
+    def a_bytes(self, terreno=True):
+        game_map = self.game_map
+        jugador = self.jugador
+        lejano = self.lejano
+        comprimido = zlib.compress(game_map.celdas, 1) if terreno else b""
+        partes = [
+            ENCABEZADO_PARTIDA.pack(
+                MAGIA_PARTIDA,
+                VERSION_PARTIDA,
+                game_map.cols,
+                game_map.rows,
+                *game_map.inicio,
+                *game_map.salida,
+                self.tick,
+                self.puntaje,
+                self.enemigos_atrapados,
+                self.enemigos_escapados,
+                self.ultimo_trampa,
+                self.running,
+                -1 if self.victoria is None else self.victoria,
+                self.factor_dificultad,
+                jugador.x,
+                jugador.y,
+                jugador.energia,
+                jugador.energia_max,
+                jugador.ultima_recuperacion,
+                *(lejano.ancla or (-1, -1)),
+                *(lejano.ancla_nueva or (-1, -1)),
+                lejano.hecho,
+                len(self.enemigos),
+                len(self.trampas),
+                len(comprimido),
+            )
+        ]
+        for texto in (self.modo, self.dificultad, self.generador, self.motivo):
+            crudo = texto.encode("utf-8")
+            partes.append(struct.pack("<H", len(crudo)))
+            partes.append(crudo)
+
+        version, interno, gauss = self.rng.getstate()
+        partes.append(struct.pack("<BH", version, len(interno)))
+        partes.append(empaquetar("I", interno))
+        partes.append(struct.pack("<?d", gauss is not None, gauss or 0.0))
+
+        for nombre, tipo in COLUMNAS_ENEMIGO:
+            partes.append(empaquetar(tipo, getattr(self.tabla_enemigos, nombre)))
+        for nombre, tipo in COLUMNAS_TRAMPA:
+            partes.append(empaquetar(tipo, [getattr(t, nombre) for t in self.trampas]))
+        partes.append(comprimido)
+        return b"".join(partes)
+
+    # E: datos, game_map
+    # S: GameState
+    @classmethod
+    def desde_bytes(cls, datos, game_map=None):
+        vista = memoryview(datos)
+        (
+            magia,
+            version,
+            cols,
+            rows,
+            ix,
+            iy,
+            sx,
+            sy,
+            tick,
+            puntaje,
+            atrapados,
+            escapados,
+            ultimo_trampa,
+            running,
+            victoria,
+            factor,
+            jx,
+            jy,
+            energia,
+            energia_max,
+            recuperacion,
+            ax,
+            ay,
+            nx,
+            ny,
+            hecho,
+            n_enemigos,
+            n_trampas,
+            largo_terreno,
+        ) = ENCABEZADO_PARTIDA.unpack_from(vista)
+        if magia != MAGIA_PARTIDA or version != VERSION_PARTIDA:
+            raise ValueError("No es una partida guardada compatible")
+        pos = ENCABEZADO_PARTIDA.size
+
+        textos = []
+        for _ in range(4):
+            (largo,) = struct.unpack_from("<H", vista, pos)
+            pos += 2
+            textos.append(str(vista[pos : pos + largo], "utf-8"))
+            pos += largo
+        modo, dificultad, generador, motivo = textos
+        revisar_textos(modo, dificultad, generador)
+
+        version_rng, n = struct.unpack_from("<BH", vista, pos)
+        interno, pos = desempaquetar(vista, pos + 3, "I", n)
+        hay_gauss, gauss = struct.unpack_from("<?d", vista, pos)
+        pos += 9
+        rng = random.Random()
+        rng.setstate((version_rng, tuple(interno), gauss if hay_gauss else None))
+
+        columnas = []
+        for n, campos in ((n_enemigos, COLUMNAS_ENEMIGO), (n_trampas, COLUMNAS_TRAMPA)):
+            valores = {}
+            for nombre, tipo in campos:
+                valores[nombre], pos = desempaquetar(vista, pos, tipo, n)
+            columnas.append(valores)
+        enemigos, trampas = columnas
+        revisar_posiciones(cols, rows, [jx, ix, sx], [jy, iy, sy])
+        revisar_posiciones(cols, rows, enemigos["x"], enemigos["y"])
+        revisar_posiciones(cols, rows, trampas["x"], trampas["y"])
+        for x, y in ((ax, ay), (nx, ny)):
+            if x >= 0:
+                revisar_posiciones(cols, rows, [x], [y])
+
+        if largo_terreno:
+            celdas = zlib.decompress(vista[pos : pos + largo_terreno])
+            if len(celdas) != cols * rows:
+                raise ValueError("Terreno de otro tamaño")
+            game_map = GameMap(cols, rows)
+            game_map.inicio = (ix, iy)
+            game_map.salida = (sx, sy)
+            game_map.asignar(celdas)
+        elif game_map is None:
+            raise ValueError("La instantánea no incluye el terreno")
+        elif (game_map.cols, game_map.rows) != (cols, rows):
+            raise ValueError("La instantánea es de otro mapa")
+
+        estado = cls(game_map, rng=rng)
+        estado.modo = modo
+        estado.dificultad = dificultad
+        estado.lejano.reconstruir(
+            None if ax < 0 else (ax, ay), None if nx < 0 else (nx, ny), hecho
+        )
+        estado.generador = generador
+        estado.motivo = motivo
+        estado.factor_dificultad = factor
+        estado.tick = tick
+        estado.puntaje = puntaje
+        estado.enemigos_atrapados = atrapados
+        estado.enemigos_escapados = escapados
+        estado.ultimo_trampa = ultimo_trampa
+        estado.running = bool(running)
+        estado.victoria = None if victoria < 0 else bool(victoria)
+
+        jugador = estado.jugador = Jugador(jx, jy, recuperacion)
+        jugador.energia = energia
+        jugador.energia_max = energia_max
+
+        estado.tabla_enemigos.asignar_columnas(enemigos)
+        estado.enemigos = estado.tabla_enemigos.filas
+        for enemigo in estado.enemigos:
+            if enemigo.vivo:
+                estado.ocupacion_enemigos.agregar(enemigo)
+        for i in range(n_trampas):
+            trampa = Trampa(trampas["x"][i], trampas["y"][i], trampas["colocada_en"][i])
+            estado.trampas.append(trampa)
+            estado.ocupacion_trampas.agregar(trampa)
+        estado.programar_temporizadores()
+        return estado
+
+
+MAGIA_REPLAY = b"RPLY"
+VERSION_REPLAY = 5
+CODIGO_TRAMPA = 2 * len(DIRECCIONES)  # 0..7 son movimientos (dirección, correr)
+LADOS_REPLAY = range(3, 4097)  # columnas y filas aceptadas al leer un replay
+SNAPSHOT_CADA = 60 * TICKS_POR_SEGUNDO  # ticks entre estados guardados al reproducir
+CARPETA_REPLAYS = "replays"
+
+
+# E: buffer, n
+# S: ninguno (agrega bytes al buffer)
+def escribir_varint(buffer, n):
+    while n >= 0x80:
+        buffer.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+# E: datos, pos
+# S: valor y posición siguiente
+def leer_varint(datos, pos):
+    n = 0
+    corrimiento = 0
+    while True:
+        if pos >= len(datos):
+            raise ValueError("Replay incompleto")
+        byte = datos[pos]
+        pos += 1
+        n |= (byte & 0x7F) << corrimiento
+        if byte < 0x80:
+            return n, pos
+        corrimiento += 7
+
+
+# E: entrada
+# S: código de un byte
+def codigo_entrada(entrada):
+    if entrada[0] == ENTRADA_TRAMPA:
+        return CODIGO_TRAMPA
+    _, dx, dy, correr = entrada
+    return 2 * DIRECCIONES.index((dx, dy)) + bool(correr)
+
+
+# E: codigo
+# S: entrada para step
+def entrada_de_codigo(codigo):
+    if codigo == CODIGO_TRAMPA:
+        return (ENTRADA_TRAMPA,)
+    if codigo > CODIGO_TRAMPA:
+        raise ValueError(f"Código de entrada desconocido: {codigo}")
+    dx, dy = DIRECCIONES[codigo // 2]
+    return (ENTRADA_MOVER, dx, dy, bool(codigo % 2))
+
+
+class Grabacion:
+    # E: modo, dificultad, generador, cols, rows, semillas, num_enemigos, factor, jugador
+    # S: ninguno
+    def __init__(
+        self,
+        modo,
+        dificultad,
+        generador,
+        cols,
+        rows,
+        semilla_mapa,
+        semilla_partida,
+        num_enemigos,
+        factor,
+        jugador="",
+    ):
+        self.modo = modo
+        self.dificultad = dificultad
+        self.generador = generador
+        self.cols = cols
+        self.rows = rows
+        self.semilla_mapa = semilla_mapa
+        self.semilla_partida = semilla_partida
+        self.num_enemigos = num_enemigos
+        self.factor = factor
+        self.jugador = jugador
+        self.ticks = 0
+        self.puntaje = 0
+        self.eventos = bytearray()
+        self.ultimo_tick = 0
+
+    # E: tick, entrada
+    # S: ninguno
+    def registrar(self, tick, entrada):
+        escribir_varint(self.eventos, tick - self.ultimo_tick)
+        self.eventos.append(codigo_entrada(entrada))
+        self.ultimo_tick = tick
+
+    # E: ticks, puntaje
+    # S: ninguno
+    def terminar(self, ticks, puntaje):
+        self.ticks = ticks
+        self.puntaje = puntaje
+
+    # E: ninguno
+    # S: lista de (tick, entrada)
+    def entradas(self):
+        lista = []
+        tick = 0
+        pos = 0
+        while pos < len(self.eventos):
+            delta, pos = leer_varint(self.eventos, pos)
+            tick += delta
+            if pos == len(self.eventos):
+                raise ValueError("Replay incompleto")
+            lista.append((tick, entrada_de_codigo(self.eventos[pos])))
+            pos += 1
+        return lista
+
+    # E: ninguno
+    # S: bytes del replay
+    def a_bytes(self):
+        datos = bytearray(MAGIA_REPLAY)
+        datos.append(VERSION_REPLAY)
+        for texto in (self.modo, self.dificultad, self.generador, self.jugador):
+            crudo = texto.encode("utf-8")
+            escribir_varint(datos, len(crudo))
+            datos += crudo
+        for n in (
+            self.cols,
+            self.rows,
+            self.semilla_mapa,
+            self.semilla_partida,
+            self.num_enemigos,
+            self.ticks,
+            2 * self.puntaje if self.puntaje >= 0 else -2 * self.puntaje - 1,
+        ):
+            escribir_varint(datos, n)
+        datos += struct.pack("<d", self.factor)
+        escribir_varint(datos, len(self.eventos))
+        datos += self.eventos
+        return bytes(datos)
+
+    # E: datos
+    # S: Grabacion
+    @classmethod
+    def desde_bytes(cls, datos):
+        if datos[:5] != MAGIA_REPLAY + bytes([VERSION_REPLAY]):
+            raise ValueError("No es un replay compatible")
+        pos = 5
+        textos = []
+        for _ in range(4):
+            largo, pos = leer_varint(datos, pos)
+            if pos + largo > len(datos):
+                raise ValueError("Replay incompleto")
+            textos.append(bytes(datos[pos : pos + largo]).decode("utf-8"))
+            pos += largo
+        numeros = []
+        for _ in range(7):
+            n, pos = leer_varint(datos, pos)
+            numeros.append(n)
+        if pos + 8 > len(datos):
+            raise ValueError("Replay incompleto")
+        (factor,) = struct.unpack_from("<d", datos, pos)
+        pos += 8
+        largo, pos = leer_varint(datos, pos)
+        if pos + largo > len(datos):
+            raise ValueError("Replay incompleto")
+
+        modo, dificultad, generador, jugador = textos
+        cols, rows, semilla_mapa, semilla_partida, num_enemigos = numeros[:5]
+        revisar_textos(modo, dificultad, generador)
+        if cols not in LADOS_REPLAY or rows not in LADOS_REPLAY:
+            raise ValueError(f"Tamaño de mapa inválido: {cols}x{rows}")
+        if num_enemigos > cols * rows:
+            raise ValueError(f"Demasiados enemigos: {num_enemigos}")
+        grabacion = cls(
+            modo,
+            dificultad,
+            generador,
+            cols,
+            rows,
+            semilla_mapa,
+            semilla_partida,
+            num_enemigos,
+            factor,
+            jugador,
+        )
+        puntaje = numeros[6] // 2 if numeros[6] % 2 == 0 else -(numeros[6] + 1) // 2
+        grabacion.terminar(numeros[5], puntaje)
+        grabacion.eventos = bytearray(datos[pos : pos + largo])
+        entradas = grabacion.entradas()
+        if entradas:
+            grabacion.ultimo_tick = entradas[-1][0]
+        return grabacion
+
+    # E: ruta
+    # S: ninguno
+    def guardar(self, ruta):
+        with open(ruta, "wb") as f:
+            f.write(self.a_bytes())
+
+    # E: ruta
+    # S: Grabacion
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, "rb") as f:
+            return cls.desde_bytes(f.read())
+
+
+class Reproductor:
+    # E: grabacion
+    # S: ninguno
+    def __init__(self, grabacion):
+        self.grabacion = grabacion
+        self.por_tick = {}
+        for tick, entrada in grabacion.entradas():
+            self.por_tick.setdefault(tick, []).append(entrada)
+        self.snapshots = {}
+        self.estado = self.estado_inicial()
+        self.guardar_snapshot()
+
+    # E: ninguno
+    # S: GameState al tick 0
+    def estado_inicial(self):
+        g = self.grabacion
+        game_map = GameMap(g.cols, g.rows)
+        game_map.generar(random.Random(g.semilla_mapa), g.generador)
+        estado = GameState(game_map, rng=random.Random(g.semilla_partida))
+        estado.iniciar(
+            g.modo,
+            g.dificultad,
+            factor=g.factor,
+            num_enemigos=g.num_enemigos,
+            generador=g.generador,
+            game_map=game_map,
+        )
+        return estado
+
+    # E: ninguno
+    # S: ninguno
+    def avanzar(self):
+        estado = self.estado
+        estado.step(self.por_tick.get(estado.tick, ()))
+        if estado.tick % SNAPSHOT_CADA == 0:
+            self.guardar_snapshot()
+
+    # E: ninguno
+    # S: bool
+    def terminado(self):
+        return not self.estado.running or self.estado.tick >= self.grabacion.ticks
+
+    # E: ninguno
+    # S: estado final
+    def jugar(self):
+        while not self.terminado():
+            self.avanzar()
+        return self.estado
+
+    # E: ninguno
+    # S: ninguno
+    def guardar_snapshot(self):
+        self.snapshots[self.estado.tick] = self.estado.a_bytes(terreno=False)
+
+    # E: tick
+    # S: estado en ese tick
+    def ir_a(self, tick):
+        base = max(t for t in self.snapshots if t <= tick)
+        if not base <= self.estado.tick <= tick:
+            self.estado = GameState.desde_bytes(
+                self.snapshots[base], self.estado.game_map
+            )
+        while self.estado.tick < tick and not self.terminado():
+            self.avanzar()
+        return self.estado
+
+
+class TopPuntajes:
+    # E: k
+    # S: heap vacío
+    def __init__(self, k=5):
+        self.k = k
+        self.heap = []
+
+    # E: puntaje, secuencia, nombre
+    # S: heap actualizado
+    def agregar(self, puntaje, secuencia, nombre):
+        entrada = (puntaje, -secuencia, nombre)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entrada)
+        elif entrada > self.heap[0]:
+            heapq.heapreplace(self.heap, entrada)
+
+    # E: ninguno
+    # S: lista ordenada de mejores
+    def mejores(self):
+        return [
+            {"nombre": nombre, "puntaje": puntaje}
+            for puntaje, _, nombre in sorted(self.heap, reverse=True)
+        ]
+
+
+class ScoreManager:
+    # E: archivo, antiguo, k
+    # S: bitácora abierta y tops cargados
+    def __init__(self, archivo, antiguo=None, k=5):
+        self.archivo = archivo
+        self.archivo_snapshot = archivo + ".snap"
+        self.k = k
+        self.tops = {MODO_ESCAPA: TopPuntajes(k), MODO_CAZADOR: TopPuntajes(k)}
+        self.registros = 0
+        self.pendientes = 0
+        self.desde_compactar = 0
+        self.ultimo_fsync = time.monotonic()
+        self.cargar()
+        self.log = open(self.archivo, "a", encoding="utf-8")
+        if antiguo and self.registros == 0:
+            self.importar(antiguo)
+
+    # E: ninguno
+    # S: tops desde instantánea y bitácora
+    def cargar(self):
+        inicio = self.cargar_snapshot()
+        if not os.path.exists(self.archivo):
+            return
+        with open(self.archivo, "rb") as f:
+            f.seek(inicio)
+            datos = f.read()
+        completo = datos.rfind(b"\n") + 1
+        if completo < len(datos):
+            with open(self.archivo, "r+b") as f:
+                f.truncate(inicio + completo)
+        for linea in datos[:completo].splitlines():
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            self.aplicar(registro)
+
+    # E: ninguno
+    # S: offset para seguir leyendo
+    def cargar_snapshot(self):
+        try:
+            with open(self.archivo_snapshot, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot["offset"] > os.path.getsize(self.archivo):
+                return 0
+            for modo, entradas in snapshot["tops"].items():
+                top = self.tops.setdefault(modo, TopPuntajes(self.k))
+                for puntaje, secuencia, nombre in entradas:
+                    top.agregar(puntaje, secuencia, nombre)
+            self.registros = snapshot["registros"]
+            return snapshot["offset"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.tops = {
+                MODO_ESCAPA: TopPuntajes(self.k),
+                MODO_CAZADOR: TopPuntajes(self.k),
+            }
+            self.registros = 0
+            return 0
+
+    # E: antiguo
+    # S: puntajes anteriores en la bitácora
+    def importar(self, antiguo):
+        try:
+            with open(antiguo, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for modo, lista in data.items():
+            for p in lista:
+                self.agregar_puntaje(modo, p["nombre"], p["puntaje"])
+        self.sincronizar()
+
+    # E: registro
+    # S: tops actualizados
+    def aplicar(self, registro):
+        top = self.tops.setdefault(registro["modo"], TopPuntajes(self.k))
+        top.agregar(registro["puntaje"], self.registros, registro["nombre"])
+        self.registros += 1
+
+    # E: modo, nombre, puntaje, dificultad, fecha
+    # S: registro con fecha
+    def nuevo_registro(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        return {
+            "modo": modo,
+            "dificultad": dificultad,
+            "nombre": nombre,
+            "puntaje": int(puntaje),
+            "fecha": round(time.time() if fecha is None else float(fecha), 3),
+        }
+
+    # E: modo, nombre, puntaje, dificultad, fecha
+    # S: registro en la bitácora
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        registro = self.nuevo_registro(modo, nombre, puntaje, dificultad, fecha)
+        self.log.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.log.flush()
+        self.aplicar(registro)
+
+        self.pendientes += 1
+        self.desde_compactar += 1
+        if (
+            self.pendientes >= FSYNC_CADA
+            or time.monotonic() - self.ultimo_fsync >= FSYNC_SEGUNDOS
+        ):
+            self.sincronizar()
+        if self.desde_compactar >= COMPACTAR_CADA:
+            self.compactar()
+
+    # E: registros
+    # S: registros con un fsync, todo o nada
+    def agregar_lote(self, registros):
+        nuevos = [self.nuevo_registro(*registro) for registro in registros]
+        texto = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in nuevos)
+        if self.log.closed:
+            self.log = open(self.archivo, "a", encoding="utf-8")
+        inicio = self.log.tell()
+        try:
+            self.log.write(texto)
+            self.log.flush()
+            os.fsync(self.log.fileno())
+        except OSError:
+            self.deshacer(inicio)
+            raise
+        self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+        for registro in nuevos:
+            self.aplicar(registro)
+        self.desde_compactar += len(nuevos)
+        if self.desde_compactar >= COMPACTAR_CADA:
+            try:
+                self.compactar()
+            except OSError:
+                pass
+
+    # E: inicio
+    # S: bitácora cortada en inicio
+    def deshacer(self, inicio):
+        try:
+            self.log.close()
+        except OSError:
+            pass
+        try:
+            os.truncate(self.archivo, inicio)
+        except OSError:
+            pass
+        self.log = open(self.archivo, "a", encoding="utf-8")
+
+    # E: ninguno
+    # S: fsync de la bitácora
+    def sincronizar(self):
+        if self.pendientes:
+            os.fsync(self.log.fileno())
+            self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+
+    # E: ninguno
+    # S: instantánea atómica
+    def compactar(self):
+        self.sincronizar()
+        snapshot = {
+            "offset": self.log.tell(),
+            "registros": self.registros,
+            "tops": {
+                modo: [[p, -s, n] for p, s, n in top.heap]
+                for modo, top in self.tops.items()
+            },
+        }
+        temporal = self.archivo_snapshot + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo_snapshot)
+        self.desde_compactar = 0
+
+    # E: ninguno
+    # S: instantánea y cierre
+    def cerrar(self):
+        if self.desde_compactar:
+            self.compactar()
+        self.log.close()
+
+    # E: modo, n
+    # S: lista de mejores
+    def obtener_top(self, modo, n=5):
+        top = self.tops.get(modo)
+        return top.mejores()[:n] if top else []
+
+    # E: modo
+    # S: lista de 5 mejores
+    def obtener_top5(self, modo):
+        return self.obtener_top(modo, 5)
+
+
+class SQLiteScoreManager:
+    # E: archivo
+    # S: base con tabla e índices
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.conexion = sqlite3.connect(archivo, timeout=5.0)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        with self.conexion:
+            self.conexion.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS puntajes (
+                    id INTEGER PRIMARY KEY,
+                    modo TEXT NOT NULL,
+                    dificultad TEXT,
+                    nombre TEXT NOT NULL,
+                    puntaje INTEGER NOT NULL,
+                    fecha REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_modo_puntaje
+                    ON puntajes (modo, puntaje DESC, id);
+                CREATE INDEX IF NOT EXISTS idx_modo_dificultad_puntaje
+                    ON puntajes (modo, dificultad, puntaje DESC, id);
+                CREATE INDEX IF NOT EXISTS idx_nombre
+                    ON puntajes (nombre, modo, puntaje DESC);
+                CREATE INDEX IF NOT EXISTS idx_fecha ON puntajes (fecha);
+                CREATE INDEX IF NOT EXISTS idx_modo_fecha
+                    ON puntajes (modo, fecha);
+                """
+            )
+
+    # E: modo, nombre, puntaje, dificultad, fecha
+    # S: valores del INSERT
+    @staticmethod
+    def fila(modo, nombre, puntaje, dificultad=None, fecha=None):
+        fecha = time.time() if fecha is None else float(fecha)
+        return (modo, dificultad, nombre, int(puntaje), fecha)
+
+    # E: modo, nombre, puntaje, dificultad, fecha
+    # S: fila insertada
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        self.agregar_lote([(modo, nombre, puntaje, dificultad, fecha)])
+
+    # E: registros
+    # S: filas en una transacción
+    def agregar_lote(self, registros):
+        filas = [self.fila(*registro) for registro in registros]
+        with self.conexion:
+            self.conexion.executemany(
+                "INSERT INTO puntajes (modo, dificultad, nombre, puntaje, fecha)"
+                " VALUES (?, ?, ?, ?, ?)",
+                filas,
+            )
+
+    # E: modo, n, dificultad
+    # S: lista de mejores
+    def obtener_top(self, modo, n=5, dificultad=None):
+        if dificultad is None:
+            filas = self.conexion.execute(
+                "SELECT nombre, puntaje FROM puntajes WHERE modo = ?"
+                " ORDER BY puntaje DESC, id LIMIT ?",
+                (modo, n),
+            )
+        else:
+            filas = self.conexion.execute(
+                "SELECT nombre, puntaje FROM puntajes"
+                " WHERE modo = ? AND dificultad = ?"
+                " ORDER BY puntaje DESC, id LIMIT ?",
+                (modo, dificultad, n),
+            )
+        return [{"nombre": nombre, "puntaje": puntaje} for nombre, puntaje in filas]
+
+    # E: modo
+    # S: lista de 5 mejores
+    def obtener_top5(self, modo):
+        return self.obtener_top(modo, 5)
+
+    # E: nombre
+    # S: mejor puntaje por modo
+    def mejores_de(self, nombre):
+        filas = self.conexion.execute(
+            "SELECT modo, MAX(puntaje) FROM puntajes WHERE nombre = ? GROUP BY modo",
+            (nombre,),
+        )
+        return dict(filas)
+
+    # E: desde, hasta, modo
+    # S: resultados en el rango
+    def puntajes_entre(self, desde, hasta, modo=None):
+        consulta = (
+            "SELECT modo, dificultad, nombre, puntaje, fecha FROM puntajes"
+            " WHERE fecha >= ? AND fecha < ?"
+        )
+        parametros = [desde, hasta]
+        if modo is not None:
+            consulta += " AND modo = ?"
+            parametros.append(modo)
+        filas = self.conexion.execute(consulta + " ORDER BY fecha DESC", parametros)
+        return [
+            {
+                "modo": m,
+                "dificultad": d,
+                "nombre": nombre,
+                "puntaje": puntaje,
+                "fecha": fecha,
+            }
+            for m, d, nombre, puntaje, fecha in filas
+        ]
+
+    # E: ninguno
+    # S: cierra la conexión
+    def cerrar(self):
+        self.conexion.close()
+
+
+class RemoteScoreManager:
+    # E: direccion, respaldo
+    # S: cliente sin conectar
+    def __init__(self, direccion=DIRECCION_PUNTAJES, respaldo=ARCHIVO_PENDIENTES):
+        self.direccion = direccion
+        self.respaldo = respaldo
+        self.conexion = None
+        self.archivo = None
+
+    # E: ninguno
+    # S: socket conectado
+    def conectar(self):
+        if self.direccion.startswith("unix:"):
+            conexion = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conexion.settimeout(TIMEOUT_PUNTAJES)
+            conexion.connect(self.direccion[len("unix:") :])
+        else:
+            host, puerto = self.direccion.rsplit(":", 1)
+            conexion = socket.create_connection(
+                (host, int(puerto)), timeout=TIMEOUT_PUNTAJES
+            )
+        self.conexion = conexion
+        self.archivo = conexion.makefile("rwb")
+
+    # E: pedido
+    # S: respuesta del servidor
+    def pedir(self, pedido):
+        try:
+            if self.conexion is None:
+                self.conectar()
+            self.archivo.write(json.dumps(pedido).encode("utf-8") + b"\n")
+            self.archivo.flush()
+            linea = self.archivo.readline()
+            if not linea:
+                raise ConnectionError("el servidor cerró la conexión")
+        except OSError:
+            self.cerrar()
+            raise
+        respuesta = json.loads(linea)
+        if not respuesta.get("ok"):
+            raise ValueError(respuesta.get("error", "pedido rechazado"))
+        return respuesta
+
+    # E: modo, nombre, puntaje, dificultad, fecha
+    # S: registro enviado o respaldado
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        self.agregar_lote([(modo, nombre, puntaje, dificultad, fecha)])
+
+    # E: registros
+    # S: registros enviados o respaldados
+    def agregar_lote(self, registros):
+        ahora = round(time.time(), 3)
+        registros = [list(r) for r in registros]
+        for registro in registros:
+            if len(registro) < 5 or registro[4] is None:
+                registro.extend([None] * (4 - len(registro)))
+                registro[4:] = [ahora]
+        try:
+            self.enviar_respaldo()
+            self.pedir({"op": "agregar_lote", "registros": registros})
+        except OSError:
+            self.escribir_respaldo(self.leer_respaldo() + registros)
+
+    # E: ninguno
+    # S: respaldo reenviado
+    def enviar_respaldo(self):
+        registros = self.leer_respaldo()
+        for i in range(0, len(registros), LOTE_PUNTAJES):
+            lote = registros[i : i + LOTE_PUNTAJES]
+            try:
+                self.pedir({"op": "agregar_lote", "registros": lote})
+            except ValueError:
+                for j, registro in enumerate(lote):
+                    try:
+                        self.pedir({"op": "agregar_lote", "registros": [registro]})
+                    except ValueError as error:
+                        avisos.warning("Puntaje descartado %r: %s", registro, error)
+                    except OSError:
+                        self.escribir_respaldo(registros[i + j :])
+                        raise
+            except OSError:
+                self.escribir_respaldo(registros[i:])
+                raise
+        if os.path.exists(self.respaldo):
+            os.remove(self.respaldo)
+
+    # E: registros
+    # S: respaldo reescrito
+    def escribir_respaldo(self, registros):
+        temporal = self.respaldo + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.respaldo)
+
+    # E: ninguno
+    # S: registros pendientes
+    def leer_respaldo(self):
+        if not os.path.exists(self.respaldo):
+            return []
+        registros = []
+        with open(self.respaldo, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registros.append(json.loads(linea))
+                except ValueError:
+                    continue
+        return registros
+
+    # E: modo, n
+    # S: lista de mejores
+    def obtener_top(self, modo, n=5):
+        return self.pedir({"op": "top", "modo": modo, "n": n})["top"]
+
+    # E: modo
+    # S: lista de 5 mejores
+    def obtener_top5(self, modo):
+        return self.obtener_top(modo, 5)
+
+    # E: ninguno
+    # S: cierra el socket
+    def cerrar(self):
+        if self.conexion is not None:
+            self.archivo.close()
+            self.conexion.close()
+        self.conexion = None
+        self.archivo = None
+
+
+RECHAZOS_PUNTAJE = (
+    ValueError,
+    TypeError,
+    sqlite3.IntegrityError,
+    sqlite3.InterfaceError,
+)
 
-    # E: ninguno
-    # S: color muro
-    def color(self):
-        return "#222222"
 
+class PersistenciaPuntajes:
+    # E: crear_backend
+    # S: hilo de persistencia
+    def __init__(self, crear_backend, respaldo=ARCHIVO_SIN_ESCRIBIR):
+        self.crear_backend = crear_backend
+        self.respaldo = respaldo
+        self.cola = queue.Queue()
+        self.lock = threading.Lock()
+        self.vista = {MODO_ESCAPA: TopPuntajes(), MODO_CAZADOR: TopPuntajes()}
+        self.sin_escribir = []
+        self.secuencia = 0
+        self.hilo = threading.Thread(target=self.trabajar, daemon=True)
+        self.hilo.start()
 
-class Liana(CasillaBase):
     # E: ninguno
-    # S: inicializa liana
-    def __init__(self):
-        super().__init__(LIANA)
+    # S: escribe lotes en el backend
+    def trabajar(self):
+        backend = self.crear_backend()
+        anteriores = self.recuperar(backend)
+        self.refrescar(backend, 0)
 
-    # E: ninguno
-    # S: enemigo puede pasar
-    def puede_pasar_enemigo(self):
-        return True
+        pendientes = []
+        terminar = False
+        while not terminar:
+            pendientes.append(self.cola.get())
+            while len(pendientes) < LOTE_PUNTAJES:
+                try:
+                    pendientes.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+            if pendientes[-1] is None:
+                pendientes.pop()
+                terminar = True
+            escritos = self.escribir(backend, pendientes)
+            if escritos:
+                del pendientes[:escritos]
+                self.refrescar(backend, escritos)
+        self.guardar_respaldo(anteriores + pendientes)
+        backend.cerrar()
 
-    # E: ninguno
-    # S: color liana
-    def color(self):
-        return "#228B22"
+    # E: backend, registros
+    # S: cantidad resuelta
+    def escribir(self, backend, registros):
+        if not registros:
+            return 0
+        try:
+            backend.agregar_lote(registros)
+            return len(registros)
+        except RECHAZOS_PUNTAJE:
+            pass
+        except (OSError, sqlite3.Error):
+            return 0
+        for i, registro in enumerate(registros):
+            try:
+                backend.agregar_lote([registro])
+            except RECHAZOS_PUNTAJE as error:
+                avisos.warning("Puntaje descartado %r: %s", registro, error)
+            except (OSError, sqlite3.Error):
+                return i
+        return len(registros)
 
+    # E: backend
+    # S: registros aún sin escribir
+    def recuperar(self, backend):
+        try:
+            with open(self.respaldo, "r", encoding="utf-8") as f:
+                lineas = f.readlines()
+        except OSError:
+            return []
+        anteriores = []
+        for linea in lineas:
+            try:
+                anteriores.append(json.loads(linea))
+            except ValueError:
+                continue
+        anteriores = anteriores[self.escribir(backend, anteriores) :]
+        self.guardar_respaldo(anteriores)
+        return anteriores
 
-class Tunel(CasillaBase):
-    # E: ninguno
-    # S: inicializa túnel
-    def __init__(self):
-        super().__init__(TUNEL)
+    # E: registros
+    # S: respaldo guardado o borrado
+    def guardar_respaldo(self, registros):
+        try:
+            if not registros:
+                if os.path.exists(self.respaldo):
+                    os.remove(self.respaldo)
+                return
+            temporal = self.respaldo + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                for registro in registros:
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self.respaldo)
+        except OSError as error:
+            avisos.warning("No se pudo guardar %s: %s", self.respaldo, error)
 
-    # E: ninguno
-    # S: jugador puede pasar
-    def puede_pasar_jugador(self):
-        return True
+    # E: backend, escritos
+    # S: vista rehecha
+    def refrescar(self, backend, escritos):
+        try:
+            tops = {m: backend.obtener_top5(m) for m in (MODO_ESCAPA, MODO_CAZADOR)}
+        except (OSError, ValueError, sqlite3.Error):
+            tops = None
+        with self.lock:
+            del self.sin_escribir[:escritos]
+            if tops is None:
+                return
+            vista = {}
+            for modo, top in tops.items():
+                vista[modo] = TopPuntajes()
+                for i, p in enumerate(top):
+                    vista[modo].agregar(p["puntaje"], i - len(top), p["nombre"])
+            for secuencia, (modo, nombre, puntaje, *_) in self.sin_escribir:
+                top = vista.setdefault(modo, TopPuntajes())
+                top.agregar(puntaje, secuencia, nombre)
+            self.vista = vista
+
+    # E: modo, nombre, puntaje, dificultad
+    # S: vista actualizada y registro encolado
+    def agregar_puntaje(self, modo, nombre, puntaje, dificultad=None):
+        registro = (modo, nombre, puntaje, dificultad, round(time.time(), 3))
+        with self.lock:
+            top = self.vista.setdefault(modo, TopPuntajes())
+            top.agregar(puntaje, self.secuencia, nombre)
+            self.sin_escribir.append((self.secuencia, registro))
+            self.secuencia += 1
+        self.cola.put(registro)
+
+    # E: modo
+    # S: lista de la vista en memoria
+    def obtener_top5(self, modo):
+        with self.lock:
+            top = self.vista.get(modo)
+            return top.mejores() if top else []
 
     # E: ninguno
-    # S: color túnel
-    def color(self):
-        return "#4b0082"
+    # S: pendientes escritos
+    def cerrar(self):
+        self.cola.put(None)
+        self.hilo.join()
 
 
-class GameMap:
-    # E: cols, rows
-    # S: inicializa mapa
-    def __init__(self, cols, rows):
-        self.cols = cols
-        self.rows = rows
-        self.matriz = [[Muro() for _ in range(cols)] for _ in range(rows)]
-        self.inicio = (1, 1)
-        self.salida = (cols - 2, rows - 2)
+class GuardadoPartida:
+    # E: archivo
+    # S: ninguno
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.condicion = threading.Condition()
+        self.pedido = None
+        self.cerrando = False
+        self.hilo = threading.Thread(target=self.trabajar, daemon=True)
+        self.hilo.start()
+
+    # E: datos
+    # S: deja los bytes para el hilo
+    def guardar(self, datos):
+        with self.condicion:
+            self.pedido = datos
+            self.condicion.notify()
 
     # E: ninguno
-    # S: genera mapa aleatorio
-    def generar(self):
-        self.matriz = [[Muro() for _ in range(self.cols)] for _ in range(self.rows)]
-
-        x, y = self.inicio
-        sx, sy = self.salida
-
-        self.matriz[y][x] = Camino()
-        while (x, y) != (sx, sy):
-            dx = sx - x
-            dy = sy - y
-            opciones = []
-            if dx > 0:
-                opciones.append((1, 0))
-            if dx < 0:
-                opciones.append((-1, 0))
-            if dy > 0:
-                opciones.append((0, 1))
-            if dy < 0:
-                opciones.append((0, -1))
-            if not opciones:
-                break
-            mx, my = random.choice(opciones)
-            nx, ny = x + mx, y + my
-            if 0 < nx < self.cols - 1 and 0 < ny < self.rows - 1:
-                x, y = nx, ny
-                self.matriz[y][x] = Camino()
-
-        for j in range(1, self.rows - 1):
-            for i in range(1, self.cols - 1):
-                if (i, j) == self.inicio or (i, j) == self.salida:
-                    self.matriz[j][i] = Camino()
-                    continue
-                if isinstance(self.matriz[j][i], Camino):
-                    continue
-                r = random.random()
-                if r < 0.55:
-                    self.matriz[j][i] = Camino()
-                elif r < 0.7:
-                    self.matriz[j][i] = Muro()
-                elif r < 0.85:
-                    self.matriz[j][i] = Liana()
+    # S: pide borrar el archivo
+    def borrar(self):
+        self.guardar(b"")
+
+    # E: ninguno
+    # S: cumple los pedidos en el hilo
+    def trabajar(self):
+        while True:
+            with self.condicion:
+                while self.pedido is None and not self.cerrando:
+                    self.condicion.wait()
+                datos, self.pedido = self.pedido, None
+            if datos is None:
+                return
+            try:
+                if datos:
+                    self.escribir(datos)
                 else:
-                    self.matriz[j][i] = Tunel()
+                    os.remove(self.archivo)
+            except OSError:
+                pass
 
-        ix, iy = self.inicio
-        sx, sy = self.salida
-        self.matriz[iy][ix] = Camino()
-        self.matriz[sy][sx] = Camino()
+    # E: datos
+    # S: escritura atómica del archivo
+    def escribir(self, datos):
+        temporal = self.archivo + ".tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo)
 
-    # E: x, y
-    # S: casilla en posición
-    def casilla(self, x, y):
-        if 0 <= x < self.cols and 0 <= y < self.rows:
-            return self.matriz[y][x]
-        return Muro()
+    # E: ninguno
+    # S: cumple lo pendiente y espera al hilo
+    def cerrar(self):
+        with self.condicion:
+            self.cerrando = True
+            self.condicion.notify()
+        self.hilo.join()
 
-    # E: x, y
-    # S: si es salida
-    def es_salida(self, x, y):
-        return (x, y) == self.salida
 
+class CanvasRenderer:
+    # E: canvas, vista_cols, vista_filas, imagen
+    # S: renderer sin mapa
+    def __init__(
+        self, canvas, vista_cols=VISTA_COLS, vista_filas=VISTA_FILAS, imagen=None
+    ):
+        self.canvas = canvas
+        self.vista_cols = vista_cols
+        self.vista_filas = vista_filas
+        self.nueva_imagen = imagen or functools.partial(tk.PhotoImage, master=canvas)
+        self.game_map = None
+        self.camara = None
+        self.cols = 0
+        self.filas = 0
+        self.imagen_celdas = None
+        self.imagen_terreno = None
+        self.colores_terreno = []
+        self.version_terreno = None
+        self.item_salida = None
+        self.item_jugador = None
+        self.items_enemigos = {}
+        self.items_trampas = {}
+        self.item_overlay = None
 
-class Jugador:
-    # E: x, y
-    # S: inicializa jugador
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.energia_max = 100
-        self.energia = self.energia_max
-        self.ultima_recuperacion = time.time()
+    # E: game_map
+    # S: crea items del terreno visible
+    def preparar_mapa(self, game_map):
+        self.canvas.delete("all")
+        self.game_map = game_map
+        self.camara = None
+        self.items_enemigos = {}
+        self.items_trampas = {}
+        self.item_jugador = None
+        self.item_overlay = None
 
-    # E: dx, dy, game_map, correr
-    # S: mueve jugador
-    def mover(self, dx, dy, game_map, correr=False):
-        pasos = 2 if correr and self.energia >= 10 else 1
-        for _ in range(pasos):
-            nx = self.x + dx
-            ny = self.y + dy
-            cas = game_map.casilla(nx, ny)
-            if cas.puede_pasar_jugador():
-                self.x = nx
-                self.y = ny
-            else:
-                break
-        if correr and pasos == 2:
-            self.energia = max(0, self.energia - 10)
+        self.cols = min(self.vista_cols, game_map.cols)
+        self.filas = min(self.vista_filas, game_map.rows)
+        self.canvas.config(
+            width=self.cols * TAM_CELDA, height=self.filas * TAM_CELDA
+        )
 
-    # E: ninguno
-    # S: actualiza energía
-    def actualizar_energia(self):
-        ahora = time.time()
-        if ahora - self.ultima_recuperacion >= 1.0:
-            self.energia = min(self.energia_max, self.energia + 1)
-            self.ultima_recuperacion = ahora
+        ancho = self.cols * TAM_CELDA
+        alto = self.filas * TAM_CELDA
+        self.imagen_celdas = self.nueva_imagen(width=self.cols, height=self.filas)
+        self.imagen_terreno = self.nueva_imagen(width=ancho, height=alto)
+        self.canvas.create_image(
+            0, 0, image=self.imagen_terreno, anchor="nw", tags="terreno"
+        )
+        for x in range(self.cols + 1):
+            self.canvas.create_line(
+                x * TAM_CELDA, 0, x * TAM_CELDA, alto, fill="#555555", tags="grilla"
+            )
+        for y in range(self.filas + 1):
+            self.canvas.create_line(
+                0, y * TAM_CELDA, ancho, y * TAM_CELDA, fill="#555555", tags="grilla"
+            )
+        self.colores_terreno = [None] * (self.cols * self.filas)
+        self.version_terreno = None
 
+        self.item_salida = self.canvas.create_rectangle(
+            0, 0, 0, 0, outline="gold", width=3, state="hidden"
+        )
 
-class Enemigo:
-    # E: x, y, velocidad
-    # S: inicializa enemigo
-    def __init__(self, x, y, velocidad=1.0):
-        self.x = x
-        self.y = y
-        self.vivo = True
-        self.tiempo_muerte = None
-        self.velocidad = velocidad
-        self.ultimo_movimiento = time.time()
+    # E: x, y
+    # S: si la cámara se movió
+    def enfocar(self, x, y):
+        cx = min(max(x - self.cols // 2, 0), self.game_map.cols - self.cols)
+        cy = min(max(y - self.filas // 2, 0), self.game_map.rows - self.filas)
+        movida = (cx, cy) != self.camara
+        if movida:
+            self.camara = (cx, cy)
+            sx, sy = self.game_map.salida
+            if self.visible(sx, sy):
+                self.canvas.coords(self.item_salida, *self.rect_celda(sx, sy, 4))
+                self.canvas.itemconfig(self.item_salida, state="normal")
+            else:
+                self.canvas.itemconfig(self.item_salida, state="hidden")
+        if movida or self.version_terreno != self.game_map.version:
+            self.pintar_terreno()
+        return movida
 
     # E: ninguno
-    # S: indica si puede moverse
-    def listo_para_moverse(self):
-        intervalo = max(0.2, 0.6 / self.velocidad)
-        return time.time() - self.ultimo_movimiento >= intervalo
+    # S: celdas cambiadas repintadas en la imagen
+    def pintar_terreno(self):
+        cx, cy = self.camara
+        cols = self.game_map.cols
+        celdas = self.game_map.celdas
+        colores = self.colores_terreno
+        cambiadas = []
+        k = 0
+        for fy in range(self.filas):
+            base = (cy + fy) * cols + cx
+            for fx in range(self.cols):
+                color = COLORES[celdas[base + fx]]
+                if colores[k] != color:
+                    colores[k] = color
+                    cambiadas.append(k)
+                k += 1
+        self.version_terreno = self.game_map.version
 
-    # E: jugador, game_map, modo
-    # S: mueve enemigo
-    def mover(self, jugador, game_map, modo):
-        if not self.vivo:
+        if len(cambiadas) * 4 > len(colores):
+            filas = [
+                "{" + " ".join(colores[f : f + self.cols]) + "}"
+                for f in range(0, len(colores), self.cols)
+            ]
+            self.imagen_celdas.put(" ".join(filas))
+            self.imagen_terreno.tk.call(
+                self.imagen_terreno,
+                "copy",
+                self.imagen_celdas,
+                "-zoom",
+                TAM_CELDA,
+                TAM_CELDA,
+            )
             return
-        if not self.listo_para_moverse():
+        for k in cambiadas:
+            fy, fx = divmod(k, self.cols)
+            self.imagen_terreno.put(
+                colores[k],
+                to=(
+                    fx * TAM_CELDA,
+                    fy * TAM_CELDA,
+                    (fx + 1) * TAM_CELDA,
+                    (fy + 1) * TAM_CELDA,
+                ),
+            )
+
+    # E: x, y
+    # S: si la celda está en pantalla
+    def visible(self, x, y):
+        cx, cy = self.camara
+        return cx <= x < cx + self.cols and cy <= y < cy + self.filas
+
+    # E: jugador, enemigos, trampas, ocupacion
+    # S: ninguno
+    def dibujar(self, jugador, enemigos, trampas, ocupacion=None):
+        if jugador is None:
             return
-        self.ultimo_movimiento = time.time()
+        movida = self.enfocar(jugador.x, jugador.y)
 
-        dirs = [(0, -1), (0, 1), (-1, 0), (1, 0)]
-        mejor_dx, mejor_dy = 0, 0
+        visibles = [t for t in trampas if self.visible(t.x, t.y)]
+        self.sincronizar(self.items_trampas, visibles, self.crear_trampa, 8, movida)
 
-        def distancia(a, b):
-            return abs(a[0] - b[0]) + abs(a[1] - b[1])
+        if ocupacion is not None:
+            visibles = self.en_vista(ocupacion)
+        else:
+            visibles = [e for e in enemigos if e.vivo and self.visible(e.x, e.y)]
+        self.sincronizar(self.items_enemigos, visibles, self.crear_enemigo, 6, movida)
 
-        mejor_dist = None
-        for dx, dy in dirs:
-            nx = self.x + dx
-            ny = self.y + dy
-            cas = game_map.casilla(nx, ny)
-            if not cas.puede_pasar_enemigo():
-                continue
-            d = distancia((nx, ny), (jugador.x, jugador.y))
-            if modo == MODO_ESCAPA:
-                if mejor_dist is None or d < mejor_dist:
-                    mejor_dist = d
-                    mejor_dx, mejor_dy = dx, dy
-            else:
-                if mejor_dist is None or d > mejor_dist:
-                    mejor_dist = d
-                    mejor_dx, mejor_dy = dx, dy
+        if self.item_jugador is None:
+            self.item_jugador = [self.crear_jugador(jugador), jugador.x, jugador.y]
+        self.mover_item(self.item_jugador, jugador, 4, movida)
 
-        self.x += mejor_dx
-        self.y += mejor_dy
+    # E: ocupacion
+    # S: entidades visibles
+    def en_vista(self, ocupacion):
+        cx, cy = self.camara
+        cols = ocupacion.cols
+        celdas = ocupacion.celdas
+        visibles = []
+        if len(celdas) < self.filas * self.cols:
+            for k, lista in celdas.items():
+                if self.visible(k % cols, k // cols):
+                    visibles.extend(lista)
+            return visibles
+        for fy in range(cy, cy + self.filas):
+            base = fy * cols + cx
+            for k in range(base, base + self.cols):
+                lista = celdas.get(k)
+                if lista:
+                    visibles.extend(lista)
+        return visibles
 
+    # E: texto
+    # S: ninguno
+    def mostrar_overlay(self, texto):
+        if texto is None:
+            if self.item_overlay is not None:
+                self.canvas.itemconfig(self.item_overlay, state="hidden")
+            return
+        if self.item_overlay is None:
+            self.item_overlay = self.canvas.create_text(
+                4,
+                4,
+                anchor="nw",
+                fill="#00ff00",
+                font=("Courier", 9),
+                tags="overlay",
+            )
+        self.canvas.itemconfig(self.item_overlay, text=texto, state="normal")
+        self.canvas.tag_raise(self.item_overlay)
 
-class Trampa:
-    # E: x, y
-    # S: inicializa trampa
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.colocada_en = time.time()
+    # E: items, entidades, crear, margen, movida
+    # S: crea, mueve o borra items
+    def sincronizar(self, items, entidades, crear, margen, movida):
+        actuales = set(entidades)
+        for entidad in [e for e in items if e not in actuales]:
+            self.canvas.delete(items.pop(entidad)[0])
+        for entidad in entidades:
+            registro = items.get(entidad)
+            if registro is None:
+                items[entidad] = [crear(entidad), entidad.x, entidad.y]
+            else:
+                self.mover_item(registro, entidad, margen, movida)
 
+    # E: registro, entidad, margen, movida
+    # S: mueve item si cambió
+    def mover_item(self, registro, entidad, margen, movida):
+        item, x, y = registro
+        if entidad.x == x and entidad.y == y and not movida:
+            return
+        self.canvas.coords(item, *self.rect_celda(entidad.x, entidad.y, margen))
+        registro[1] = entidad.x
+        registro[2] = entidad.y
 
-class ScoreManager:
-    # E: archivo
-    # S: gestor de puntajes
-    def __init__(self, archivo):
-        self.archivo = archivo
-        self.data = {MODO_ESCAPA: [], MODO_CAZADOR: []}
-        self.cargar()
+    # E: x, y, margen
+    # S: coordenadas en pantalla de celda
+    def rect_celda(self, x, y, margen):
+        x -= self.camara[0]
+        y -= self.camara[1]
+        return (
+            x * TAM_CELDA + margen,
+            y * TAM_CELDA + margen,
+            (x + 1) * TAM_CELDA - margen,
+            (y + 1) * TAM_CELDA - margen,
+        )
 
-    # E: ninguno
-    # S: carga puntajes
-    def cargar(self):
-        if os.path.exists(self.archivo):
-            try:
-                with open(self.archivo, "r", encoding="utf-8") as f:
-                    self.data = json.load(f)
-            except Exception:
-                self.data = {MODO_ESCAPA: [], MODO_CAZADOR: []}
+    # E: trampa
+    # S: item de trampa
+    def crear_trampa(self, trampa):
+        item = self.canvas.create_oval(
+            *self.rect_celda(trampa.x, trampa.y, 8),
+            fill="red",
+            outline="yellow",
+            tags="trampa",
+        )
+        self.canvas.tag_raise("enemigo")
+        self.canvas.tag_raise("jugador")
+        return item
 
-    # E: ninguno
-    # S: guarda puntajes
-    def guardar(self):
-        with open(self.archivo, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    # E: modo, nombre, puntaje
-    # S: agrega al top 5
-    def agregar_puntaje(self, modo, nombre, puntaje):
-        lista = self.data.get(modo, [])
-        lista.append({"nombre": nombre, "puntaje": puntaje})
-        lista.sort(key=lambda x: x["puntaje"], reverse=True)
-        self.data[modo] = lista[:5]
-        self.guardar()
+    # E: enemigo
+    # S: item de enemigo
+    def crear_enemigo(self, enemigo):
+        item = self.canvas.create_rectangle(
+            *self.rect_celda(enemigo.x, enemigo.y, 6),
+            fill="#ff5555",
+            outline="black",
+            tags="enemigo",
+        )
+        self.canvas.tag_raise("jugador")
+        return item
 
-    # E: modo
-    # S: retorna top 5
-    def obtener_top5(self, modo):
-        return self.data.get(modo, [])
+    # E: jugador
+    # S: item de jugador
+    def crear_jugador(self, jugador):
+        return self.canvas.create_oval(
+            *self.rect_celda(jugador.x, jugador.y, 4),
+            fill="#1e90ff",
+            outline="black",
+            width=2,
+            tags="jugador",
+        )
 
 
 class GameApp:
-    # E: root
+    # E: root, reloj
     # S: inicializa app
-    def __init__(self, root):
+    def __init__(self, root, reloj=None):
         self.root = root
+        self.reloj = reloj or RelojMonotono()
         self.root.title("Proyecto Cazadores - Escapa / Cazador")
 
-        self.modo_actual = None
         self.dificultad = "Normal"
-        self.factor_dificultad = DIFICULTADES[self.dificultad]
-
-        self.game_map = GameMap(ANCHO_MAPA, ALTO_MAPA)
-        self.jugador = None
-        self.enemigos = []
-        self.trampas = []
-        self.ultimo_trampa = 0
+        self.tamano_mapa = "Pequeño"
+        self.tipo_mapa = "clasico"
+        self.estado = GameState()
+        self.pools = {}
 
         self.jugador_nombre = ""
-        self.score_manager = ScoreManager(ARCHIVO_SCORES)
+        if BACKEND_PUNTAJES == "sqlite":
+            backend = functools.partial(SQLiteScoreManager, ARCHIVO_SCORES_DB)
+        elif BACKEND_PUNTAJES == "remoto":
+            backend = RemoteScoreManager
+        else:
+            backend = functools.partial(
+                ScoreManager, ARCHIVO_SCORES, ARCHIVO_SCORES_ANTIGUO
+            )
+        self.score_manager = PersistenciaPuntajes(backend)
+        self.guardado = GuardadoPartida(ARCHIVO_PARTIDA)
 
-        self.tiempo_inicio = None
-        self.puntaje = 0
-        self.enemigos_atrapados = 0
-        self.enemigos_escapados = 0
+        self.planificador = Planificador(self.reloj)
+        self.entradas = collections.deque(maxlen=ENTRADAS_EN_COLA)
+        self.grabacion = None
+        self.reproductor = None
+        self.ultimo_autoguardado = 0
 
-        self.running = False
+        self.instrumentacion = Instrumentacion()
+        self.estado.instrumentacion = self.instrumentacion
+        self.ver_overlay = False
+        self.ultimo_overlay = 0.0
+        self.aviso_overlay = ""
+        self.loop_programado = None
 
         self.crear_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
         self.mostrar_ventana_registro()
+        self.pool_actual()
 
     # E: ninguno
     # S: crea interfaz
@@ -395,11 +3704,12 @@ class GameApp:
 
         self.canvas = tk.Canvas(
             self.root,
-            width=ANCHO_MAPA * TAM_CELDA,
-            height=ALTO_MAPA * TAM_CELDA,
+            width=VISTA_COLS * TAM_CELDA,
+            height=VISTA_FILAS * TAM_CELDA,
             bg="black",
         )
         self.canvas.pack()
+        self.renderer = CanvasRenderer(self.canvas)
 
         self.root.bind("<Up>", lambda e: self.mover_jugador(0, -1, False))
         self.root.bind("<Down>", lambda e: self.mover_jugador(0, 1, False))
@@ -413,6 +3723,11 @@ class GameApp:
 
         self.root.bind("<space>", lambda e: self.colocar_trampa())
 
+        self.root.bind("<F2>", lambda e: self.cerrar())
+
+        self.root.bind("<F3>", lambda e: self.alternar_overlay())
+        self.root.bind("<F4>", lambda e: self.exportar_rendimiento())
+
     # E: ninguno
     # S: muestra ventana registro
     def mostrar_ventana_registro(self):
@@ -429,6 +3744,18 @@ class GameApp:
             padx=10, pady=5
         )
 
+        tk.Label(self.win_reg, text="Tamaño del mapa:").pack(padx=10, pady=5)
+        self.var_tamano = tk.StringVar(value=self.tamano_mapa)
+        tk.OptionMenu(self.win_reg, self.var_tamano, *TAMANOS_MAPA.keys()).pack(
+            padx=10, pady=5
+        )
+
+        tk.Label(self.win_reg, text="Tipo de mapa:").pack(padx=10, pady=5)
+        self.var_tipo = tk.StringVar(value=self.tipo_mapa)
+        tk.OptionMenu(self.win_reg, self.var_tipo, *GENERADORES.keys()).pack(
+            padx=10, pady=5
+        )
+
         tk.Label(self.win_reg, text="Elige modo:").pack(padx=10, pady=5)
 
         btn_escapa = tk.Button(
@@ -445,6 +3772,13 @@ class GameApp:
         )
         btn_cazador.pack(padx=10, pady=5)
 
+        if os.path.exists(ARCHIVO_PARTIDA):
+            tk.Button(
+                self.win_reg,
+                text="Continuar partida guardada",
+                command=self.continuar_desde_registro,
+            ).pack(padx=10, pady=5)
+
     # E: modo
     # S: inicia partida desde registro
     def iniciar_desde_registro(self, modo):
@@ -454,242 +3788,332 @@ class GameApp:
             return
         self.jugador_nombre = nombre
         self.dificultad = self.var_dif.get()
-        self.factor_dificultad = DIFICULTADES[self.dificultad]
+        self.tamano_mapa = self.var_tamano.get()
+        self.tipo_mapa = self.var_tipo.get()
         self.win_reg.destroy()
         self.iniciar_partida(modo)
 
+    # E: ninguno
+    # S: ninguno
+    def continuar_desde_registro(self):
+        try:
+            estado, grabacion = self.cargar_partida()
+        except (OSError, ValueError, struct.error, zlib.error) as error:
+            messagebox.showwarning(
+                "Atención", f"No se pudo continuar la partida guardada: {error}"
+            )
+            return
+        self.win_reg.destroy()
+        self.continuar_partida(estado, grabacion)
+
     # E: modo
     # S: configura partida
     def iniciar_partida(self, modo):
-        self.modo_actual = modo
         self.lbl_info.config(
             text=f"Modo: {modo} | Jugador: {self.jugador_nombre} | Dif: {self.dificultad}"
         )
 
-        self.game_map.generar()
-
-        ix, iy = self.game_map.inicio
-        self.jugador = Jugador(ix, iy)
-
-        self.enemigos = []
-        num_enemigos = (
-            3
-            if self.dificultad == "Fácil"
-            else (4 if self.dificultad == "Normal" else 5)
+        game_map, semilla_mapa = self.pool_actual().tomar()
+        semilla_partida = random.randrange(2**32)
+        self.estado.rng = random.Random(semilla_partida)
+        self.estado.iniciar(
+            modo, self.dificultad, generador=self.tipo_mapa, game_map=game_map
         )
-        for _ in range(num_enemigos):
-            ex, ey = self.generar_posicion_enemigo()
-            self.enemigos.append(Enemigo(ex, ey, velocidad=self.factor_dificultad))
+        self.renderer.preparar_mapa(self.estado.game_map)
 
-        self.trampas = []
-        self.ultimo_trampa = 0
+        self.grabacion = Grabacion(
+            modo,
+            self.dificultad,
+            self.tipo_mapa,
+            game_map.cols,
+            game_map.rows,
+            semilla_mapa,
+            semilla_partida,
+            len(self.estado.enemigos),
+            self.estado.factor_dificultad,
+            self.jugador_nombre,
+        )
+        self.reproductor = None
+        self.ultimo_autoguardado = 0
+        self.entradas.clear()
+        self.planificador.iniciar()
+        self.actualizar_top5_labels()
+        self.loop_juego()
 
-        self.tiempo_inicio = time.time()
-        self.puntaje = 0
-        self.enemigos_atrapados = 0
-        self.enemigos_escapados = 0
-        self.running = True
+    # E: estado, grabacion
+    # S: ninguno
+    def continuar_partida(self, estado, grabacion):
+        self.estado = estado
+        estado.instrumentacion = self.instrumentacion
+        self.grabacion = grabacion
+        self.jugador_nombre = grabacion.jugador
+        self.dificultad = estado.dificultad
+        self.tipo_mapa = estado.generador
+        for nombre, tamano in TAMANOS_MAPA.items():
+            if tamano == (grabacion.cols, grabacion.rows):
+                self.tamano_mapa = nombre
+        self.lbl_info.config(
+            text=f"Modo: {estado.modo} | Jugador: {grabacion.jugador} | "
+            f"Dif: {estado.dificultad}"
+        )
+        self.renderer.preparar_mapa(estado.game_map)
 
+        self.reproductor = None
+        self.ultimo_autoguardado = estado.tick
+        self.entradas.clear()
+        self.planificador.iniciar(estado.tick)
         self.actualizar_top5_labels()
         self.loop_juego()
 
-    # E: ninguno
-    # S: genera pos enemigo
-    def generar_posicion_enemigo(self):
-        while True:
-            x = random.randint(1, self.game_map.cols - 2)
-            y = random.randint(1, self.game_map.rows - 2)
-            if (x, y) != self.game_map.inicio and (x, y) != self.game_map.salida:
-                cas = self.game_map.casilla(x, y)
-                if cas.puede_pasar_enemigo():
-                    return x, y
+    # E: reproductor, velocidad
+    # S: ninguno
+    def reproducir(self, reproductor, velocidad=1.0):
+        self.reproductor = reproductor
+        self.grabacion = None
+        self.estado = reproductor.estado
+        self.estado.instrumentacion = self.instrumentacion
+        g = reproductor.grabacion
+        self.lbl_info.config(
+            text=f"Replay: {g.modo} | Jugador: {g.jugador} | Dif: {g.dificultad}"
+        )
+        self.renderer.preparar_mapa(self.estado.game_map)
+        self.entradas.clear()
+        self.planificador.iniciar(self.estado.tick, velocidad)
+        self.actualizar_top5_labels()
+        self.loop_juego()
 
     # E: dx, dy, correr
-    # S: mueve jugador
+    # S: movimiento en cola
     def mover_jugador(self, dx, dy, correr):
-        if not self.running:
-            return
-        self.jugador.mover(dx, dy, self.game_map, correr)
-        if self.modo_actual == MODO_ESCAPA and self.game_map.es_salida(
-            self.jugador.x, self.jugador.y
-        ):
-            self.fin_partida(victoria=True, motivo="¡Escapaste a tiempo!")
-        self.dibujar()
+        self.encolar((ENTRADA_MOVER, dx, dy, correr))
 
     # E: ninguno
-    # S: coloca trampa
+    # S: trampa en cola
     def colocar_trampa(self):
-        if not self.running:
-            return
-        if self.modo_actual != MODO_ESCAPA:
-            return
-        ahora = time.time()
-        if len(self.trampas) >= 3:
-            return
-        if ahora - self.ultimo_trampa < COOLDOWN_TRAMPA:
-            return
-        self.trampas.append(Trampa(self.jugador.x, self.jugador.y))
-        self.ultimo_trampa = ahora
-        self.dibujar()
+        self.encolar((ENTRADA_TRAMPA,))
+
+    # E: entrada
+    # S: entrada pendiente para el próximo tick
+    def encolar(self, entrada):
+        if self.estado.running and not self.reproductor:
+            self.entradas.append(entrada)
 
     # E: ninguno
     # S: ciclo principal juego
     def loop_juego(self):
-        if not self.running:
+        if not self.estado.running:
             return
+        inicio = time.perf_counter_ns()
+        if self.loop_programado is not None:
+            self.instrumentacion.registrar("jitter", abs(inicio - self.loop_programado))
+        planificador = self.planificador
+        planificador.empezar_llamada()
 
-        tiempo = int(time.time() - self.tiempo_inicio)
-        self.lbl_tiempo.config(text=f"Tiempo: {tiempo}s")
-        self.jugador.actualizar_energia()
-        self.actualizar_barra_energia()
-
-        for enemigo in self.enemigos:
-            if not enemigo.vivo:
-                if (
-                    enemigo.tiempo_muerte
-                    and time.time() - enemigo.tiempo_muerte >= RESPAWN_ENEMIGO
-                ):
-                    ex, ey = self.generar_posicion_enemigo()
-                    enemigo.x = ex
-                    enemigo.y = ey
-                    enemigo.vivo = True
-                    enemigo.tiempo_muerte = None
-                continue
-            enemigo.mover(self.jugador, self.game_map, self.modo_actual)
-
-            if self.modo_actual == MODO_ESCAPA:
-                if enemigo.x == self.jugador.x and enemigo.y == self.jugador.y:
-                    self.fin_partida(victoria=False, motivo="Un cazador te atrapó.")
-                    return
-            else:
-                if enemigo.x == self.jugador.x and enemigo.y == self.jugador.y:
-                    self.enemigos_atrapados += 1
-                    self.puntaje += int(100 * self.factor_dificultad * 2)
-                    enemigo.vivo = False
-                    enemigo.tiempo_muerte = time.time()
-
-            if self.modo_actual == MODO_CAZADOR and self.game_map.es_salida(
-                enemigo.x, enemigo.y
-            ):
-                self.enemigos_escapados += 1
-                self.puntaje -= int(50 * self.factor_dificultad)
-                enemigo.vivo = False
-                enemigo.tiempo_muerte = time.time()
-
-        if self.modo_actual == MODO_ESCAPA:
-            for enemigo in self.enemigos:
-                if enemigo.vivo:
-                    for trampa in list(self.trampas):
-                        if enemigo.x == trampa.x and enemigo.y == trampa.y:
-                            enemigo.vivo = False
-                            enemigo.tiempo_muerte = time.time()
-                            self.trampas.remove(trampa)
-                            self.puntaje += int(30 * self.factor_dificultad)
-
-        if self.modo_actual == MODO_ESCAPA:
-            base = max(0, 1000 - tiempo * 10)
-            self.puntaje = (
-                int(base * self.factor_dificultad) + self.enemigos_atrapados * 30
-            )
+        pendientes = planificador.ticks_pendientes(self.estado.tick)
+        if self.reproductor:
+            while pendientes and not self.reproductor.terminado():
+                self.reproductor.avanzar()
+                pendientes -= 1
+                if planificador.excedido():
+                    break
+            self.estado = self.reproductor.estado
+            self.estado.instrumentacion = self.instrumentacion
+        else:
+            while pendientes and self.estado.running:
+                entradas = list(self.entradas)
+                self.entradas.clear()
+                for entrada in entradas:
+                    self.grabacion.registrar(self.estado.tick, entrada)
+                self.estado.step(entradas)
+                pendientes -= 1
+                if planificador.excedido():
+                    break
 
-        self.lbl_puntaje.config(text=f"Puntaje: {self.puntaje}")
-        self.dibujar()
+        if (
+            self.grabacion
+            and self.estado.running
+            and self.estado.tick - self.ultimo_autoguardado >= AUTOGUARDADO_CADA
+        ):
+            self.guardar_partida()
 
-        self.root.after(100, self.loop_juego)
+        terminada = not self.estado.running or (
+            self.reproductor and self.reproductor.terminado()
+        )
+        if terminada or planificador.toca_dibujar():
+            inicio_dibujo = self.reloj.ahora()
+            self.lbl_tiempo.config(text=f"Tiempo: {int(self.estado.tiempo)}s")
+            self.actualizar_barra_energia()
+            self.lbl_puntaje.config(text=f"Puntaje: {self.estado.puntaje}")
+            self.dibujar()
+            if self.ver_overlay:
+                self.actualizar_overlay()
+            planificador.dibujado(inicio_dibujo)
 
-    # E: victoria, motivo
-    # S: cierra partida
-    def fin_partida(self, victoria, motivo):
-        self.running = False
-        tiempo_total = int(time.time() - self.tiempo_inicio)
+        if terminada:
+            self.loop_programado = None
+            self.fin_partida()
+            return
+        demora = planificador.terminar_llamada(self.estado.tick)
+        fin = time.perf_counter_ns()
+        self.instrumentacion.registrar("loop", fin - inicio)
+        self.loop_programado = fin + demora * 1_000_000
+        self.root.after(demora, self.loop_juego)
 
-        if self.modo_actual == MODO_CAZADOR:
-            self.puntaje += int(max(0, 500 - tiempo_total * 5) * self.factor_dificultad)
+    # E: ninguno
+    # S: registra puntaje, guarda replay y muestra resultado
+    def fin_partida(self):
+        estado = self.estado
+        tiempo_total = int(estado.tiempo)
 
-        self.lbl_puntaje.config(text=f"Puntaje: {self.puntaje}")
+        self.lbl_puntaje.config(text=f"Puntaje: {estado.puntaje}")
+        if self.reproductor:
+            declarado = self.reproductor.grabacion.puntaje
+            messagebox.showinfo(
+                "Fin del replay",
+                f"{estado.motivo}\n\nPuntaje reproducido: {estado.puntaje}\n"
+                f"Puntaje declarado: {declarado}",
+            )
+            return
+        self.guardar_replay()
+        self.guardado.borrar()
         self.score_manager.agregar_puntaje(
-            self.modo_actual, self.jugador_nombre, self.puntaje
+            estado.modo, self.jugador_nombre, estado.puntaje, estado.dificultad
         )
         self.actualizar_top5_labels()
 
-        texto = f"{motivo}\n\nPuntaje final: {self.puntaje}\nTiempo: {tiempo_total}s"
-        if not victoria and self.modo_actual == MODO_ESCAPA:
-            titulo = "Has perdido"
-        elif not victoria:
-            titulo = "Has perdido"
-        else:
-            titulo = "¡Has ganado!"
+        texto = (
+            f"{estado.motivo}\n\nPuntaje final: {estado.puntaje}\n"
+            f"Tiempo: {tiempo_total}s"
+        )
+        titulo = "¡Has ganado!" if estado.victoria else "Has perdido"
 
         if messagebox.askyesno(titulo, texto + "\n\n¿Jugar de nuevo?"):
             self.mostrar_ventana_registro()
         else:
-            self.root.destroy()
+            self.cerrar()
 
     # E: ninguno
-    # S: dibuja estado juego
-    def dibujar(self):
-        self.canvas.delete("all")
-        for y in range(self.game_map.rows):
-            for x in range(self.game_map.cols):
-                cas = self.game_map.casilla(x, y)
-                color = cas.color()
-                self.canvas.create_rectangle(
-                    x * TAM_CELDA,
-                    y * TAM_CELDA,
-                    (x + 1) * TAM_CELDA,
-                    (y + 1) * TAM_CELDA,
-                    fill=color,
-                    outline="#555555",
-                )
-
-        sx, sy = self.game_map.salida
-        self.canvas.create_rectangle(
-            sx * TAM_CELDA + 4,
-            sy * TAM_CELDA + 4,
-            (sx + 1) * TAM_CELDA - 4,
-            (sy + 1) * TAM_CELDA - 4,
-            outline="gold",
-            width=3,
+    # S: archivo en replays/
+    def guardar_replay(self):
+        estado = self.estado
+        self.grabacion.terminar(estado.tick, estado.puntaje)
+        fecha = time.strftime("%Y%m%d-%H%M%S")
+        nombre = "".join(c for c in self.jugador_nombre if c.isalnum()) or "jugador"
+        ruta = os.path.join(
+            CARPETA_REPLAYS, f"{fecha}_{nombre}_{estado.modo}_{estado.puntaje}.rpl"
         )
+        try:
+            os.makedirs(CARPETA_REPLAYS, exist_ok=True)
+            self.grabacion.guardar(ruta)
+        except OSError:
+            pass
 
-        for trampa in self.trampas:
-            self.canvas.create_oval(
-                trampa.x * TAM_CELDA + 8,
-                trampa.y * TAM_CELDA + 8,
-                (trampa.x + 1) * TAM_CELDA - 8,
-                (trampa.y + 1) * TAM_CELDA - 8,
-                fill="red",
-                outline="yellow",
+    # E: ninguno
+    # S: archivo de partida guardada
+    def guardar_partida(self):
+        instantanea = self.estado.a_bytes(terreno=False)
+        self.guardado.guardar(
+            b"".join(
+                (
+                    struct.pack("<I", len(instantanea)),
+                    instantanea,
+                    self.grabacion.a_bytes(),
+                )
             )
+        )
+        self.ultimo_autoguardado = self.estado.tick
 
-        for enemigo in self.enemigos:
-            if not enemigo.vivo:
-                continue
-            self.canvas.create_rectangle(
-                enemigo.x * TAM_CELDA + 6,
-                enemigo.y * TAM_CELDA + 6,
-                (enemigo.x + 1) * TAM_CELDA - 6,
-                (enemigo.y + 1) * TAM_CELDA - 6,
-                fill="#ff5555",
-                outline="black",
-            )
+    # E: ninguno
+    # S: estado y grabación
+    def cargar_partida(self):
+        with open(ARCHIVO_PARTIDA, "rb") as f:
+            datos = f.read()
+        (largo,) = struct.unpack_from("<I", datos)
+        grabacion = Grabacion.desde_bytes(datos[4 + largo :])
+        game_map = GameMap(grabacion.cols, grabacion.rows)
+        game_map.generar(random.Random(grabacion.semilla_mapa), grabacion.generador)
+        estado = GameState.desde_bytes(memoryview(datos)[4 : 4 + largo], game_map)
+        return estado, grabacion
 
-        if self.jugador:
-            self.canvas.create_oval(
-                self.jugador.x * TAM_CELDA + 4,
-                self.jugador.y * TAM_CELDA + 4,
-                (self.jugador.x + 1) * TAM_CELDA - 4,
-                (self.jugador.y + 1) * TAM_CELDA - 4,
-                fill="#1e90ff",
-                outline="black",
-                width=2,
+    # E: ninguno
+    # S: reserva de la configuración
+    def pool_actual(self):
+        cols, rows = TAMANOS_MAPA[self.tamano_mapa]
+        clave = (cols, rows, self.tipo_mapa)
+        if clave not in self.pools:
+            archivo = ARCHIVO_MAPAS.format(
+                generador=self.tipo_mapa, cols=cols, rows=rows
+            )
+            self.pools[clave] = PoolMapas(
+                cols,
+                rows,
+                self.tipo_mapa,
+                largo_minimo=largo_minimo_mapa(cols, rows, self.tipo_mapa),
+                archivo=archivo,
             )
+        return self.pools[clave]
+
+    # E: ninguno
+    # S: guarda reservas y cierra
+    def cerrar(self):
+        if self.grabacion and self.estado.running:
+            self.guardar_partida()
+        for pool in self.pools.values():
+            pool.detener()
+        self.score_manager.cerrar()
+        self.guardado.cerrar()
+        self.root.destroy()
+
+    # E: ninguno
+    # S: dibuja estado juego
+    def dibujar(self):
+        inicio = time.perf_counter_ns()
+        estado = self.estado
+        self.renderer.dibujar(
+            estado.jugador, estado.enemigos, estado.trampas, estado.ocupacion_enemigos
+        )
+        self.instrumentacion.registrar("dibujar", time.perf_counter_ns() - inicio)
+
+    # E: ninguno
+    # S: ninguno
+    def alternar_overlay(self):
+        self.ver_overlay = not self.ver_overlay
+        if self.ver_overlay:
+            self.actualizar_overlay(forzar=True)
+        else:
+            self.renderer.mostrar_overlay(None)
+
+    # E: forzar
+    # S: ninguno
+    def actualizar_overlay(self, forzar=False):
+        ahora = self.reloj.ahora()
+        if not forzar and ahora - self.ultimo_overlay < REFRESCO_OVERLAY:
+            return
+        self.ultimo_overlay = ahora
+        lineas = self.instrumentacion.resumen()
+        lineas.append(self.planificador.resumen())
+        if self.aviso_overlay:
+            lineas.append(self.aviso_overlay)
+        self.renderer.mostrar_overlay("\n".join(lineas))
+
+    # E: ninguno
+    # S: archivo JSON
+    def exportar_rendimiento(self):
+        ruta = ARCHIVO_RENDIMIENTO.format(fecha=time.strftime("%Y%m%d-%H%M%S"))
+        try:
+            self.instrumentacion.exportar(ruta)
+            self.aviso_overlay = f"Exportado a {ruta}"
+        except OSError as error:
+            self.aviso_overlay = f"No se pudo exportar: {error}"
+        self.ver_overlay = True
+        self.actualizar_overlay(forzar=True)
 
     # E: ninguno
     # S: actualiza barra energía
     def actualizar_barra_energia(self):
         self.canvas_energia.delete("all")
-        porc = self.jugador.energia / self.jugador.energia_max
+        jugador = self.estado.jugador
+        porc = jugador.energia / jugador.energia_max
         largo = int(120 * porc)
         color = "#00ff00" if porc > 0.5 else ("#ffff00" if porc > 0.2 else "#ff0000")
         self.canvas_energia.create_rectangle(0, 0, 120, 16, fill="#333333", outline="")
@@ -0,0 +1,423 @@
+"""Benchmarks de los caminos calientes del juego con control de regresiones.
+
+Mide, con semillas fijas, la generación de mapas, las consultas al mapa, el
+movimiento de jugador y enemigos, la verificación de replays (por tick
+reproducido), el registro de puntajes y el dibujo (sobre un canvas y unas
+imágenes falsos, sin Tk ni pantalla) en varios tamaños de mapa y cantidades
+de enemigos. El resultado se guarda como línea base en
+JSON; al comparar contra una, el script termina con código 1 si algún caso
+se volvió más lento que el umbral.
+
+Ejemplo:
+    python benchmark.py --guardar base.json
+    python benchmark.py --comparar base.json --umbral 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+
+from Proyeto import (
+    DIFICULTAD_HORDA,
+    DIRECCIONES,
+    ENTRADA_MOVER,
+    GENERADORES,
+    MODO_CAZADOR,
+    MODO_ESCAPA,
+    TAMANOS_MAPA,
+    CanvasRenderer,
+    GameMap,
+    GameState,
+    Grabacion,
+    Jugador,
+    Reproductor,
+    ScoreManager,
+)
+
+TAMANOS = [(20, 15), (100, 75), (400, 300)]
+CANTIDADES_ENEMIGOS = [5, 50, 500]
+
+# =========================
+# CANVAS FALSO
+# =========================
+
+
+class CanvasFalso:
+    """Lo que CanvasRenderer usa de tk.Canvas, sin dibujar nada.
+
+    Guarda los items como diccionarios, así el benchmark mide el trabajo
+    del renderer en Python y la cantidad de llamadas al canvas.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.siguiente = 1
+        self.llamadas = 0
+
+    def crear(self, tipo, coords, opciones):
+        self.llamadas += 1
+        item = self.siguiente
+        self.siguiente += 1
+        self.items[item] = {"tipo": tipo, "coords": coords, **opciones}
+        return item
+
+    def create_rectangle(self, *coords, **opciones):
+        return self.crear("rectangle", coords, opciones)
+
+    def create_oval(self, *coords, **opciones):
+        return self.crear("oval", coords, opciones)
+
+    def create_text(self, *coords, **opciones):
+        return self.crear("text", coords, opciones)
+
+    def create_line(self, *coords, **opciones):
+        return self.crear("line", coords, opciones)
+
+    def create_image(self, *coords, **opciones):
+        return self.crear("image", coords, opciones)
+
+    def coords(self, item, *coords):
+        self.llamadas += 1
+        self.items[item]["coords"] = coords
+
+    def itemconfig(self, item, **opciones):
+        self.llamadas += 1
+        self.items[item].update(opciones)
+
+    def delete(self, item):
+        self.llamadas += 1
+        if item == "all":
+            self.items.clear()
+        else:
+            self.items.pop(item, None)
+
+    def tag_raise(self, item):
+        self.llamadas += 1
+
+    def config(self, **opciones):
+        self.llamadas += 1
+
+
+class ImagenFalsa:
+    """Lo que CanvasRenderer usa de tk.PhotoImage: put y la copia ampliada.
+
+    Guarda el último dato de cada put para que el benchmark pague armar los
+    colores como lo haría con Tk.
+    """
+
+    def __init__(self, width=0, height=0):
+        self.width = width
+        self.height = height
+        self.pintado = {}
+        self.llamadas = 0
+        self.tk = self
+
+    def put(self, datos, to=(0, 0)):
+        self.llamadas += 1
+        self.pintado[to[:2]] = datos
+
+    def call(self, *argumentos):
+        self.llamadas += 1
+
+
+# =========================
+# CASOS
+# =========================
+# Cada caso prepara su estado y devuelve (operaciones por llamada, función);
+# el tiempo se informa por operación.
+
+
+def mapa(cols, rows, generador="clasico"):
+    game_map = GameMap(cols, rows)
+    game_map.generar(random.Random(1), generador)
+    return game_map
+
+
+def partida(cols, rows, enemigos, modo=MODO_CAZADOR, dificultad="Normal"):
+    estado = GameState(mapa(cols, rows), rng=random.Random(2))
+    estado.iniciar(modo, dificultad, num_enemigos=enemigos, game_map=estado.game_map)
+    return estado
+
+
+def caso_generar(cols, rows, generador):
+    game_map = GameMap(cols, rows)
+    rng = random.Random(1)
+    return 1, lambda: game_map.generar(rng, generador)
+
+
+def caso_casilla(cols, rows):
+    game_map = mapa(cols, rows)
+    rng = random.Random(3)
+    puntos = [(rng.randrange(cols), rng.randrange(rows)) for _ in range(1000)]
+    casilla = game_map.casilla
+
+    def correr():
+        for x, y in puntos:
+            casilla(x, y)
+
+    return len(puntos), correr
+
+
+def caso_jugador(cols, rows):
+    game_map = mapa(cols, rows)
+    jugador = Jugador(*game_map.inicio)
+    rng = random.Random(4)
+    pasos = [(rng.choice(DIRECCIONES), rng.random() < 0.3) for _ in range(1000)]
+
+    def correr():
+        for (dx, dy), rapido in pasos:
+            jugador.energia = jugador.energia_max
+            jugador.mover(dx, dy, game_map, rapido)
+
+    return len(pasos), correr
+
+
+def caso_enemigos(cols, rows, cantidad):
+    estado = partida(cols, rows, cantidad)
+    jugador = estado.jugador
+    estado.campo.mover_objetivo(jugador.x, jugador.y)
+    enemigos = estado.enemigos
+    reloj = [0]
+
+    def correr():
+        # cada llamada es un turno en que todos los enemigos pueden moverse
+        reloj[0] += 100
+        for enemigo in enemigos:
+            enemigo.mover(
+                jugador, estado.game_map, estado.modo, reloj[0], estado.campo
+            )
+
+    return cantidad, correr
+
+
+def caso_step(cols, rows, cantidad, dificultad="Normal"):
+    estado = partida(cols, rows, cantidad, dificultad=dificultad)
+
+    def correr():
+        if not estado.running:
+            estado.iniciar(
+                estado.modo, dificultad, num_enemigos=cantidad, game_map=estado.game_map
+            )
+        estado.step()
+
+    return 1, correr
+
+
+def caso_step_moviendo(cols, rows):
+    # el jugador camina (y dobla al chocar), así que cada tick mueve el
+    # objetivo de los campos y se aleja del ancla del campo lejano
+    estado = partida(cols, rows, None)
+    rng = random.Random(7)
+    direccion = [DIRECCIONES[0]]
+
+    def correr():
+        if not estado.running:
+            estado.iniciar(estado.modo, "Normal", game_map=estado.game_map)
+        jugador = estado.jugador
+        dx, dy = direccion[0]
+        if rng.random() < 0.1 or not estado.game_map.puede_pasar_jugador(
+            jugador.x + dx, jugador.y + dy
+        ):
+            dx, dy = direccion[0] = rng.choice(DIRECCIONES)
+        estado.step([(ENTRADA_MOVER, dx, dy, False)])
+
+    return 1, correr
+
+
+def caso_replay(cols, rows, ticks=1000):
+    # graba una partida CAZADOR con el jugador caminando; cada llamada la
+    # verifica como replay.py (generar el mapa incluido), por tick reproducido
+    estado = partida(cols, rows, None)
+    grabacion = Grabacion(
+        estado.modo,
+        estado.dificultad,
+        estado.generador,
+        cols,
+        rows,
+        1,
+        2,
+        len(estado.enemigos),
+        estado.factor_dificultad,
+    )
+    rng = random.Random(8)
+    while estado.running and estado.tick < ticks:
+        entradas = []
+        if estado.tick % 2 == 0:
+            dx, dy = rng.choice(DIRECCIONES)
+            entradas.append((ENTRADA_MOVER, dx, dy, rng.random() < 0.2))
+        for entrada in entradas:
+            grabacion.registrar(estado.tick, entrada)
+        estado.step(entradas)
+    grabacion.terminar(estado.tick, estado.puntaje)
+
+    def correr():
+        Reproductor(grabacion).jugar()
+
+    return grabacion.ticks, correr
+
+
+def caso_puntajes(carpeta):
+    manager = ScoreManager(os.path.join(carpeta, "scores.jsonl"))
+    rng = random.Random(5)
+    registros = [
+        (rng.choice((MODO_ESCAPA, MODO_CAZADOR)), f"j{i}", rng.randrange(2000))
+        for i in range(100)
+    ]
+
+    def correr():
+        for modo, nombre, puntaje in registros:
+            manager.agregar_puntaje(modo, nombre, puntaje, "Normal")
+
+    return len(registros), correr
+
+
+def caso_dibujar(cols, rows, cantidad):
+    estado = partida(cols, rows, cantidad, MODO_ESCAPA)
+    renderer = CanvasRenderer(CanvasFalso(), imagen=ImagenFalsa)
+    renderer.preparar_mapa(estado.game_map)
+    jugador = estado.jugador
+    rng = random.Random(6)
+    pasos = [rng.choice(DIRECCIONES) for _ in range(100)]
+
+    def correr():
+        # el jugador se mueve para que la cámara también lo haga
+        for dx, dy in pasos:
+            jugador.mover(dx, dy, estado.game_map)
+            renderer.dibujar(
+                jugador, estado.enemigos, estado.trampas, estado.ocupacion_enemigos
+            )
+
+    return len(pasos), correr
+
+
+def casos(carpeta):
+    """Nombre -> constructor del caso, en el orden en que se informan."""
+    lista = {}
+    for cols, rows in TAMANOS:
+        t = f"{cols}x{rows}"
+        for generador in GENERADORES:
+            lista[f"GameMap.generar[{generador},{t}]"] = (
+                lambda c=cols, r=rows, g=generador: caso_generar(c, r, g)
+            )
+        lista[f"GameMap.casilla[{t}]"] = lambda c=cols, r=rows: caso_casilla(c, r)
+        lista[f"Jugador.mover[{t}]"] = lambda c=cols, r=rows: caso_jugador(c, r)
+        for n in CANTIDADES_ENEMIGOS:
+            e = f"{t},{n}"
+            lista[f"Enemigo.mover[{e}]"] = (
+                lambda c=cols, r=rows, n=n: caso_enemigos(c, r, n)
+            )
+            lista[f"GameState.step[{e}]"] = (
+                lambda c=cols, r=rows, n=n: caso_step(c, r, n)
+            )
+            lista[f"CanvasRenderer.dibujar[{e}]"] = (
+                lambda c=cols, r=rows, n=n: caso_dibujar(c, r, n)
+            )
+    # horda: la cantidad por defecto (10 000) en un mapa grande
+    lista["GameState.step[Horda,1000x1000]"] = lambda: caso_step(
+        1000, 1000, None, DIFICULTAD_HORDA
+    )
+    # cada tamaño que ofrece el menú tiene que entrar en el tick con el
+    # jugador caminando
+    for cols, rows in TAMANOS_MAPA.values():
+        lista[f"GameState.step[moviendo,{cols}x{rows}]"] = (
+            lambda c=cols, r=rows: caso_step_moviendo(c, r)
+        )
+    lista["Reproductor.jugar[200x150]"] = lambda: caso_replay(200, 150)
+    lista["ScoreManager.agregar_puntaje"] = lambda: caso_puntajes(carpeta)
+    return lista
+
+
+# =========================
+# MEDICIÓN Y COMPARACIÓN
+# =========================
+
+
+def medir(preparar, repeticiones):
+    """Mejor tiempo por operación (ns) entre varias repeticiones calibradas."""
+    operaciones, funcion = preparar()
+    temporizador = timeit.Timer(funcion)
+    # llamadas por repetición para que cada una dure al menos 0.2 s
+    numero, _ = temporizador.autorange()
+    mejor = min(temporizador.repeat(repeticiones, numero))
+    return mejor / (numero * operaciones) * 1e9
+
+
+def formatear(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:10.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:10.2f} us"
+    return f"{ns:10.1f} ns"
+
+
+def comparar(resultados, base, umbral):
+    """Imprime la comparación; devuelve los casos más lentos que el umbral."""
+    regresiones = []
+    for nombre, ns in resultados.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            print(f"{nombre:<42} {formatear(ns)}   (nuevo)")
+            continue
+        cambio = ns / anterior - 1
+        marca = ""
+        if cambio > umbral:
+            marca = "  REGRESIÓN"
+            regresiones.append(nombre)
+        print(f"{nombre:<42} {formatear(ns)} {cambio:>+8.1%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filtro", default="", help="solo casos que contengan esto")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--guardar", help="escribir los resultados como línea base")
+    parser.add_argument("--comparar", help="línea base JSON contra la que comparar")
+    parser.add_argument(
+        "--umbral",
+        type=float,
+        default=0.2,
+        help="lentitud relativa tolerada al comparar (0.2 = 20%%)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        resultados = {}
+        for nombre, preparar in casos(carpeta).items():
+            if args.filtro not in nombre:
+                continue
+            resultados[nombre] = medir(preparar, args.repeticiones)
+            if not args.comparar:
+                print(f"{nombre:<42} {formatear(resultados[nombre])}", flush=True)
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)["casos"]
+        regresiones = comparar(resultados, base, args.umbral)
+        if regresiones:
+            print(f"\n{len(regresiones)} casos más lentos que {args.umbral:.0%}")
+            codigo = 1
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": sys.version.split()[0],
+                    "plataforma": platform.platform(),
+                    "casos": resultados,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+    sys.exit(codigo)
+
+
+if __name__ == "__main__":
+    main()
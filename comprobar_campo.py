@@ -0,0 +1,111 @@
+"""Comprobación aleatoria de CampoDistancias contra un BFS desde cero.
+
+Genera mapas con cada generador, mueve el objetivo y abre o cierra celdas al
+azar (rearmando de a partes el índice de zonas, como los ticks de la
+partida), y después de cada cambio compara las distancias del campo (expandido
+del todo o solo hasta algunas celdas) con las de un BFS nuevo. Devuelve 1
+si alguna celda difiere.
+
+Ejemplo:
+    python comprobar_campo.py --semillas 20
+    python comprobar_campo.py --ancho 60 --alto 40 --cambios 200
+"""
+
+import argparse
+import random
+import sys
+
+from Proyeto import (
+    CAMINO,
+    GENERADORES,
+    MURO,
+    PASO_ENEMIGO,
+    CampoDistancias,
+    GameMap,
+)
+
+
+def bfs(game_map, x, y, limite=None):
+    """Distancias de referencia desde (x, y); -1 sin camino o fuera del límite."""
+    cols = game_map.cols
+    paso = game_map.paso
+    dist = [-1] * (cols * game_map.rows)
+    k = y * cols + x
+    dist[k] = 0
+    cola = [k]
+    for k in cola:
+        d = dist[k] + 1
+        if limite is not None and d > limite:
+            continue
+        for v in (k - cols, k + cols, k - 1, k + 1):
+            if dist[v] < 0 and paso[v] & PASO_ENEMIGO:
+                dist[v] = d
+                cola.append(v)
+    return dist
+
+
+def comparar(campo, referencia, celdas):
+    """Cantidad de celdas en las que el campo no coincide con la referencia."""
+    cols = campo.game_map.cols
+    return sum(campo.distancia(k % cols, k // cols) != referencia[k] for k in celdas)
+
+
+def probar(semilla, generador, args):
+    rng = random.Random(semilla)
+    game_map = GameMap(args.ancho, args.alto)
+    game_map.generar(rng, generador)
+    cols = game_map.cols
+    interiores = [
+        y * cols + x for y in range(1, game_map.rows - 1) for x in range(1, cols - 1)
+    ]
+    limite = rng.choice((None, args.limite))
+    campo = CampoDistancias(game_map, limite)
+    x, y = game_map.inicio
+    campo.mover_objetivo(x, y)
+    errores = 0
+    for _ in range(args.cambios):
+        k = rng.choice(interiores)
+        accion = rng.random()
+        if accion < 0.2:
+            x, y = k % cols, k // cols
+            campo.mover_objetivo(x, y)
+        else:
+            # abrir o cerrar una celda; las del objetivo también valen
+            codigo = MURO if game_map.paso[k] & PASO_ENEMIGO else CAMINO
+            game_map.cambiar_casilla(k % cols, k // cols, codigo)
+            campo.cambiar_celda(k % cols, k // cols)
+        game_map.avanzar_zonas(rng.randrange(1, len(game_map.paso)))
+        # consultar solo algunas celdas deja el campo expandido a medias
+        if rng.random() < 0.5:
+            consultas = rng.sample(interiores, 5)
+        else:
+            consultas = interiores
+        referencia = bfs(game_map, x, y, limite)
+        errores += comparar(campo, referencia, consultas)
+    return errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semillas", type=int, default=5)
+    parser.add_argument("--ancho", type=int, default=30)
+    parser.add_argument("--alto", type=int, default=20)
+    parser.add_argument("--cambios", type=int, default=100)
+    parser.add_argument(
+        "--limite", type=int, default=12, help="radio para los campos con límite"
+    )
+    args = parser.parse_args()
+
+    total = 0
+    for generador in GENERADORES:
+        for semilla in range(args.semillas):
+            errores = probar(semilla, generador, args)
+            total += errores
+            if errores:
+                print(f"DIF {generador} semilla {semilla}: {errores} celdas")
+    print(f"{'OK' if not total else 'DIF'}: {total} celdas distintas")
+    sys.exit(1 if total else 0)
+
+
+if __name__ == "__main__":
+    main()
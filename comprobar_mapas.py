@@ -0,0 +1,84 @@
+"""Comprobación de que generar_validado descarta los mapas demasiado cortos.
+
+Para cada generador y tamaño busca semillas cuyo mapa tiene un camino del
+inicio a la salida más corto que largo_minimo_mapa y verifica que
+generar_validado, empezando por esa semilla, entrega otro mapa que sí
+cumple (o el más largo de INTENTOS_MAPA semillas, si ninguna cumple).
+Devuelve 1 si algún mapa corto se entrega igual.
+
+Ejemplo:
+    python comprobar_mapas.py
+    python comprobar_mapas.py --semillas 50 --tamanos Pequeño Grande Enorme
+"""
+
+import argparse
+import itertools
+import random
+import sys
+
+from Proyeto import (
+    GENERADORES,
+    INTENTOS_MAPA,
+    TAMANOS_MAPA,
+    GameMap,
+    generar_validado,
+    largo_minimo_mapa,
+)
+
+
+def distancia(cols, rows, generador, semilla):
+    game_map = GameMap(cols, rows)
+    game_map.generar(random.Random(semilla), generador)
+    return game_map.distancia_salida()
+
+
+def probar(cols, rows, generador, semillas):
+    """Devuelve (mapas cortos encontrados, mapas cortos entregados)."""
+    minimo = largo_minimo_mapa(cols, rows, generador)
+    cortos = [
+        s for s in range(semillas) if distancia(cols, rows, generador, s) < minimo
+    ]
+    entregados = 0
+    for semilla in cortos:
+        _, elegida, largo = generar_validado(
+            cols, rows, generador, itertools.count(semilla), minimo
+        )
+        if elegida == semilla:
+            entregados += 1
+        elif largo < minimo:
+            # vale solo si ninguna de las semillas probadas cumplía
+            probadas = range(semilla, semilla + INTENTOS_MAPA)
+            if any(distancia(cols, rows, generador, s) >= minimo for s in probadas):
+                entregados += 1
+    return len(cortos), entregados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--semillas", type=int, default=20)
+    parser.add_argument(
+        "--tamanos",
+        nargs="+",
+        choices=list(TAMANOS_MAPA),
+        default=["Pequeño", "Grande"],
+        help="Enorme tarda unos segundos por semilla",
+    )
+    args = parser.parse_args()
+
+    total = 0
+    for nombre in args.tamanos:
+        cols, rows = TAMANOS_MAPA[nombre]
+        for generador in GENERADORES:
+            cortos, entregados = probar(cols, rows, generador, args.semillas)
+            total += entregados
+            print(
+                f"{'DIF' if entregados else 'OK '} {generador} {cols}x{rows}:"
+                f" mínimo {largo_minimo_mapa(cols, rows, generador)},"
+                f" {cortos} cortos, {entregados} entregados"
+            )
+    print(f"{'OK' if not total else 'DIF'}: {total} mapas cortos entregados")
+    sys.exit(1 if total else 0)
+
+
+if __name__ == "__main__":
+    main()
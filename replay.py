@@ -0,0 +1,83 @@
+"""Verificación y reproducción de replays de partidas.
+
+Cada partida terminada deja un archivo en replays/ con las semillas y las
+entradas del jugador. Este script vuelve a simularlas: sin interfaz para
+comprobar que el puntaje declarado es el que realmente sale, o en la
+ventana del juego a la velocidad que se pida.
+
+Ejemplo:
+    python replay.py verificar replays/*.rpl
+    python replay.py ver replays/partida.rpl --velocidad 4 --tick 600
+"""
+
+import argparse
+import sys
+import time
+
+from Proyeto import TICKS_POR_SEGUNDO, GameApp, Grabacion, Reproductor, tk
+
+
+def verificar(args):
+    diferentes = 0
+    for ruta in args.archivos:
+        try:
+            grabacion = Grabacion.cargar(ruta)
+        except (OSError, ValueError) as error:
+            diferentes += 1
+            print(f"ERR {ruta}: {error}")
+            continue
+        inicio = time.perf_counter()
+        estado = Reproductor(grabacion).jugar()
+        transcurrido = time.perf_counter() - inicio
+        ok = estado.tick == grabacion.ticks and estado.puntaje == grabacion.puntaje
+        diferentes += not ok
+        print(
+            f"{'OK ' if ok else 'DIF'} {ruta}: {grabacion.modo} {grabacion.jugador} "
+            f"declarado {grabacion.puntaje} en {grabacion.ticks} ticks, "
+            f"reproducido {estado.puntaje} en {estado.tick} ticks "
+            f"({estado.tiempo / max(transcurrido, 1e-9):.0f}x tiempo real)"
+        )
+    return 1 if diferentes else 0
+
+
+def ver(args):
+    if tk is None:
+        print("tkinter no está disponible")
+        return 1
+    reproductor = Reproductor(Grabacion.cargar(args.archivo))
+    if args.tick:
+        reproductor.ir_a(args.tick)
+    root = tk.Tk()
+    app = GameApp(root)
+    # la ventana de registro no hace falta para mirar un replay
+    app.win_reg.destroy()
+    app.reproducir(reproductor, args.velocidad)
+    root.mainloop()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("verificar", help="reproduce sin interfaz y compara puntajes")
+    p.add_argument("archivos", nargs="+")
+    p.set_defaults(funcion=verificar)
+
+    p = sub.add_parser("ver", help="muestra el replay en la ventana del juego")
+    p.add_argument("archivo")
+    p.add_argument("--velocidad", type=float, default=1.0)
+    p.add_argument(
+        "--tick",
+        type=int,
+        default=0,
+        help=f"empezar en este tick ({TICKS_POR_SEGUNDO} por segundo)",
+    )
+    p.set_defaults(funcion=ver)
+
+    args = parser.parse_args()
+    sys.exit(args.funcion(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Servidor local de puntajes compartido por varias instancias del juego.
+
+Las instancias se conectan con RemoteScoreManager (BACKEND_PUNTAJES =
+"remoto") y hablan JSON por líneas:
+
+    {"op": "agregar_lote", "registros": [[modo, nombre, puntaje, dificultad, fecha]]}
+    {"op": "agregar", "modo": ..., "nombre": ..., "puntaje": ..., "fecha": ...}
+    {"op": "top", "modo": ..., "n": 5}
+
+La fecha (epoch) la pone el cliente al terminar la partida; sin ella se
+usa la de llegada. Los tops por modo viven en memoria y se responden al instante; los
+registros se escriben en lotes en una bitácora (ScoreManager) desde un hilo
+aparte, así el event loop nunca espera al disco.
+
+Ejemplo:
+    python servidor_puntajes.py --puerto 8765
+    python servidor_puntajes.py --unix /tmp/puntajes.sock
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Proyeto import (
+    LOTE_PUNTAJES,
+    MODO_CAZADOR,
+    MODO_ESCAPA,
+    RECHAZOS_PUNTAJE,
+    ScoreManager,
+    TopPuntajes,
+)
+
+LIMITE_LINEA = 16 * 1024 * 1024  # bytes por pedido (lotes grandes del respaldo)
+# si el disco falla, el lote se reintenta esperando el doble cada vez
+ESPERA_REINTENTO = 0.5
+ESPERA_MAXIMA = 30.0
+
+avisos = logging.getLogger(__name__)
+
+
+def leer_registro(modo, nombre, puntaje, dificultad=None, fecha=None):
+    """(modo, nombre, puntaje, dificultad, fecha) revisado; ValueError si no sirve."""
+    if not isinstance(modo, str) or not isinstance(nombre, str):
+        raise ValueError("modo y nombre deben ser texto")
+    if fecha is None:
+        fecha = time.time()
+    return modo, nombre, int(puntaje), dificultad, float(fecha)
+
+
+class ServidorPuntajes:
+    def __init__(self, archivo, top=100):
+        self.archivo = archivo
+        self.top = top
+        self.tops = {}
+        self.secuencia = 0
+        self.pendientes = asyncio.Queue()
+        # un solo hilo para el backend: siempre se usa desde el mismo
+        self.disco = ThreadPoolExecutor(max_workers=1)
+        # lote que se está escribiendo (o reintentando) y su escritura
+        self.lote = []
+        self.escritura = None
+        self.backend = None
+
+    async def abrir(self):
+        loop = asyncio.get_running_loop()
+        self.backend = await loop.run_in_executor(
+            self.disco, lambda: ScoreManager(self.archivo, k=self.top)
+        )
+        for modo in (MODO_ESCAPA, MODO_CAZADOR):
+            guardados = self.backend.obtener_top(modo, self.top)
+            top = self.tops[modo] = TopPuntajes(self.top)
+            for i, p in enumerate(guardados):
+                top.agregar(p["puntaje"], i - len(guardados), p["nombre"])
+
+    async def atender(self, reader, writer):
+        try:
+            while linea := await reader.readline():
+                try:
+                    respuesta = self.responder(json.loads(linea))
+                except (ValueError, KeyError, TypeError) as error:
+                    respuesta = {"ok": False, "error": str(error)}
+                writer.write(json.dumps(respuesta, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def responder(self, pedido):
+        op = pedido["op"]
+        if op == "agregar":
+            self.agregar(
+                *leer_registro(
+                    pedido["modo"],
+                    pedido["nombre"],
+                    pedido["puntaje"],
+                    pedido.get("dificultad"),
+                    pedido.get("fecha"),
+                )
+            )
+            return {"ok": True}
+        if op == "agregar_lote":
+            # se revisan todos antes de agregar: el lote entra entero o no entra
+            registros = [leer_registro(*r) for r in pedido["registros"]]
+            for registro in registros:
+                self.agregar(*registro)
+            return {"ok": True}
+        if op == "top":
+            top = self.tops.get(pedido["modo"])
+            mejores = top.mejores()[: int(pedido.get("n", 5))] if top else []
+            return {"ok": True, "top": mejores}
+        raise ValueError(f"operación desconocida: {op}")
+
+    def agregar(self, modo, nombre, puntaje, dificultad=None, fecha=None):
+        top = self.tops.setdefault(modo, TopPuntajes(self.top))
+        top.agregar(puntaje, self.secuencia, nombre)
+        self.secuencia += 1
+        self.pendientes.put_nowait((modo, nombre, puntaje, dificultad, fecha))
+
+    async def escribir(self):
+        """Pasa a disco lo recibido, en lotes de hasta LOTE_PUNTAJES.
+
+        Un lote que falla (disco lleno, archivo bloqueado) se reintenta antes
+        que lo nuevo; agregar_lote es todo o nada, así que no se duplica.
+        """
+        espera = ESPERA_REINTENTO
+        while True:
+            if not self.lote:
+                self.lote.append(await self.pendientes.get())
+            while len(self.lote) < LOTE_PUNTAJES and not self.pendientes.empty():
+                self.lote.append(self.pendientes.get_nowait())
+            self.escritura = self.disco.submit(self.escribir_lote, list(self.lote))
+            # shield: si se cancela la tarea al cerrar, el lote igual se escribe
+            error = await asyncio.shield(asyncio.wrap_future(self.escritura))
+            if isinstance(error, RECHAZOS_PUNTAJE):
+                # leer_registro ya los revisó; reintentar no serviría
+                avisos.warning("Lote de puntajes descartado: %s", error)
+            elif error is not None:
+                avisos.warning(
+                    "No se pudo escribir un lote de %d puntajes, se reintenta"
+                    " en %.1f s: %s",
+                    len(self.lote),
+                    espera,
+                    error,
+                )
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, ESPERA_MAXIMA)
+                continue
+            self.lote = []
+            espera = ESPERA_REINTENTO
+
+    def escribir_lote(self, lote):
+        """En el hilo del disco: devuelve el error en vez de lanzarlo."""
+        try:
+            self.backend.agregar_lote(lote)
+        except Exception as error:
+            return error
+        return None
+
+    def cerrar(self):
+        # el lote en curso va primero si su escritura falló (result() espera
+        # a que termine la que esté corriendo)
+        lote = []
+        if self.lote and self.escritura.result() is not None:
+            lote.extend(self.lote)
+        while not self.pendientes.empty():
+            lote.append(self.pendientes.get_nowait())
+        self.disco.submit(self.backend.agregar_lote, lote).result()
+        self.disco.submit(self.backend.cerrar).result()
+        self.disco.shutdown()
+
+
+async def servir(args):
+    servidor = ServidorPuntajes(args.archivo, args.top)
+    await servidor.abrir()
+    if args.unix:
+        red = await asyncio.start_unix_server(
+            servidor.atender, path=args.unix, limit=LIMITE_LINEA
+        )
+        print(f"Escuchando en {args.unix}")
+    else:
+        red = await asyncio.start_server(
+            servidor.atender, args.host, args.puerto, limit=LIMITE_LINEA
+        )
+        print(f"Escuchando en {args.host}:{args.puerto}")
+
+    escritor = asyncio.create_task(servidor.escribir())
+    try:
+        # SIGTERM también cierra ordenadamente (no existe en Windows)
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel
+        )
+    except (NotImplementedError, AttributeError):
+        pass
+    try:
+        async with red:
+            await red.serve_forever()
+    finally:
+        escritor.cancel()
+        servidor.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--unix", help="ruta de un socket Unix en vez de TCP")
+    parser.add_argument("--archivo", default="scores_servidor.jsonl")
+    parser.add_argument("--top", type=int, default=100, help="puntajes por modo")
+    args = parser.parse_args()
+    try:
+        asyncio.run(servir(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
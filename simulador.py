@@ -0,0 +1,313 @@
+"""Simulador por lotes para balancear las dificultades.
+
+Juega muchas partidas sin interfaz con políticas de jugador automáticas,
+repartidas entre varios procesos, y resume por modo y dificultad la tasa
+de victorias, la distribución de puntajes y la duración de las partidas.
+
+Ejemplo:
+    python simulador.py --partidas 2000 --politica directa --semilla 7
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from Proyeto import (
+    ALTO_MAPA,
+    ANCHO_MAPA,
+    DIFICULTAD_HORDA,
+    DIFICULTADES,
+    DIRECCIONES,
+    ENEMIGOS_POR_DIFICULTAD,
+    ENTRADA_MOVER,
+    ENTRADA_TRAMPA,
+    GENERADORES,
+    MODO_CAZADOR,
+    MODO_ESCAPA,
+    TICKS_POR_SEGUNDO,
+    GameMap,
+    GameState,
+)
+
+# =========================
+# POLÍTICAS DE JUGADOR
+# =========================
+
+
+def politica_aleatoria(estado, rng):
+    dx, dy = rng.choice(DIRECCIONES)
+    entradas = [(ENTRADA_MOVER, dx, dy, rng.random() < 0.2)]
+    if rng.random() < 0.05:
+        entradas.append((ENTRADA_TRAMPA,))
+    return entradas
+
+
+def politica_directa(estado, rng):
+    """ESCAPA: va hacia la salida. CAZADOR: persigue al enemigo más cercano."""
+    jugador = estado.jugador
+    game_map = estado.game_map
+    if estado.modo == MODO_ESCAPA:
+        objetivos = {game_map.salida}
+    else:
+        objetivos = {(e.x, e.y) for e in estado.enemigos if e.vivo}
+    paso = primer_paso(game_map, (jugador.x, jugador.y), objetivos)
+    if paso is None:
+        return politica_aleatoria(estado, rng)
+
+    entradas = [(ENTRADA_MOVER, paso[0], paso[1], jugador.energia >= 50)]
+    if estado.modo == MODO_ESCAPA:
+        # trampa si hay un cazador cerca
+        for e in estado.enemigos:
+            if e.vivo and abs(e.x - jugador.x) + abs(e.y - jugador.y) <= 3:
+                entradas.append((ENTRADA_TRAMPA,))
+                break
+    return entradas
+
+
+def primer_paso(game_map, origen, objetivos):
+    """Primer paso del camino más corto (BFS) hacia alguno de los objetivos."""
+    if not objetivos or origen in objetivos:
+        return None
+    previo = {origen: None}
+    cola = deque([origen])
+    while cola:
+        x, y = cola.popleft()
+        for dx, dy in DIRECCIONES:
+            sig = (x + dx, y + dy)
+            if sig in previo:
+                continue
+            # los enemigos pueden estar sobre lianas, adonde el jugador no entra
+            if sig not in objetivos and not game_map.puede_pasar_jugador(*sig):
+                continue
+            previo[sig] = (x, y)
+            if sig in objetivos:
+                while previo[sig] != origen:
+                    sig = previo[sig]
+                return sig[0] - origen[0], sig[1] - origen[1]
+            cola.append(sig)
+    return None
+
+
+POLITICAS = {"aleatoria": politica_aleatoria, "directa": politica_directa}
+
+
+# =========================
+# PARTIDAS
+# =========================
+
+
+def jugar_partida(tarea):
+    (
+        modo,
+        dificultad,
+        politica,
+        semilla,
+        max_ticks,
+        factor,
+        enemigos,
+        cada,
+        generador,
+        tamano,
+    ) = tarea
+    rng = random.Random(semilla)
+    estado = GameState(GameMap(*tamano), rng=rng)
+    estado.iniciar(
+        modo, dificultad, factor=factor, num_enemigos=enemigos, generador=generador
+    )
+    jugar = POLITICAS[politica]
+
+    ticks = 0
+    while estado.running and ticks < max_ticks:
+        entradas = jugar(estado, rng) if ticks % cada == 0 else ()
+        estado.step(entradas)
+        ticks += 1
+
+    agotado = estado.running
+    if agotado:
+        estado.fin_partida(victoria=False, motivo="Tiempo agotado")
+    return {
+        "modo": modo,
+        "dificultad": dificultad,
+        "politica": politica,
+        "semilla": semilla,
+        "generador": generador,
+        "victoria": bool(estado.victoria),
+        "agotado": agotado,
+        "puntaje": estado.puntaje,
+        "duracion": round(estado.tiempo, 1),
+        "atrapados": estado.enemigos_atrapados,
+        "escapados": estado.enemigos_escapados,
+    }
+
+
+def jugar_lote(tareas):
+    return [jugar_partida(tarea) for tarea in tareas]
+
+
+def generar_tareas(args):
+    tareas = []
+    semilla = args.semilla
+    for modo in args.modos:
+        for dificultad in args.dificultades:
+            for _ in range(args.partidas):
+                tareas.append(
+                    (
+                        modo,
+                        dificultad,
+                        args.politica,
+                        semilla,
+                        int(args.max_segundos * TICKS_POR_SEGUNDO),
+                        args.factores.get(dificultad),
+                        args.enemigos.get(dificultad),
+                        args.cada,
+                        args.generador,
+                        args.tamano,
+                    )
+                )
+                semilla += 1
+    return tareas
+
+
+def ejecutar(tareas, procesos, tam_lote):
+    lotes = [tareas[i : i + tam_lote] for i in range(0, len(tareas), tam_lote)]
+    if procesos == 1:
+        return [r for lote in lotes for r in jugar_lote(lote)]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return [r for lote in pool.map(jugar_lote, lotes) for r in lote]
+
+
+# =========================
+# REPORTE
+# =========================
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, int(p / 100 * len(ordenados)))
+    return ordenados[k]
+
+
+def resumir(resultados):
+    grupos = {}
+    for r in resultados:
+        grupos.setdefault((r["modo"], r["dificultad"]), []).append(r)
+
+    resumen = []
+    for (modo, dificultad), lista in grupos.items():
+        puntajes = [r["puntaje"] for r in lista]
+        duraciones = [r["duracion"] for r in lista]
+        resumen.append(
+            {
+                "modo": modo,
+                "dificultad": dificultad,
+                "partidas": len(lista),
+                "victorias": sum(r["victoria"] for r in lista) / len(lista),
+                "agotadas": sum(r["agotado"] for r in lista) / len(lista),
+                "puntaje_media": statistics.fmean(puntajes),
+                "puntaje_p10": percentil(puntajes, 10),
+                "puntaje_p50": percentil(puntajes, 50),
+                "puntaje_p90": percentil(puntajes, 90),
+                "duracion_media": statistics.fmean(duraciones),
+                "duracion_p50": percentil(duraciones, 50),
+                "atrapados_media": statistics.fmean(r["atrapados"] for r in lista),
+                "escapados_media": statistics.fmean(r["escapados"] for r in lista),
+            }
+        )
+    return resumen
+
+
+def imprimir(resumen):
+    print(
+        f"{'modo':<8} {'dificultad':<10} {'n':>6} {'gana':>6} {'agot':>6} "
+        f"{'pts med':>8} {'p10':>6} {'p50':>6} {'p90':>6} {'dur med':>8} "
+        f"{'atrap':>6} {'escap':>6}"
+    )
+    for g in resumen:
+        print(
+            f"{g['modo']:<8} {g['dificultad']:<10} {g['partidas']:>6} "
+            f"{g['victorias']:>6.1%} {g['agotadas']:>6.1%} "
+            f"{g['puntaje_media']:>8.1f} {g['puntaje_p10']:>6} "
+            f"{g['puntaje_p50']:>6} {g['puntaje_p90']:>6} "
+            f"{g['duracion_media']:>7.1f}s "
+            f"{g['atrapados_media']:>6.2f} {g['escapados_media']:>6.2f}"
+        )
+
+
+def por_dificultad(texto, tipo):
+    """Convierte "Fácil=3,Normal=4" en {"Fácil": 3, "Normal": 4}."""
+    valores = {}
+    for parte in filter(None, texto.split(",")):
+        nombre, valor = parte.split("=")
+        valores[nombre.strip()] = tipo(valor)
+    return valores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--partidas", type=int, default=1000, help="por modo y dificultad"
+    )
+    parser.add_argument("--politica", choices=POLITICAS, default="directa")
+    parser.add_argument("--modos", nargs="+", default=[MODO_ESCAPA, MODO_CAZADOR])
+    parser.add_argument(
+        "--dificultades",
+        nargs="+",
+        # la horda (miles de enemigos) se simula solo si se pide
+        default=[d for d in DIFICULTADES if d != DIFICULTAD_HORDA],
+    )
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--max-segundos", type=float, default=300.0)
+    parser.add_argument("--cada", type=int, default=2, help="ticks entre acciones")
+    parser.add_argument("--generador", choices=GENERADORES, default="clasico")
+    parser.add_argument(
+        "--tamano",
+        type=lambda t: tuple(int(v) for v in t.lower().split("x")),
+        default=(ANCHO_MAPA, ALTO_MAPA),
+        help="columnas x filas, p. ej. 200x150",
+    )
+    parser.add_argument(
+        "--factores",
+        type=lambda t: por_dificultad(t, float),
+        default={},
+        help='p. ej. "Fácil=1.0,Normal=1.3"',
+    )
+    parser.add_argument(
+        "--enemigos",
+        type=lambda t: por_dificultad(t, int),
+        default={},
+        help='p. ej. "Fácil=3,Difícil=6"',
+    )
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lote", type=int, default=50, help="partidas por tarea")
+    parser.add_argument("--json", help="guardar resumen y resultados en este archivo")
+    args = parser.parse_args()
+
+    tareas = generar_tareas(args)
+    inicio = time.perf_counter()
+    resultados = ejecutar(tareas, args.procesos, args.lote)
+    transcurrido = time.perf_counter() - inicio
+
+    resumen = resumir(resultados)
+    imprimir(resumen)
+    print(
+        f"\n{len(resultados)} partidas en {transcurrido:.1f}s "
+        f"con {args.procesos} procesos (enemigos por defecto: "
+        f"{ENEMIGOS_POR_DIFICULTAD})"
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"resumen": resumen, "resultados": resultados},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()